@@ -1,18 +1,66 @@
 import os
+import sys
 import pandas as pd
+import numpy as np
 import re
-from flask import Flask, jsonify, request, Response
+import regex
+from flask import Flask, jsonify, request, Response, g
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from dotenv import load_dotenv
 import io
+import cProfile
+import pstats
 import json
 import zipfile
+import zlib
+import gzip
 import shutil
 import tempfile
 from werkzeug.utils import secure_filename
 from datetime import datetime
 import subprocess
 import difflib
+import threading
+import time
+import hashlib
+import queue
+import uuid
+import sqlite3
+import click
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError:  # Windowsではファイルロックなし（プロセス内のロックのみ）
+    fcntl = None
+try:
+    import sandbox_exec
+except ImportError:  # Windowsではテスト実行の制限・隔離なし
+    sandbox_exec = None
+try:
+    import pwd
+except ImportError:  # Windowsでは実行用ユーザーへの切り替えなし
+    pwd = None
+import signal
+import ctypes
+import shlex
+import errno
+import base64
+import binascii
+try:
+    import brotli
+except ImportError:  # brotliがなければgzipだけで圧縮
+    brotli = None
+try:
+    import orjson
+except ImportError:  # orjsonがなければ標準のjsonでJSON化
+    orjson = None
+import bisect
+import functools
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, as_completed, wait
+import multiprocessing
+import multiprocessing.connection
 
 # --- パス設定 ---
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -33,91 +81,3017 @@ FEEDBACK_CSV_PATH = os.path.join(BASE_PATH, 'list_feedback.csv')  # フィード
 REVIEW_STATUS_PATH = os.path.join(BASE_PATH, 'review_status.json')  # レビュー状態管理用
 AUTO_CHECK_PATH = os.path.join(BASE_PATH, 'auto_check_results.json')  # 自動チェック結果
 SUBMISSION_PATH = os.path.join(BASE_PATH, SUBMISSION_DIR)
+DATA_DIR = os.path.join(PROJECT_ROOT, 'backend', 'data')
+
+# キャッシュに保持する課題数の上限（LRUで追い出し）
+FILE_CACHE_MAX_ASSIGNMENTS = int(os.getenv('FILE_CACHE_MAX_ASSIGNMENTS', '16'))
+
+# 全学生自動チェックの実行方式（serial / thread / process）と並列数・学生ごとのタイムアウト秒数
+AUTO_CHECK_EXECUTOR = os.getenv('AUTO_CHECK_EXECUTOR', 'thread')
+AUTO_CHECK_WORKERS = int(os.getenv('AUTO_CHECK_WORKERS', str(min(32, (os.cpu_count() or 1) + 4))))
+AUTO_CHECK_TIMEOUT = float(os.getenv('AUTO_CHECK_TIMEOUT', '10'))
+
+# ヘッダーチェックでソースを読む上限（バイト、これを超えてもヘッダーコメントが終わらない場合は要確認とする）
+HEADER_READ_MAX_BYTES = int(os.getenv('HEADER_READ_MAX_BYTES', str(64 * 1024)))
+
+# 採点データの保存方式（file: 課題ディレクトリのCSV/JSON, sqlite: SQLiteデータベース）
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'file')
+STORAGE_DB_PATH = os.getenv('STORAGE_DB_PATH', os.path.join(DATA_DIR, 'grading.sqlite3'))
+
+# 提出ZIPの展開上限（展開後の合計バイト数・エントリ数）と展開の並列数
+UPLOAD_MAX_TOTAL_SIZE = int(os.getenv('UPLOAD_MAX_TOTAL_SIZE', str(8 * 1024 ** 3)))
+UPLOAD_MAX_ENTRIES = int(os.getenv('UPLOAD_MAX_ENTRIES', '100000'))
+UPLOAD_EXTRACT_WORKERS = int(os.getenv('UPLOAD_EXTRACT_WORKERS', str(min(8, os.cpu_count() or 1))))
+
+# この大きさ（バイト）以上のJSON・CSVレスポンスをgzip/brotliで圧縮する
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', '1024'))
+# JSON化の方式（default: 標準のjson, orjson: orjsonがインストールされていれば使う）
+JSON_ENCODER = os.getenv('JSON_ENCODER', 'default')
+
+# clang-formatの整形結果キャッシュの保存先と容量の上限（バイト）
+FORMAT_CACHE_DIR = os.getenv('FORMAT_CACHE_DIR', os.path.join(SCRIPT_DIR, 'format_cache'))
+FORMAT_CACHE_MAX_BYTES = int(os.getenv('FORMAT_CACHE_MAX_BYTES', str(256 * 1024 ** 2)))
+# 一括整形でclang-formatを同時に実行する数
+FORMAT_WORKERS = int(os.getenv('FORMAT_WORKERS', str(os.cpu_count() or 1)))
+
+# テスト実行に使うCコンパイラとオプション、並列数
+TEST_CC = os.getenv('TEST_CC', 'gcc')
+TEST_CFLAGS = os.getenv('TEST_CFLAGS', '-std=gnu11 -O1 -w').split()
+TEST_RUN_WORKERS = int(os.getenv('TEST_RUN_WORKERS', str(os.cpu_count() or 1)))
+# テストケースごとの制限（経過時間の秒数、CPU秒数、メモリ・出力の上限MB）とコンパイルのタイムアウト秒数
+TEST_RUN_TIMEOUT = float(os.getenv('TEST_RUN_TIMEOUT', '5'))
+TEST_RUN_CPU_SECONDS = int(os.getenv('TEST_RUN_CPU_SECONDS', '2'))
+TEST_RUN_MEMORY_MB = int(os.getenv('TEST_RUN_MEMORY_MB', '256'))
+TEST_RUN_OUTPUT_MB = int(os.getenv('TEST_RUN_OUTPUT_MB', '1'))
+TEST_COMPILE_TIMEOUT = float(os.getenv('TEST_COMPILE_TIMEOUT', '30'))
+# テスト実行を有効にするか（1: する）。学生のプログラムを動かすため、次のどちらかで隔離する必要がある
+# - TEST_RUN_USER: 実行に使う権限のないユーザー（nobodyなど、バックエンドをrootで起動した場合のみ）
+# - TEST_RUN_WRAPPER: コンパイラとプログラムの前に付けるコマンド（bwrapなど、{work_dir}は作業ディレクトリに置き換え）
+TEST_RUN_ENABLED = os.getenv('TEST_RUN_ENABLED', '0') == '1'
+TEST_RUN_USER = os.getenv('TEST_RUN_USER', '')
+TEST_RUN_WRAPPER = os.getenv('TEST_RUN_WRAPPER', '')
+# 実行用ユーザーのプロセス数の上限（fork爆弾対策）
+TEST_RUN_MAX_PROCESSES = int(os.getenv('TEST_RUN_MAX_PROCESSES', '64'))
+
+# 類似度検出のk-gramのトークン数、MinHashの長さ、LSHのバンド数、一覧に載せる推定類似度の下限
+SIMILARITY_SHINGLE_SIZE = int(os.getenv('SIMILARITY_SHINGLE_SIZE', '5'))
+SIMILARITY_PERMUTATIONS = int(os.getenv('SIMILARITY_PERMUTATIONS', '128'))
+SIMILARITY_BANDS = int(os.getenv('SIMILARITY_BANDS', '32'))
+SIMILARITY_MIN_SCORE = float(os.getenv('SIMILARITY_MIN_SCORE', '0.5'))
+# 署名を同じ長さの帯に分けるため、バンド数はMinHashの長さの約数にする
+if SIMILARITY_BANDS <= 0 or SIMILARITY_PERMUTATIONS % SIMILARITY_BANDS != 0:
+    raise ValueError(f'SIMILARITY_BANDS（{SIMILARITY_BANDS}）はSIMILARITY_PERMUTATIONS（{SIMILARITY_PERMUTATIONS}）の約数にしてください')
+
+# X-Profile: 1 ヘッダー付きのリクエストをcProfileで計測するか（1: する）と、結果の保存先
+PROFILE_REQUESTS = os.getenv('PROFILE_REQUESTS', '0') == '1'
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(SCRIPT_DIR, 'profiles'))
+
+# ソース検索の索引の保存先、索引に入れる拡張子とファイルサイズの上限（バイト）
+SEARCH_INDEX_PATH = os.getenv('SEARCH_INDEX_PATH', os.path.join(DATA_DIR, 'search_index.sqlite3'))
+SEARCH_EXTENSIONS = tuple(ext.strip() for ext in os.getenv('SEARCH_EXTENSIONS', '.c,.h').split(',') if ext.strip())
+SEARCH_MAX_FILE_BYTES = int(os.getenv('SEARCH_MAX_FILE_BYTES', str(1024 ** 2)))
+# 検索文字列（正規表現）の長さ、絞り込みに使うトライグラム数、1回の検索で照合するファイル数の上限
+SEARCH_MAX_QUERY_LENGTH = int(os.getenv('SEARCH_MAX_QUERY_LENGTH', '256'))
+SEARCH_MAX_TRIGRAMS = int(os.getenv('SEARCH_MAX_TRIGRAMS', '32'))
+SEARCH_MAX_CANDIDATES = int(os.getenv('SEARCH_MAX_CANDIDATES', '5000'))
+# 1回の検索で照合するソースの合計サイズ（バイト）と照合にかける時間（秒）の上限
+SEARCH_MAX_SCAN_BYTES = int(os.getenv('SEARCH_MAX_SCAN_BYTES', str(64 * 1024 ** 2)))
+SEARCH_MATCH_TIMEOUT = float(os.getenv('SEARCH_MATCH_TIMEOUT', '2'))
+
+# バックグラウンドジョブの保存先と同時実行数
+JOBS_DIR = os.getenv('JOBS_DIR', os.path.join(SCRIPT_DIR, 'jobs'))
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '1'))
+
+# 変更通知（SSE）のキープアライブの間隔（秒）と、再接続時に再送する課題ごとのイベント数
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv('EVENTS_HEARTBEAT_SECONDS', '15'))
+EVENTS_HISTORY = int(os.getenv('EVENTS_HISTORY', '256'))
+# 購読者ごとの未送信イベントの上限（超えた購読者には一覧の再取得を求める）
+EVENTS_QUEUE_SIZE = int(os.getenv('EVENTS_QUEUE_SIZE', '256'))
 
 app = Flask(__name__)
 CORS(app) # ReactからのAPIリクエストを許可
 
-# --- preprocess.pyから移植した関数群 ---
-def find_student_folder(student_id, base_dir):
-    search_prefix = f"{student_id}"
-    if not os.path.isdir(base_dir): return None
-    for folder_name in os.listdir(base_dir):
-        if folder_name.startswith(search_prefix):
-            return os.path.join(base_dir, folder_name)
+# --- preprocess.pyから移植した関数群 ---
+def find_student_folder(student_id, base_dir):
+    index = load_submission_index(base_dir)
+    if index is None: return None
+    folder_name = index.find(f"{student_id}")
+    if folder_name is None: return None
+    return os.path.join(base_dir, folder_name)
+
+# --- ヘッダーチェック ---
+# config.jsonで header_fields を指定しない課題の必須項目
+DEFAULT_HEADER_FIELDS = ("氏名", "学生番号", "作成日", "入出力の説明", "動きの説明", "感想")
+
+class HeaderChecker:
+    """
+    ソース冒頭のヘッダーコメントに必須項目が記入されているかを調べる
+    項目の正規表現は項目リストごとに一度だけコンパイルする（header_checker() で共有）
+    """
+
+    HEADER_BLOCK = re.compile(r'/\*.*?\*/', re.DOTALL)
+
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        alternation = '|'.join(re.escape(field) for field in self.fields)
+        self._pattern = re.compile(f"((?:{alternation}))\\s*[:：]") if self.fields else None
+
+    def check(self, source_code):
+        """記入されていない項目のリストを返す"""
+        if self._pattern is None:
+            return []
+        header_block_match = self.HEADER_BLOCK.search(source_code)
+        text_to_check = header_block_match.group(0) if header_block_match else source_code
+        matches = list(self._pattern.finditer(text_to_check))
+        found_contents = {}
+        for i, match in enumerate(matches):
+            field_name = match.group(1).strip()
+            content_start = match.end()
+            content_end = matches[i + 1].start() if i + 1 < len(matches) else len(text_to_check)
+            content = text_to_check[content_start:content_end].replace('*/', '').strip()
+            found_contents[field_name] = content
+        return [field for field in self.fields if not found_contents.get(field)]
+
+    def check_files(self, paths, max_bytes=None):
+        """
+        各ファイルのヘッダーコメントまでだけを読み、(パス, 記入されていない項目, 上限超過) を順に返す
+        上限までにヘッダーコメントが終わらないファイルは項目を調べずに上限超過とする
+        """
+        for path in paths:
+            header_text, exceeded = read_header_text(path, max_bytes=max_bytes)
+            yield path, [] if exceeded else self.check(header_text), exceeded
+
+@functools.lru_cache(maxsize=64)
+def _header_checker(fields):
+    return HeaderChecker(fields)
+
+def header_checker(fields=None):
+    """項目リストに対応するHeaderChecker（Noneの場合は既定の項目）"""
+    return _header_checker(tuple(DEFAULT_HEADER_FIELDS if fields is None else fields))
+
+def check_header(source_code, required_fields=None):
+    return header_checker(required_fields).check(source_code)
+
+def read_header_text(path, chunk_size=8192, max_bytes=None):
+    """
+    ソースを先頭から少しずつ読み、最初のブロックコメント（/* ... */）の終わりまでを返す
+    コメントがない場合はファイル全体を返す（check_headerの結果はファイル全体を渡した場合と同じ）
+    max_bytes（既定: HEADER_READ_MAX_BYTES）まで読んでもコメントが終わらない場合はそこで止める
+    (テキスト, 上限を超えたか) を返す
+    """
+    max_bytes = HEADER_READ_MAX_BYTES if max_bytes is None else max_bytes
+    data = bytearray()
+    start = -1
+    exceeded = False
+    read_bytes = 0
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(min(chunk_size, max_bytes + 1 - len(data)))
+            if not chunk:
+                break
+            read_bytes += len(chunk)
+            # チャンクの境目で '/*' '*/' が分かれていても見つかるよう1バイト戻って探す
+            search_from = max(0, len(data) - 1)
+            data += chunk
+            if start < 0:
+                start = data.find(b'/*', search_from)
+            if start >= 0:
+                end = data.find(b'*/', max(start + 2, search_from))
+                if end >= 0:
+                    del data[end + 2:]
+                    break
+            if len(data) > max_bytes:
+                # 上限の次の1バイトまで読めた＝ファイルが上限より大きい
+                del data[max_bytes:]
+                exceeded = True
+                break
+    count_file_read(read_bytes)
+    return data.decode('utf-8', errors='ignore'), exceeded
+
+# --- リクエストごとの計測値 ---
+class RequestCounters:
+    """1リクエストの間に読んだファイル数・バイト数やCSV・JSON・外部プロセスにかかった時間（ワーカースレッドからも加算する）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.values = {'files_opened': 0, 'file_read_bytes': 0, 'csv_parse_seconds': 0.0,
+                       'json_parse_seconds': 0.0, 'subprocess_seconds': 0.0}
+
+    def add(self, name, value):
+        with self._lock:
+            self.values[name] += value
+
+_request_state = threading.local()
+
+def current_request_counters():
+    """このスレッドで計測中のリクエストの計測値（リクエスト外ならNone）"""
+    return getattr(_request_state, 'counters', None)
+
+@contextmanager
+def measuring(counters):
+    """ワーカースレッドでの処理をリクエストの計測値に含める"""
+    previous = current_request_counters()
+    _request_state.counters = counters
+    try:
+        yield
+    finally:
+        _request_state.counters = previous
+
+@contextmanager
+def timed(name):
+    """ブロックの処理時間をリクエストの計測値 name に加算する（リクエスト外では何もしない）"""
+    counters = current_request_counters()
+    if counters is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        counters.add(name, time.perf_counter() - started)
+
+def count_file_read(nbytes):
+    """開いたファイル1つと読んだバイト数をリクエストの計測値に加算する（リクエスト外では何もしない）"""
+    counters = current_request_counters()
+    if counters is not None:
+        counters.add('files_opened', 1)
+        counters.add('file_read_bytes', nbytes)
+
+def read_text_file(path):
+    """テキストファイルを読み込む（UTF-8として読めない部分は無視する）"""
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        text = f.read()
+        count_file_read(os.fstat(f.fileno()).st_size)
+    return text
+
+def read_csv(path, **kwargs):
+    """pd.read_csvで読み込み、かかった時間とファイルの読み込みをリクエストの計測値に加算する"""
+    with timed('csv_parse_seconds'):
+        df = pd.read_csv(path, **kwargs)
+    if isinstance(path, (str, os.PathLike)):
+        count_file_read(os.path.getsize(path))
+    return df
+
+# --- ファイルキャッシュ ---
+def file_stamp(path):
+    """ファイルの変更検知用の (mtime, サイズ)（存在しない場合はNone）"""
+    try:
+        st = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+class FileCache:
+    """
+    課題ディレクトリ単位でファイルの読み込み結果を保持するキャッシュ
+    - ファイルのmtime・サイズが変わったら読み込み直す
+    - 課題数が上限を超えたら最も古く使われた課題から追い出す（LRU）
+    - 返す値は共有されるため、呼び出し側で変更しないこと
+    """
+
+    def __init__(self, max_assignments):
+        self.max_assignments = max_assignments
+        self._assignments = OrderedDict()  # 課題ディレクトリ -> {ファイルパス: (スタンプ, 値)}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, path, loader, default=None):
+        """pathの内容をloaderで読み込んで返す（変更がなければキャッシュを返す）"""
+        path = os.path.abspath(path)
+        stamp = file_stamp(path)
+        if stamp is None:
+            self.invalidate(path)
+            return default
+        assignment_key = os.path.dirname(path)
+
+        with self._lock:
+            entries = self._assignments.get(assignment_key)
+            if entries is not None:
+                self._assignments.move_to_end(assignment_key)
+                entry = entries.get(path)
+                if entry is not None and entry[0] == stamp:
+                    self.hits += 1
+                    return entry[1]
+            self.misses += 1
+
+        value = loader(path)
+
+        with self._lock:
+            self._assignments.setdefault(assignment_key, {})[path] = (stamp, value)
+            self._assignments.move_to_end(assignment_key)
+            while len(self._assignments) > self.max_assignments:
+                self._assignments.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def invalidate(self, path):
+        """書き込み後などに特定ファイルのキャッシュを破棄"""
+        path = os.path.abspath(path)
+        with self._lock:
+            entries = self._assignments.get(os.path.dirname(path))
+            if entries:
+                entries.pop(path, None)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / total if total else 0.0,
+                'assignments': len(self._assignments),
+                'files': sum(len(entries) for entries in self._assignments.values()),
+                'max_assignments': self.max_assignments
+            }
+
+file_cache = FileCache(FILE_CACHE_MAX_ASSIGNMENTS)
+
+class VersionedCache:
+    """
+    複数のファイルから組み立てた値を課題単位で保持するキャッシュ
+    - 呼び出し側が渡すバージョン（ファイルのスタンプ等の組）が変わったら作り直す
+    - 件数が上限を超えたら最も古く使われたものから追い出す（LRU）
+    - 返す値は共有されるため、呼び出し側で変更しないこと
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # キー -> (バージョン, 値)
+        self._lock = threading.Lock()
+
+    def get(self, key, version, builder):
+        """versionが前回と同じならキャッシュを、違えばbuilder()の結果を返す"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        # バージョンは組み立て前に取っているので、途中で変更されても次回作り直される
+        value = builder()
+
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+def _read_feedback_csv(path):
+    try:
+        return read_csv(path, encoding='utf-8', keep_default_na=False, na_values=[''])
+    except UnicodeDecodeError:
+        return read_csv(path, encoding='utf-8-sig', keep_default_na=False, na_values=[''])
+
+def _read_json(path):
+    with open(path, 'r') as f, timed('json_parse_seconds'):
+        value = json.load(f)
+        count_file_read(os.fstat(f.fileno()).st_size)
+    return value
+
+def read_feedback_csv(path):
+    """
+    名簿CSVを読み込み（キャッシュ経由、変更してよいコピーを返す）
+    ファイルがなければpd.read_csvと同じくFileNotFoundErrorを送出する
+    """
+    df = file_cache.get(path, _read_feedback_csv)
+    if df is None:
+        raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+    return df.copy()
+
+def load_json_cached(path, default=None):
+    """JSONファイルを読み込み（キャッシュ経由、返り値は変更しないこと）"""
+    value = file_cache.get(path, _read_json)
+    if value is None:
+        return {} if default is None else default
+    return value
+
+def write_json(path, data, **kwargs):
+    """JSONファイルを一時ファイル経由で置き換えて保存し、キャッシュを破棄"""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, **kwargs)
+    os.replace(tmp_path, path)
+    file_cache.invalidate(path)
+
+def write_feedback_csv(df, path):
+    """名簿CSVを一時ファイル経由で置き換えて保存し、キャッシュを破棄"""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    df.to_csv(tmp_path, index=False, encoding='utf-8-sig', na_rep='')
+    os.replace(tmp_path, path)
+    file_cache.invalidate(path)
+
+def load_assignment_config(assignment_base_path):
+    """課題のconfig.jsonを読み込み（存在しない場合はNone）"""
+    return file_cache.get(os.path.join(assignment_base_path, 'config.json'), _read_json)
+
+# --- フィードバック保存（追記ログ） ---
+FEEDBACK_JOURNAL_FILE = 'feedback_journal.jsonl'
+
+@contextmanager
+def locked_file(f, exclusive=True):
+    """flockでファイルをロック（fcntlがない環境では何もしない）"""
+    if fcntl is None:
+        yield f
+        return
+    fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+    try:
+        yield f
+    finally:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+class FeedbackJournal:
+    """
+    フィードバックとレビュー状態の追記専用ログ（1保存につき1行のJSON Lines）
+    - 保存は1行の追記とfsyncだけで、CSV全体の書き直しは行わない
+    - 複数のワーカー・プロセスからの同時保存はflockで直列化する
+    - 読み込みは前回読んだ位置からの差分だけを反映する
+    - CSVへの反映（圧縮）はエクスポート時に compact で行う
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._inode = None
+        self._offset = 0
+        self._feedback = {}  # 広大ID -> フィードバックコメント
+        self._reviewed = {}  # 広大ID -> レビュー済みフラグ
+        self._compacting = False
+
+    @contextmanager
+    def _open_locked(self, mode, exclusive):
+        if self._compacting:
+            # compact中はこのスレッドが既に排他ロックを持っている
+            with open(self.path, mode) as f:
+                yield f
+            return
+        # ロック待ちの間に compact でファイルが置き換えられた場合は開き直す
+        while True:
+            f = open(self.path, mode)
+            try:
+                with locked_file(f, exclusive):
+                    if os.fstat(f.fileno()).st_ino == os.stat(self.path).st_ino:
+                        yield f
+                        return
+            finally:
+                f.close()
+
+    def append(self, hirodai_id, feedback, reviewed=True):
+        """1人分のフィードバックとレビュー状態を追記"""
+        entry = {
+            'id': str(hirodai_id),
+            'feedback': feedback,
+            'reviewed': reviewed,
+            'saved_at': datetime.now().isoformat()
+        }
+        line = (json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8')
+        with self._lock, self._open_locked('ab', exclusive=True) as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def state(self):
+        """(フィードバック辞書, レビュー済み辞書) を返す（返り値は変更しないこと）"""
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                self._reset(None)
+                return self._feedback, self._reviewed
+            if st.st_ino != self._inode or st.st_size < self._offset:
+                # compactで置き換えられた場合は最初から読み直す
+                self._reset(st.st_ino)
+            if st.st_size > self._offset:
+                with self._open_locked('rb', exclusive=False) as f:
+                    f.seek(self._offset)
+                    data = f.read()
+                self._apply(data)
+            return self._feedback, self._reviewed
+
+    def version(self):
+        """ログの読み込み位置（内容が変わると値が変わる）"""
+        with self._lock:
+            self.state()
+            return (self._inode, self._offset)
+
+    def compact(self, write_snapshot):
+        """
+        ログの内容を write_snapshot(フィードバック辞書, レビュー済み辞書) でCSV等に書き出し、
+        ログを空にする。書き出し中の保存はロックで待たせる
+        """
+        with self._lock:
+            if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+                # 書き出すものがない場合はログを置き換えない（ファイルのバージョンを変えない）
+                return write_snapshot(*self.state())
+            with self._open_locked('rb', exclusive=True):
+                self._compacting = True
+                try:
+                    feedback, reviewed = self.state()
+                    result = write_snapshot(feedback, reviewed)
+                    # 空のログに置き換える（待機中の書き込みは新しいファイルに追記される）
+                    tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                    open(tmp_path, 'wb').close()
+                    os.replace(tmp_path, self.path)
+                finally:
+                    self._compacting = False
+            self._reset(os.stat(self.path).st_ino)
+            return result
+
+    def _reset(self, inode):
+        self._inode = inode
+        self._offset = 0
+        self._feedback = {}
+        self._reviewed = {}
+
+    def _apply(self, data):
+        # 書きかけの行は次回に回す
+        end = data.rfind(b'\n') + 1
+        if end == 0:
+            return
+        # 読み込み済みの辞書を渡している呼び出し元に影響しないようコピーしてから更新
+        feedback, reviewed = dict(self._feedback), dict(self._reviewed)
+        with timed('json_parse_seconds'):
+            for line in data[:end].splitlines():
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                feedback[entry['id']] = entry['feedback']
+                reviewed[entry['id']] = entry['reviewed']
+        self._feedback, self._reviewed = feedback, reviewed
+        self._offset += end
+
+_feedback_journals = {}
+_feedback_journals_lock = threading.Lock()
+
+def feedback_journal(assignment_base_path):
+    """課題ディレクトリのフィードバックログ（プロセス内で共有）"""
+    path = os.path.join(os.path.abspath(assignment_base_path), FEEDBACK_JOURNAL_FILE)
+    with _feedback_journals_lock:
+        if path not in _feedback_journals:
+            _feedback_journals[path] = FeedbackJournal(path)
+        return _feedback_journals[path]
+
+def apply_feedback_journal(df, review_status, assignment_base_path):
+    """CSV・review_status.jsonの内容にログの更新を重ねた (df, review_status) を返す"""
+    feedback, reviewed = feedback_journal(assignment_base_path).state()
+    if reviewed:
+        review_status = {**review_status, **reviewed}
+    if feedback:
+        overrides = df['広大ID'].astype(str).map(feedback)
+        if 'フィードバックコメント' in df.columns:
+            df['フィードバックコメント'] = overrides.where(overrides.notna(), df['フィードバックコメント'])
+        else:
+            df['フィードバックコメント'] = overrides
+    return df, review_status
+
+def materialize_feedback_csv(assignment_base_path, feedback_csv_path, review_status_path):
+    """ログの内容をlist_feedback.csvとreview_status.jsonに書き出し、書き出したdfを返す"""
+    def write_snapshot(feedback, reviewed):
+        df = read_feedback_csv(feedback_csv_path)
+        df, review_status = apply_feedback_journal(df, load_json_cached(review_status_path), assignment_base_path)
+        if feedback:
+            write_feedback_csv(df, feedback_csv_path)
+        if reviewed:
+            write_json(review_status_path, review_status, ensure_ascii=False, indent=2)
+        return df
+    return feedback_journal(assignment_base_path).compact(write_snapshot)
+
+# --- 提出フォルダインデックス ---
+SUBMISSION_INDEX_FILE = 'submission_index.json'
+
+class SubmissionIndex:
+    """提出ディレクトリ内の学生フォルダ名とファイル一覧の索引"""
+
+    def __init__(self, base_dir, dir_mtime_ns, folders):
+        self.base_dir = base_dir
+        self.dir_mtime_ns = dir_mtime_ns
+        self.folders = folders  # フォルダ名 -> {'mtime_ns': int, 'files': [ファイル名]}
+        self._names = sorted(folders)
+
+    def find(self, student_id):
+        """学生IDで始まるフォルダ名を返す（二分探索）"""
+        i = bisect.bisect_left(self._names, student_id)
+        if i < len(self._names) and self._names[i].startswith(student_id):
+            return self._names[i]
+        return None
+
+    def folder(self, folder_name):
+        """
+        フォルダの {'mtime_ns', 'files'}（ない場合はNone）
+        フォルダ内のファイルを追加・削除しても提出ディレクトリのmtimeは変わらないため、
+        フォルダ自身のmtimeが変わっていればそのフォルダだけ読み直す
+        """
+        folder = self.folders.get(folder_name)
+        if folder is None:
+            return None
+        path = os.path.join(self.base_dir, folder_name)
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        if folder['mtime_ns'] != mtime_ns:
+            folder = _scan_student_folder(path, mtime_ns)
+            self.folders[folder_name] = folder
+        return folder
+
+    def files(self, folder_name):
+        folder = self.folder(folder_name)
+        return list(folder['files']) if folder else []
+
+    def student_files(self, student_id):
+        folder_name = self.find(f"{student_id}")
+        return self.files(folder_name) if folder_name else []
+
+    def version(self):
+        """提出ディレクトリと学生フォルダの現在のmtimeから作るバージョン（フォルダ内の追加・削除で変わる）"""
+        folders = sorted(
+            (name, folder['mtime_ns'])
+            for name, folder in ((name, self.folder(name)) for name in list(self.folders))
+            if folder is not None
+        )
+        return hashlib.sha1(json.dumps([self.dir_mtime_ns, folders]).encode('utf-8')).hexdigest()
+
+    def to_dict(self):
+        return {'dir_mtime_ns': self.dir_mtime_ns, 'folders': self.folders}
+
+_submission_indexes = {}  # 提出ディレクトリ -> SubmissionIndex
+_submission_index_lock = threading.Lock()
+
+def _submission_index_path(base_dir):
+    # config.jsonと同じ課題ディレクトリに保存
+    return os.path.join(os.path.dirname(os.path.abspath(base_dir)), SUBMISSION_INDEX_FILE)
+
+def _scan_student_folder(path, mtime_ns):
+    with os.scandir(path) as it:
+        return {'mtime_ns': mtime_ns, 'files': sorted(f.name for f in it if f.is_file())}
+
+def _scan_submission_dir(base_dir, dir_mtime_ns, previous=None):
+    """os.scandirで提出ディレクトリを走査（mtimeが変わっていないフォルダは前回の結果を再利用）"""
+    previous_folders = previous.folders if previous else {}
+    folders = {}
+    with os.scandir(base_dir) as it:
+        for entry in it:
+            if entry.name.startswith('.') or not entry.is_dir():
+                continue
+            mtime_ns = entry.stat().st_mtime_ns
+            old = previous_folders.get(entry.name)
+            if old and old['mtime_ns'] == mtime_ns:
+                folders[entry.name] = old
+                continue
+            folders[entry.name] = _scan_student_folder(entry.path, mtime_ns)
+    return SubmissionIndex(base_dir, dir_mtime_ns, folders)
+
+def build_submission_index(base_dir, previous=None):
+    """提出フォルダインデックスを作成してディスクに保存"""
+    base_dir = os.path.abspath(base_dir)
+    index = _scan_submission_dir(base_dir, os.stat(base_dir).st_mtime_ns, previous)
+    return save_submission_index(index)
+
+def save_submission_index(index):
+    """作成済みのインデックスをディスクに保存し、プロセス内でも使えるようにする"""
+    base_dir = index.base_dir
+    try:
+        write_json(_submission_index_path(base_dir), index.to_dict(), ensure_ascii=False)
+    except OSError:
+        pass  # 保存できなくてもメモリ上のインデックスは使える
+    with _submission_index_lock:
+        _submission_indexes[base_dir] = index
+    return index
+
+def load_submission_index(base_dir):
+    """
+    提出フォルダインデックスを取得
+    提出ディレクトリのmtimeが変わっていればフォルダ単位で差分更新する
+    """
+    base_dir = os.path.abspath(base_dir)
+    try:
+        dir_mtime_ns = os.stat(base_dir).st_mtime_ns
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+    with _submission_index_lock:
+        index = _submission_indexes.get(base_dir)
+    if index is None:
+        # 保存済みのインデックスがあれば読み込む
+        saved = load_json_cached(_submission_index_path(base_dir))
+        if saved and 'folders' in saved:
+            index = SubmissionIndex(base_dir, saved.get('dir_mtime_ns'), saved['folders'])
+            with _submission_index_lock:
+                _submission_indexes[base_dir] = index
+    if index is not None and index.dir_mtime_ns == dir_mtime_ns:
+        return index
+    return build_submission_index(base_dir, previous=index)
+
+def list_student_files(folder_path):
+    """学生フォルダ内のファイル一覧をインデックスから取得"""
+    if not folder_path:
+        return []
+    index = load_submission_index(os.path.dirname(folder_path))
+    if index is None:
+        return []
+    return index.files(os.path.basename(folder_path))
+
+# --- 自動チェック ---
+def auto_check_submission(folder_path, files_in_folder, assignment_name, header_fields=None):
+    """
+    1人分の提出物を自動チェックしてフィードバック文を返す
+    プロセスプールからも呼べるよう、グローバルな状態には触れない
+    header_fieldsはヘッダーの必須項目（Noneの場合は既定の項目）
+    """
+    auto_feedback = ""
+    source_filename = f"{assignment_name}.c"
+    history_filename = f"{assignment_name}-test-history.txt"
+    has_source = source_filename in files_in_folder
+    has_history = history_filename in files_in_folder
+    
+    # ファイル不備チェック
+    if not has_source or not has_history:
+        auto_feedback += f"この課題では \"{source_filename}\" と \"{history_filename}\" を提出してください。"
+        if folder_path and not has_history:
+            auto_feedback += " make testを実行するとtxtファイルが作成されます(演習1の「演習課題のやり方」を参照してください)。"
+    
+    # ヘッダー記入漏れチェック（ソースコードが存在する場合のみ）
+    if has_source:
+        # ヘッダーコメントの終わりまでだけ読む（巨大なファイル・バイナリは上限で打ち切って通知）
+        header_text, exceeded = read_header_text(os.path.join(folder_path, source_filename))
+        missing_items = [] if exceeded else header_checker(header_fields).check(header_text)
+        if exceeded:
+            auto_feedback += (f"{source_filename}の先頭{HEADER_READ_MAX_BYTES}バイト以内にヘッダーコメントが見つかりません"
+                              "（ファイルが大きすぎるか、バイナリが含まれています）。手動で確認してください。")
+        if missing_items:
+            auto_feedback += f"{source_filename}に"
+            auto_feedback += ",".join([f" {item}" for item in missing_items])
+            auto_feedback += "を記入してください。"
+    
+    return auto_feedback.strip()
+
+AUTO_CHECK_TIMEOUT_MESSAGE = "自動チェックがタイムアウトしました。手動で確認してください。"
+AUTO_CHECK_ERROR_MESSAGE = "自動チェック中にエラーが発生しました。手動で確認してください。"
+
+def file_sha1(path):
+    """ファイル内容のSHA-1ハッシュ"""
+    digest = hashlib.sha1()
+    read_bytes = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+            read_bytes += len(chunk)
+    count_file_read(read_bytes)
+    return digest.hexdigest()
+
+def submission_fingerprint(folder_path, files_in_folder, assignment_name, previous=None):
+    """
+    ソースとテスト履歴のmtime・サイズ・ハッシュを返す
+    mtimeとサイズが前回と同じファイルはハッシュを再計算しない
+    """
+    previous = previous or {}
+    fingerprint = {}
+    for key, filename in (('source', f"{assignment_name}.c"), ('history', f"{assignment_name}-test-history.txt")):
+        if filename not in files_in_folder:
+            fingerprint[key] = None
+            continue
+        path = os.path.join(folder_path, filename)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            # 一覧を取った後に消された場合
+            fingerprint[key] = None
+            continue
+        old = previous.get(key)
+        if old and old['mtime_ns'] == st.st_mtime_ns and old['size'] == st.st_size:
+            fingerprint[key] = old
+        else:
+            fingerprint[key] = {'mtime_ns': st.st_mtime_ns, 'size': st.st_size, 'sha1': file_sha1(path)}
+    return fingerprint
+
+def same_submission(fingerprint, previous):
+    """内容（サイズとハッシュ）が前回と同じか"""
+    if not previous:
+        return False
+    for key in ('source', 'history'):
+        new, old = fingerprint.get(key), previous.get(key)
+        if (new is None) != (old is None):
+            return False
+        if new is not None and (new['size'], new['sha1']) != (old['size'], old['sha1']):
+            return False
+    return True
+
+# 実行方式名 -> Executorクラス（Noneは逐次実行、processは自前のワーカープロセス）
+AUTO_CHECK_EXECUTORS = {
+    'serial': None,
+    'thread': ThreadPoolExecutor,
+    'process': None,
+}
+
+# タイムアウトの確認間隔（秒）
+AUTO_CHECK_POLL_INTERVAL = 0.2
+
+def _auto_check_result(future):
+    """1人分の結果（チェック中の例外はその学生のエラーとして扱い、全体を止めない）"""
+    try:
+        return future.result()
+    except Exception:
+        return AUTO_CHECK_ERROR_MESSAGE
+
+def _auto_check_worker(conn):
+    """自動チェックのワーカープロセス（親からタスクを1つずつ受け取り、結果を送り返す）"""
+    for task in iter(conn.recv, None):
+        try:
+            conn.send(auto_check_submission(*task))
+        except Exception:
+            conn.send(AUTO_CHECK_ERROR_MESSAGE)
+
+def _start_auto_check_worker():
+    parent_conn, child_conn = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=_auto_check_worker, args=(child_conn,), daemon=True)
+    process.start()
+    child_conn.close()
+    return parent_conn, process
+
+def _run_auto_checks_in_processes(tasks, max_workers, timeout, report):
+    """
+    自前で起動したワーカープロセスでチェックする（時間はワーカーにタスクを渡した時点から測る）
+    timeout秒たっても終わらないワーカーはそのプロセスだけを終了させ、残りは新しいワーカーで続ける
+    """
+    results = [None] * len(tasks)
+    completed = 0
+    next_task = 0
+    idle = []  # (親側の接続, プロセス)
+    busy = {}  # 親側の接続 -> (プロセス, タスクの番号, 渡した時刻)
+
+    def finish(i, result):
+        nonlocal completed
+        results[i] = result
+        completed += 1
+        if report:
+            report(completed, len(tasks))
+
+    def discard(conn, process):
+        process.terminate()
+        process.join()
+        conn.close()
+
+    try:
+        while completed < len(tasks):
+            while next_task < len(tasks) and len(busy) < max_workers:
+                while idle and not idle[-1][1].is_alive():
+                    discard(*idle.pop())
+                conn, process = idle.pop() if idle else _start_auto_check_worker()
+                conn.send(tasks[next_task])
+                busy[conn] = (process, next_task, time.monotonic())
+                next_task += 1
+
+            wait_for = None
+            if timeout:
+                oldest = min(started for _, _, started in busy.values())
+                wait_for = max(0, oldest + timeout - time.monotonic())
+            for conn in multiprocessing.connection.wait(list(busy), timeout=wait_for):
+                process, i, _ = busy.pop(conn)
+                try:
+                    finish(i, conn.recv())
+                except (EOFError, OSError):
+                    # ワーカーが落ちた（メモリ不足で強制終了された等）
+                    finish(i, AUTO_CHECK_ERROR_MESSAGE)
+                    discard(conn, process)
+                else:
+                    idle.append((conn, process))
+
+            now = time.monotonic()
+            for conn, (process, i, started) in list(busy.items()):
+                if timeout and now - started >= timeout:
+                    del busy[conn]
+                    discard(conn, process)
+                    finish(i, AUTO_CHECK_TIMEOUT_MESSAGE)
+    finally:
+        for conn, process in idle:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+            process.join()
+            conn.close()
+        for conn, (process, _, _) in busy.items():
+            discard(conn, process)
+    return results
+
+def run_auto_checks(tasks, executor=None, max_workers=None, timeout=None, report=None):
+    """
+    (folder_path, files_in_folder, assignment_name, header_fields) のリストを並列にチェックする
+    結果はtasksと同じ順序で返す。実行開始からtimeout秒たっても終わらない学生にはその旨のフィードバックを入れる
+    （プロセス方式ではワーカーへ渡された時点を開始とみなす）
+    チェック中に例外が出た学生にはエラーのフィードバックを入れ、残りの学生のチェックは続ける
+    スレッド方式でタイムアウトが出たら、まだ始まっていない分を新しいプールで続ける
+    止まったスレッドは外から終了させられないため、その処理が終わるまで残る
+    プロセス方式は止まったワーカープロセスだけを終了させる
+    reportが渡された場合は1人終わるごとに report(完了数, 総数) を呼ぶ
+    """
+    executor = executor or AUTO_CHECK_EXECUTOR
+    max_workers = max_workers or AUTO_CHECK_WORKERS
+    timeout = timeout if timeout is not None else AUTO_CHECK_TIMEOUT
+    if executor not in AUTO_CHECK_EXECUTORS:
+        raise ValueError(f'未対応の実行方式です: {executor}')
+
+    executor_class = AUTO_CHECK_EXECUTORS[executor]
+    if executor == 'process' and len(tasks) > 1:
+        return _run_auto_checks_in_processes(tasks, max_workers, timeout, report)
+    if executor_class is None or len(tasks) <= 1:
+        results = []
+        for task in tasks:
+            try:
+                results.append(auto_check_submission(*task))
+            except Exception:
+                results.append(AUTO_CHECK_ERROR_MESSAGE)
+            if report:
+                report(len(results), len(tasks))
+        return results
+
+    results = [None] * len(tasks)
+    completed = 0
+    pool = executor_class(max_workers=max_workers)
+    pending = {pool.submit(auto_check_submission, *task): i for i, task in enumerate(tasks)}
+    started = {}  # future -> 実行開始を確認した時刻
+    try:
+        while pending:
+            now = time.monotonic()
+            for future in pending:
+                if future not in started and future.running():
+                    started[future] = now
+            wait_for = AUTO_CHECK_POLL_INTERVAL
+            running = [started[f] for f in pending if f in started]
+            if timeout and running:
+                wait_for = min(wait_for, max(0, min(running) + timeout - now))
+            done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[pending.pop(future)] = _auto_check_result(future)
+                completed += 1
+                if report:
+                    report(completed, len(tasks))
+
+            now = time.monotonic()
+            expired = [f for f in pending if timeout and f in started and now - started[f] >= timeout]
+            if not expired:
+                continue
+            for future in expired:
+                results[pending.pop(future)] = AUTO_CHECK_TIMEOUT_MESSAGE
+                completed += 1
+                if report:
+                    report(completed, len(tasks))
+
+            # 止まったワーカーに枠を取られないよう、まだ始まっていない分は新しいプールで続ける
+            # 古いプールで実行中のものはそのまま待つ（結果は古いプールから受け取れる）
+            old_pool, pool = pool, executor_class(max_workers=max_workers)
+            moved = [f for f in pending if f.cancel()]
+            old_pool.shutdown(wait=False, cancel_futures=True)
+            for future in moved:
+                i = pending.pop(future)
+                started.pop(future, None)
+                pending[pool.submit(auto_check_submission, *tasks[i])] = i
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return results
+
+# --- テスト履歴の解析 ---
+# make testが全テスト成功時に出力する文言
+TEST_HISTORY_PASS_MARKER = 'すべてのテストに成功しました'
+# 索引の形式（解析方法を変えたら上げて作り直す）
+TEST_HISTORY_INDEX_VERSION = 1
+
+MONTHS = {name: i + 1 for i, name in enumerate('Jan Feb Mar Apr May Jun Jul Aug Sep Oct Nov Dec'.split())}
+
+# 実行日時の行（「2024-10-14 10:22:33」「2024年 10月 14日 月曜日 10:22:33 JST」「Mon Oct 14 10:22:33 JST 2024」）
+TEST_HISTORY_DATE_PATTERNS = (
+    re.compile(r'(?P<year>\d{4})\s*[-/年]\s*(?P<month>\d{1,2})\s*[-/月]\s*(?P<day>\d{1,2})\s*日?'
+               r'(?:\s*\S+曜日)?[\sT]*(?P<hour>\d{1,2}):(?P<minute>\d{2})(?::(?P<second>\d{2}))?'),
+    re.compile(r'\b(?:Mon|Tue|Wed|Thu|Fri|Sat|Sun)\s+(?P<month_name>[A-Z][a-z]{2})\s+(?P<day>\d{1,2})\s+'
+               r'(?P<hour>\d{1,2}):(?P<minute>\d{2}):(?P<second>\d{2})\s+(?:[A-Z]{2,5}\s+)?(?P<year>\d{4})'),
+)
+
+# テストケースごとの結果の行（「test1: OK」「テスト2 : 失敗」「[FAIL] test3」）
+TEST_HISTORY_CASE_PATTERNS = (
+    re.compile(r'^\s*(?P<name>\S.*?)\s*[:：]\s*(?P<result>OK|NG|PASS(?:ED)?|FAIL(?:ED)?|成功|失敗)(?!\w)', re.I),
+    re.compile(r'^\s*\[(?P<result>OK|NG|PASS(?:ED)?|FAIL(?:ED)?)\]\s*[:：]?\s*(?P<name>\S.*?)\s*$', re.I),
+)
+
+def _parse_history_date(line):
+    for pattern in TEST_HISTORY_DATE_PATTERNS:
+        match = pattern.search(line)
+        if not match:
+            continue
+        parts = match.groupdict()
+        month = MONTHS.get(parts['month_name']) if parts.get('month_name') else int(parts['month'])
+        try:
+            return datetime(int(parts['year']), month, int(parts['day']),
+                            int(parts['hour']), int(parts['minute']), int(parts['second'] or 0)).isoformat()
+        except (TypeError, ValueError):
+            return None
+    return None
+
+def parse_test_history(text):
+    """
+    テスト履歴を実行ごとに分けて集計する（日時の行ごとに1回の実行とみなし、日時がなければ全体で1回）
+    {attempts, last_run_at, last_passed, ever_passed, passed_cases, failed_cases, cases} を返す
+    """
+    attempts = []
+    current = {'run_at': None, 'lines': []}
+    for line in text.splitlines():
+        run_at = _parse_history_date(line)
+        if run_at is not None:
+            if current['run_at'] is not None or any(l.strip() for l in current['lines']):
+                attempts.append(current)
+            current = {'run_at': run_at, 'lines': []}
+            continue
+        current['lines'].append(line)
+    if current['run_at'] is not None or any(l.strip() for l in current['lines']):
+        attempts.append(current)
+    
+    def summarize(attempt):
+        cases = []
+        for line in attempt['lines']:
+            for pattern in TEST_HISTORY_CASE_PATTERNS:
+                match = pattern.match(line)
+                if match:
+                    result = match.group('result').upper()
+                    cases.append({'name': match.group('name'), 'passed': result in ('OK', 'PASS', 'PASSED', '成功')})
+                    break
+        passed = (any(TEST_HISTORY_PASS_MARKER in line for line in attempt['lines'])
+                  or (bool(cases) and all(case['passed'] for case in cases)))
+        return passed, cases
+    
+    summaries = [summarize(attempt) for attempt in attempts]
+    last_passed, last_cases = summaries[-1] if summaries else (None, [])
+    return {
+        'attempts': len(attempts),
+        'last_run_at': attempts[-1]['run_at'] if attempts else None,
+        'last_passed': last_passed,
+        'ever_passed': any(passed for passed, _ in summaries) if summaries else None,
+        'passed_cases': sum(1 for case in last_cases if case['passed']),
+        'failed_cases': sum(1 for case in last_cases if not case['passed']),
+        'cases': last_cases
+    }
+
+def update_test_history_index(ctx):
+    """
+    提出済みの学生のテスト履歴を解析して課題ごとの索引に保存する
+    mtime・サイズが前回と同じ履歴は解析し直さず、変更がなければ索引を書き換えない
+    """
+    history_filename = f"{ctx['source_file_name']}-test-history.txt"
+    previous = load_json_cached(ctx['test_history_index_path'])
+    if previous.get('version') != TEST_HISTORY_INDEX_VERSION or previous.get('history_file') != history_filename:
+        previous = {}
+    previous_students = previous.get('students', {})
+    df, _ = storage.load_roster(ctx)
+    submitted = df[df['ステータス'].astype(str).str.contains('提出済み', regex=False)]
+    
+    students = {}
+    parsed = 0
+    for student_id in submitted['広大ID'].dropna().astype(str):
+        folder_path = find_student_folder(student_id, ctx['submission_path'])
+        if not folder_path or history_filename not in list_student_files(folder_path):
+            continue
+        path = os.path.join(folder_path, history_filename)
+        stamp = list(file_stamp(path) or ())
+        entry = previous_students.get(student_id)
+        if entry is None or entry['stamp'] != stamp:
+            entry = {'stamp': stamp, **parse_test_history(read_text_file(path))}
+            parsed += 1
+        students[student_id] = entry
+    
+    if students != previous_students or not previous:
+        write_json(ctx['test_history_index_path'], {
+            'version': TEST_HISTORY_INDEX_VERSION,
+            'history_file': history_filename,
+            'indexed_at': datetime.now().isoformat(),
+            'students': students
+        }, ensure_ascii=False)
+    return {'total': len(students), 'parsed': parsed}
+
+# --- コンパイルとテスト実行 ---
+def test_run_unavailable_reason():
+    """テストを実行できない理由（実行できる場合はNone）"""
+    if not TEST_RUN_ENABLED:
+        return 'テストの実行は無効になっています（.envにTEST_RUN_ENABLED=1を設定してください）'
+    if sandbox_exec is None:
+        return 'この環境ではテストを実行できません'
+    if not TEST_RUN_USER and not TEST_RUN_WRAPPER:
+        return '学生のプログラムを隔離するため、TEST_RUN_USERかTEST_RUN_WRAPPERを設定してください'
+    if TEST_RUN_USER:
+        if pwd is None or os.geteuid() != 0:
+            return 'TEST_RUN_USERを使うにはバックエンドをrootで起動してください'
+        try:
+            pwd.getpwnam(TEST_RUN_USER)
+        except KeyError:
+            return f'TEST_RUN_USERのユーザー({TEST_RUN_USER})が見つかりません'
+    return None
+
+def test_run_limits():
+    """テスト実行の制限と隔離の設定（プロセスプールへ渡すため辞書にまとめる）"""
+    user = pwd.getpwnam(TEST_RUN_USER) if TEST_RUN_USER else None
+    return {
+        'cc': TEST_CC,
+        'cflags': TEST_CFLAGS,
+        'compile_timeout': TEST_COMPILE_TIMEOUT,
+        'timeout': TEST_RUN_TIMEOUT,
+        'cpu_seconds': TEST_RUN_CPU_SECONDS,
+        'memory_bytes': TEST_RUN_MEMORY_MB * 1024 ** 2,
+        'output_bytes': TEST_RUN_OUTPUT_MB * 1024 ** 2,
+        'max_processes': TEST_RUN_MAX_PROCESSES,
+        'uid': user.pw_uid if user else None,
+        'gid': user.pw_gid if user else None,
+        'wrapper': shlex.split(TEST_RUN_WRAPPER),
+    }
+
+def _sandbox_command(command, limits, run_limits=True):
+    """
+    制限と隔離をかけるヘルパー（sandbox_exec.py）とラッパーを前に付けたコマンド
+    ヘルパーはプロセス数を制限して実行用ユーザーに切り替えてからexecする。run_limits=Falseならコンパイル用に時間・メモリは制限しない
+    """
+    helper_limits = {key: limits[key] for key in
+                     ('max_processes', 'uid', 'gid', 'work_dir', 'cpu_seconds', 'memory_bytes', 'output_bytes')}
+    helper_limits['run_limits'] = run_limits
+    wrapper = [part.replace('{work_dir}', limits['work_dir']) for part in limits['wrapper']]
+    return [sys.executable, '-I', sandbox_exec.__file__, json.dumps(helper_limits), *wrapper, *command]
+
+PR_SET_CHILD_SUBREAPER = 36
+
+def _become_subreaper():
+    """setsidなどで抜け出した子孫プロセスも、親が終わるとこのプロセスの子になるようにする（Linuxのみ）"""
+    try:
+        ctypes.CDLL(None, use_errno=True).prctl(PR_SET_CHILD_SUBREAPER, 1, 0, 0, 0)
+    except (OSError, AttributeError):
+        pass
+
+def _child_pids():
+    """このプロセスの子プロセスのPID（/procから読む）"""
+    pids = set()
+    try:
+        names = os.listdir('/proc')
+    except OSError:
+        return pids
+    for name in names:
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat', 'rb') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # commに空白や括弧が入っても読めるよう、最後の')'の後ろを区切る
+        if int(stat[stat.rfind(b')') + 2:].split()[1]) == os.getpid():
+            pids.add(int(name))
+    return pids
+
+def _kill_leftovers(proc, existing):
+    """
+    テスト対象のプロセスグループと、残った子孫プロセス（existing以外の子）をすべて終了させる
+    proc自身はproc.wait()で回収して終了コードを残す（procが終わると子孫はこのプロセスに引き取られる）
+    """
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+    proc.wait()
+    for _ in range(100):
+        leftovers = _child_pids() - existing
+        if not leftovers:
+            return
+        for pid in leftovers:
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+
+def normalize_test_output(text):
+    """行末の空白と末尾の空行を無視して比べる"""
+    return '\n'.join(line.rstrip() for line in text.rstrip().splitlines())
+
+def run_test_case(executable, work_dir, case, limits):
+    """
+    コンパイル済みのプログラムを1つのテストケースで実行して結果を返す
+    status: passed / failed / timeout / runtime_error / output_limit
+    終了後はプロセスグループと残った子孫プロセスを必ず終了させる
+    """
+    output_path = os.path.join(work_dir, 'stdout.txt')
+    timeout = case.get('timeout', limits['timeout'])
+    existing = _child_pids()
+    started = time.monotonic()
+    with open(output_path, 'wb') as output:
+        proc = subprocess.Popen(
+            _sandbox_command([executable, *case.get('args', [])], limits),
+            stdin=subprocess.PIPE, stdout=output, stderr=subprocess.DEVNULL, cwd=work_dir,
+            env={'PATH': '/usr/bin:/bin', 'LANG': 'C.UTF-8', 'TMPDIR': work_dir},
+            start_new_session=True
+        )
+        status = None
+        try:
+            proc.communicate(case.get('input', '').encode('utf-8'), timeout=timeout)
+        except subprocess.TimeoutExpired:
+            status = 'timeout'
+        finally:
+            _kill_leftovers(proc, existing)
+    seconds = round(time.monotonic() - started, 3)
+    
+    returncode = proc.returncode
+    if status is None:
+        if returncode == -signal.SIGXFSZ:
+            status = 'output_limit'
+        elif returncode in (-signal.SIGXCPU, -signal.SIGKILL):
+            status = 'timeout'
+        elif returncode != case.get('exit_code', 0):
+            status = 'runtime_error'
+        elif 'expected' in case:
+            with open(output_path, 'r', encoding='utf-8', errors='replace') as f:
+                actual = f.read(limits['output_bytes'])
+            status = 'passed' if normalize_test_output(actual) == normalize_test_output(case['expected']) else 'failed'
+        else:
+            status = 'passed'
+    return {'name': case.get('name', ''), 'status': status, 'exit_code': returncode, 'seconds': seconds}
+
+def run_submission_tests(source_path, test_cases, limits):
+    """
+    1人分のソースを一時ディレクトリにコピーしてコンパイルし、テストケースを順に実行して結果を返す
+    コンパイラもプログラムも実行用ユーザー（またはラッパー）で動かし、書き込めるのは作業ディレクトリだけにする
+    プロセスプールのワーカーから呼ぶ（子孫プロセスを引き取って後始末するため）
+    """
+    _become_subreaper()
+    with tempfile.TemporaryDirectory(prefix='grading-test-') as work_dir:
+        limits = {**limits, 'work_dir': os.path.realpath(work_dir)}
+        source_name = os.path.basename(source_path)
+        shutil.copyfile(source_path, os.path.join(work_dir, 'source.c'))
+        if limits['uid'] is not None:
+            for path in (work_dir, os.path.join(work_dir, 'source.c')):
+                os.chown(path, limits['uid'], limits['gid'])
+            os.chmod(work_dir, 0o700)
+        executable = os.path.join(work_dir, 'a.out')
+        try:
+            compiled = subprocess.run(
+                _sandbox_command([limits['cc'], *limits['cflags'], '-o', executable, 'source.c', '-lm'], limits, run_limits=False),
+                cwd=work_dir, capture_output=True, text=True, errors='replace', timeout=limits['compile_timeout'],
+                env={'PATH': os.environ.get('PATH', '/usr/bin:/bin'), 'LANG': 'C.UTF-8', 'TMPDIR': limits['work_dir']}
+            )
+            if compiled.returncode == sandbox_exec.SETUP_FAILED:
+                # 隔離（ユーザーの切り替え・マウント名前空間）の準備に失敗した
+                compile_error = f'テスト実行の隔離に失敗しました: {compiled.stderr.strip()}'
+            elif compiled.returncode == sandbox_exec.EXEC_FAILED:
+                compile_error = f"コンパイラ({limits['cc']})が見つかりません"
+            elif compiled.returncode != 0:
+                # エラーメッセージのファイル名は提出されたファイル名にする
+                compile_error = compiled.stderr.replace('source.c', source_name)[-4000:]
+            else:
+                compile_error = None
+        except subprocess.TimeoutExpired:
+            compile_error = 'コンパイルがタイムアウトしました'
+        if compile_error is not None:
+            return {'compiled': False, 'compile_error': compile_error, 'passed': 0, 'total': len(test_cases), 'cases': []}
+        cases = [run_test_case(executable, work_dir, case, limits) for case in test_cases]
+    return {
+        'compiled': True,
+        'passed': sum(1 for case in cases if case['status'] == 'passed'),
+        'total': len(cases),
+        'cases': cases
+    }
+
+# --- バックグラウンドジョブ ---
+class JobCancelled(Exception):
+    """実行中のジョブがキャンセルされた"""
+
+def new_job_id():
+    return uuid.uuid4().hex
+
+class JobQueue:
+    """
+    ディスクに永続化するバックグラウンドジョブキュー（単一プロセスでの利用を想定）
+    - ジョブは jobs/<job_id>.json に保存し、再起動後は未完了のジョブを再投入する
+    - ハンドラは handler(params, report) の形で、report(完了数, 総数) で進捗を通知する
+    - キャンセル要求があると report の呼び出しで JobCancelled が送出される
+    """
+
+    FINISHED = ('succeeded', 'failed', 'cancelled')
+
+    def __init__(self, jobs_dir, workers=1):
+        self.jobs_dir = jobs_dir
+        self.workers = workers
+        self._handlers = {}
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._pending = queue.Queue()
+        self._started = False
+
+    def register(self, job_type, handler):
+        self._handlers[job_type] = handler
+
+    def job_dir(self, job_id):
+        """ジョブの添付ファイル（アップロードされたZIPなど）の置き場所"""
+        return os.path.join(self.jobs_dir, job_id)
+
+    def start(self):
+        """ワーカーを起動し、前回終了時に未完了だったジョブを再投入（最初のアクセス時に一度だけ）"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            os.makedirs(self.jobs_dir, exist_ok=True)
+            resumed = []
+            for name in os.listdir(self.jobs_dir):
+                if not name.endswith('.json'):
+                    continue
+                try:
+                    with open(os.path.join(self.jobs_dir, name), 'r') as f:
+                        job = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                self._jobs[job['id']] = job
+                if job['status'] not in self.FINISHED:
+                    job['status'] = 'queued'
+                    resumed.append(job)
+            for job in sorted(resumed, key=lambda j: j['created_at']):
+                self._save(job)
+                self._pending.put(job['id'])
+        for _ in range(self.workers):
+            threading.Thread(target=self._work, daemon=True).start()
+
+    def submit(self, job_type, params, job_id=None):
+        if job_type not in self._handlers:
+            raise ValueError(f'未登録のジョブ種別です: {job_type}')
+        self.start()
+        now = datetime.now().isoformat()
+        job = {
+            'id': job_id or new_job_id(),
+            'type': job_type,
+            'params': params,
+            'status': 'queued',
+            'progress': 0,
+            'cancel_requested': False,
+            'result': None,
+            'error': None,
+            'created_at': now,
+            'updated_at': now
+        }
+        with self._lock:
+            self._jobs[job['id']] = job
+            self._save(job)
+        self._pending.put(job['id'])
+        return dict(job)
+
+    def get(self, job_id):
+        self.start()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list(self):
+        self.start()
+        with self._lock:
+            jobs = [dict(job) for job in self._jobs.values()]
+        return sorted(jobs, key=lambda j: j['created_at'], reverse=True)
+
+    def cancel(self, job_id):
+        """待機中のジョブは即キャンセル、実行中のジョブにはキャンセルを要求"""
+        self.start()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job['status'] == 'queued':
+                self._finish(job, 'cancelled')
+            elif job['status'] == 'running':
+                job['cancel_requested'] = True
+                self._save(job)
+            return dict(job)
+
+    def _save(self, job):
+        # 書き込み途中で落ちても壊れないように一時ファイル経由で置き換える
+        job['updated_at'] = datetime.now().isoformat()
+        path = os.path.join(self.jobs_dir, f"{job['id']}.json")
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(job, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def _finish(self, job, status, result=None, error=None):
+        job['status'] = status
+        job['result'] = result
+        job['error'] = error
+        if status == 'succeeded':
+            job['progress'] = 100
+        self._save(job)
+        shutil.rmtree(self.job_dir(job['id']), ignore_errors=True)
+
+    def _work(self):
+        while True:
+            job_id = self._pending.get()
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job['status'] != 'queued':
+                    continue
+                job['status'] = 'running'
+                self._save(job)
+                handler = self._handlers.get(job['type'])
+                params = dict(job['params'])
+
+            def report(done, total, job=job):
+                with self._lock:
+                    progress = int(done * 100 / total) if total else 100
+                    if progress != job['progress']:
+                        job['progress'] = progress
+                        self._save(job)
+                    if job['cancel_requested']:
+                        raise JobCancelled()
+
+            try:
+                if handler is None:
+                    raise ValueError(f"未登録のジョブ種別です: {job['type']}")
+                result = handler(params, report)
+            except JobCancelled:
+                with self._lock:
+                    self._finish(job, 'cancelled')
+            except Exception as e:
+                with self._lock:
+                    self._finish(job, 'failed', error=str(e))
+            else:
+                with self._lock:
+                    self._finish(job, 'succeeded', result=result)
+
+job_queue = JobQueue(JOBS_DIR, JOB_WORKERS)
+
+# --- clang-format整形 ---
+CLANG_FORMAT_STYLE = 'Google'
+CLANG_FORMAT_TIMEOUT = 10
+
+class ClangFormatError(Exception):
+    """clang-formatの実行に失敗した（stderrがあれば保持）"""
+
+    def __init__(self, message, stderr=None):
+        super().__init__(message)
+        self.stderr = stderr
+
+_clang_format_version = None
+
+def clang_format_version():
+    """clang-format --version の出力（キャッシュのキーに含める、取得できない場合は'unknown'）"""
+    global _clang_format_version
+    if _clang_format_version is None:
+        try:
+            with timed('subprocess_seconds'):
+                result = subprocess.run(['clang-format', '--version'], capture_output=True, text=True, timeout=CLANG_FORMAT_TIMEOUT)
+            _clang_format_version = result.stdout.strip() or 'unknown'
+        except (OSError, subprocess.TimeoutExpired):
+            _clang_format_version = 'unknown'
+    return _clang_format_version
+
+def run_clang_format(original_code, style=CLANG_FORMAT_STYLE):
+    """ソースコードをclang-formatで整形し、整形結果・差分・変更行数を返す"""
+    try:
+        with timed('subprocess_seconds'):
+            result = subprocess.run(
+                ['clang-format', f'-style={style}', '-assume-filename=source.c'],
+                input=original_code,
+                capture_output=True,
+                text=True,
+                timeout=CLANG_FORMAT_TIMEOUT
+            )
+    except subprocess.TimeoutExpired:
+        raise ClangFormatError('clang-format timeout')
+    except OSError as e:
+        raise ClangFormatError(f'clang-format error: {str(e)}')
+    if result.returncode != 0:
+        raise ClangFormatError('clang-format failed', result.stderr)
+    
+    formatted_code = result.stdout
+    
+    # 差分を生成（unified diff形式）
+    diff_lines = list(difflib.unified_diff(
+        original_code.splitlines(keepends=True),
+        formatted_code.splitlines(keepends=True),
+        fromfile='元のコード',
+        tofile='整形済みコード',
+        lineterm=''
+    ))
+    
+    # 差分の行数をカウント
+    added_lines = sum(1 for line in diff_lines if line.startswith('+') and not line.startswith('+++'))
+    removed_lines = sum(1 for line in diff_lines if line.startswith('-') and not line.startswith('---'))
+    
+    return {
+        'formatted': formatted_code,
+        'diff': ''.join(diff_lines),
+        # 変更があるかチェック
+        'has_diff': original_code.strip() != formatted_code.strip(),
+        'stats': {
+            'added': added_lines,
+            'removed': removed_lines,
+            'total_changes': added_lines + removed_lines
+        }
+    }
+
+class FormatCache:
+    """
+    clang-formatの整形結果をソースの内容で引くディスクキャッシュ
+    - キーはソースのハッシュ・スタイル・clang-formatのバージョン（同じ内容なら学生・課題をまたいで共有）
+    - 再起動後も使えるよう1件1ファイルのJSONで保存する
+    - 合計サイズが上限を超えたら最も古く使われたもの（mtime順）から削除する
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes = None  # 初回の書き込み時にディレクトリを走査して求める
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, source_code, style=CLANG_FORMAT_STYLE):
+        digest = hashlib.sha256()
+        for part in (style, clang_format_version(), source_code):
+            digest.update(part.encode('utf-8', errors='surrogatepass'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f'{key}.json')
+
+    def get(self, key):
+        """キャッシュされた整形結果を返す（ない場合はNone）"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f, timed('json_parse_seconds'):
+                value = json.load(f)
+                count_file_read(os.fstat(f.fileno()).st_size)
+        except (FileNotFoundError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(path)  # LRUのために最終使用時刻を更新
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps(value, ensure_ascii=False).encode('utf-8')
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        with self._lock:
+            # 同じキーを上書きする場合は置き換え前のサイズを差し引く
+            try:
+                old_size = os.stat(path).st_size
+            except FileNotFoundError:
+                old_size = 0
+            os.replace(tmp_path, path)
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, size, _ in self._entries())
+            else:
+                self._total_bytes += len(data) - old_size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def contains(self, key):
+        return os.path.exists(self._path(key))
+
+    def get_or_format(self, source_code, style=CLANG_FORMAT_STYLE):
+        """整形結果をキャッシュから返し、なければclang-formatを実行して保存する"""
+        key = self.key(source_code, style)
+        value = self.get(key)
+        if value is None:
+            value = run_clang_format(source_code, style)
+            self.put(key, value)
+        return value
+
+    def _entries(self):
+        """(パス, サイズ, mtime) の一覧"""
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((path, st.st_size, st.st_mtime_ns))
+        return entries
+
+    def _evict(self):
+        # 上限の8割まで古いものから削除（毎回の書き込みで走査しないよう余裕を持たせる）
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.8
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.evictions += 1
+        self._total_bytes = total
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / total if total else 0.0,
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes
+            }
+
+format_cache = FormatCache(FORMAT_CACHE_DIR, FORMAT_CACHE_MAX_BYTES)
+
+def format_sources(sources, max_workers=None, report=None):
+    """
+    {キー: ソースコード} のうちキャッシュにないものをclang-formatで整形してキャッシュに保存する
+    clang-formatは別プロセスなのでスレッドプールで並列に起動する
+    失敗したものは {キー: エラーメッセージ} で返す
+    """
+    max_workers = FORMAT_WORKERS if max_workers is None else max_workers
+    missing = {key: source for key, source in sources.items() if not format_cache.contains(key)}
+    errors = {}
+    counters = current_request_counters()
+    
+    def format_one(key, source):
+        with measuring(counters):
+            format_cache.put(key, run_clang_format(source))
+    
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    try:
+        futures = {executor.submit(format_one, key, source): key for key, source in missing.items()}
+        for i, future in enumerate(as_completed(futures)):
+            if report:
+                report(i, len(futures))
+            try:
+                future.result()
+            except ClangFormatError as e:
+                errors[futures[future]] = str(e)
+    except BaseException:
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+    executor.shutdown()
+    return len(missing), errors
+
+# --- 提出物の類似度検出（MinHash/LSH） ---
+C_KEYWORDS = frozenset((
+    'auto break case char const continue default do double else enum extern float for goto if '
+    'inline int long register restrict return short signed sizeof static struct switch typedef '
+    'union unsigned void volatile while _Bool'
+).split())
+
+C_TOKEN_PATTERN = re.compile(r"""
+    (?P<skip>//[^\n]*|/\*.*?(?:\*/|\Z)|^[ \t]*\#[ \t]*include[^\n]*)
+  | (?P<string>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+  | (?P<name>[A-Za-z_]\w*)
+  | (?P<number>\.?\d(?:[eEpP][+-]|[\w.])*)
+  | (?P<op>->|\+\+|--|<<=?|>>=?|[-+*/%&|^!=<>]=|&&|\|\||\S)
+""", re.S | re.M | re.X)
+
+# MinHashの置換に使う素数（2**32より大きく、係数 < 2**32 なので積がuint64に収まる）
+MINHASH_PRIME = np.uint64(4294967311)
+
+def normalize_c_tokens(source):
+    """
+    Cのソースをトークン列にする（コメント・#include・空白は除き、識別子は I、文字列・文字は S にそろえる）
+    変数名の付け替えや書式の違いでは類似度が下がらないようにする
+    """
+    tokens = []
+    for match in C_TOKEN_PATTERN.finditer(source):
+        kind = match.lastgroup
+        if kind == 'skip':
+            continue
+        value = match.group()
+        if kind == 'name':
+            tokens.append(value if value in C_KEYWORDS else 'I')
+        elif kind == 'string':
+            tokens.append('S')
+        else:
+            tokens.append(value)
+    return tokens
+
+class MinHasher:
+    """トークンのk-gramの集合からMinHashの署名を作る（パラメータが同じなら署名は毎回同じ）"""
+
+    def __init__(self, shingle_size=SIMILARITY_SHINGLE_SIZE, permutations=SIMILARITY_PERMUTATIONS, seed=1):
+        self.shingle_size = shingle_size
+        self.permutations = permutations
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2 ** 32, size=(permutations, 1), dtype=np.uint64)
+        self._b = rng.integers(0, 2 ** 32, size=(permutations, 1), dtype=np.uint64)
+
+    def params(self):
+        return {'shingle_size': self.shingle_size, 'permutations': self.permutations, 'seed': self.seed}
+
+    def shingles(self, tokens):
+        k = self.shingle_size
+        return {zlib.crc32(' '.join(tokens[i:i + k]).encode('utf-8')) for i in range(len(tokens) - k + 1)}
+
+    def signature(self, source):
+        """署名（長さpermutationsの整数リスト）、k-gramが作れないほど短いソースはNone"""
+        shingles = self.shingles(normalize_c_tokens(source))
+        if not shingles:
+            return None
+        x = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+        hashed = (self._a * x % MINHASH_PRIME + self._b) % MINHASH_PRIME
+        return hashed.min(axis=1).tolist()
+
+def lsh_candidate_pairs(signatures, bands=SIMILARITY_BANDS):
+    """
+    {学生ID: 署名} を署名の帯ごとにバケットへ振り分け、どれかの帯が一致する組を候補として返す
+    全組み合わせを比べずに済み、推定類似度が (1/bands)**(bands/permutations) 前後より高い組がほぼ拾える
+    """
+    buckets = {}
+    for student_id, signature in signatures.items():
+        if bands <= 0 or len(signature) % bands != 0:
+            raise ValueError(f'バンド数（{bands}）が署名の長さ（{len(signature)}）の約数ではありません')
+        rows = len(signature) // bands
+        for band in range(bands):
+            key = (band, tuple(signature[band * rows:(band + 1) * rows]))
+            buckets.setdefault(key, []).append(student_id)
+    pairs = set()
+    for members in buckets.values():
+        for i in range(len(members)):
+            for j in range(i + 1, len(members)):
+                pairs.add((members[i], members[j]) if members[i] < members[j] else (members[j], members[i]))
+    return pairs
+
+def estimated_similarity(signature_a, signature_b):
+    """2つの署名から推定したk-gram集合のJaccard係数"""
+    return float(np.mean(np.asarray(signature_a) == np.asarray(signature_b)))
+
+# --- ソースの全文検索（トライグラム索引） ---
+def text_trigrams(text):
+    """小文字にした文字列の3文字ずつの集合（大文字・小文字を区別する検索でも候補の絞り込みに使える）"""
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def _skip_regex_escape(pattern, i):
+    """pattern[i]の'\\'から始まるエスケープの次の位置と、それが1文字のリテラルならその文字を返す"""
+    nxt = pattern[i + 1:i + 2]
+    if not nxt:
+        return i + 1, None
+    if not nxt.isalnum():
+        return i + 2, nxt
+    if nxt in 'nt':
+        return i + 2, '\n' if nxt == 'n' else '\t'
+    j = i + 2
+    if nxt in 'xuU':
+        j += {'x': 2, 'u': 4, 'U': 8}[nxt]
+    elif nxt == 'N':
+        j = pattern.find('}', j) + 1 or len(pattern)
+    elif nxt.isdigit():
+        while j < len(pattern) and pattern[j].isdigit():
+            j += 1
+    return j, None
+
+def regex_required_literals(pattern):
+    """
+    正規表現に一致する文字列に必ず含まれるリテラルの断片を返す（トライグラムでの絞り込み用）
+    グループの外の連続したリテラルだけを拾い、分からない場合は空リスト（絞り込みなし）にする
+    """
+    if re.compile(pattern).flags & re.VERBOSE:
+        return []
+    runs = []
+    current = []
+    depth = 0
+    i = 0
+    
+    def flush():
+        if current:
+            runs.append(''.join(current))
+            current.clear()
+    
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == '\\':
+            i, literal = _skip_regex_escape(pattern, i)
+            if literal is not None and depth == 0:
+                current.append(literal)
+            else:
+                flush()
+            continue
+        if ch == '[':
+            # 文字クラスは読み飛ばす（先頭の^や]もクラスの一部）
+            flush()
+            i += 1
+            if pattern[i:i + 1] == '^':
+                i += 1
+            if pattern[i:i + 1] == ']':
+                i += 1
+            while i < len(pattern) and pattern[i] != ']':
+                i += 2 if pattern[i] == '\\' else 1
+            i += 1
+            continue
+        if ch == '|' and depth == 0:
+            return []  # 選択肢のどれが一致するか分からない
+        if ch in '*?{':
+            # 直前の1文字は省略されうる
+            if current:
+                current.pop()
+            flush()
+            if ch == '{':
+                i = pattern.find('}', i) + 1 or len(pattern)
+                continue
+        elif ch == '(':
+            flush()
+            depth += 1
+        elif ch == ')':
+            flush()
+            depth = max(0, depth - 1)
+        elif ch in '.^$+|':
+            flush()
+        elif depth == 0:
+            current.append(ch)
+        i += 1
+    flush()
+    return runs
+
+class SearchIndex:
+    """
+    全課題の提出物のソースのトライグラム転置索引（SQLiteに保存）
+    - ファイルごとにmtime・サイズを記録し、変わったファイルだけ索引を作り直す
+    - 検索はクエリのトライグラムをすべて含むファイルに絞ってから、本文を照合する
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS search_assignments (
+            assignment_id TEXT PRIMARY KEY,
+            version TEXT NOT NULL,
+            indexed_at TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS search_files (
+            id INTEGER PRIMARY KEY,
+            assignment_id TEXT NOT NULL,
+            folder TEXT NOT NULL,
+            name TEXT NOT NULL,
+            student_id TEXT NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            content TEXT NOT NULL,
+            UNIQUE (assignment_id, folder, name)
+        );
+        CREATE TABLE IF NOT EXISTS search_trigrams (
+            trigram TEXT NOT NULL,
+            file_id INTEGER NOT NULL,
+            PRIMARY KEY (trigram, file_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_search_trigrams_file ON search_trigrams (file_id);
+    '''
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+
+    def connection(self):
+        """スレッドごとの接続を返す"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(self.SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def submission_version(submission_index):
+        """提出ディレクトリと学生フォルダのmtimeから作るバージョン（検索時の更新要否の判定用）"""
+        return submission_index.version()
+
+    def update(self, ctx):
+        """
+        課題の提出物のうち前回から変わったファイルの索引を作り直し、消えたファイルを索引から除く
+        {indexed, removed, unchanged} を返す
+        """
+        assignment_id = ctx['key']
+        submission_index = load_submission_index(ctx['submission_path'])
+        conn = self.connection()
+        with self._write_lock:
+            stored = {
+                (row['folder'], row['name']): row
+                for row in conn.execute(
+                    'SELECT id, folder, name, mtime_ns, size FROM search_files WHERE assignment_id = ?', (assignment_id,)
+                )
+            }
+            indexed = unchanged = 0
+            seen = set()
+            folder_names = list(submission_index.folders) if submission_index else []
+            with conn:
+                for folder_name in folder_names:
+                    for name in submission_index.files(folder_name):
+                        if not name.endswith(SEARCH_EXTENSIONS):
+                            continue
+                        path = os.path.join(submission_index.base_dir, folder_name, name)
+                        stamp = file_stamp(path)
+                        if stamp is None or stamp[1] > SEARCH_MAX_FILE_BYTES:
+                            continue
+                        seen.add((folder_name, name))
+                        old = stored.get((folder_name, name))
+                        if old is not None and (old['mtime_ns'], old['size']) == stamp:
+                            unchanged += 1
+                            continue
+                        content = read_text_file(path)
+                        if old is not None:
+                            self._delete_file(conn, old['id'])
+                        cursor = conn.execute(
+                            'INSERT INTO search_files (assignment_id, folder, name, student_id, mtime_ns, size, content) '
+                            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                            (assignment_id, folder_name, name, folder_name.split('_')[0], stamp[0], stamp[1], content)
+                        )
+                        conn.executemany(
+                            'INSERT INTO search_trigrams (trigram, file_id) VALUES (?, ?)',
+                            ((trigram, cursor.lastrowid) for trigram in text_trigrams(content))
+                        )
+                        indexed += 1
+                removed = [row['id'] for key, row in stored.items() if key not in seen]
+                for file_id in removed:
+                    self._delete_file(conn, file_id)
+                conn.execute(
+                    'INSERT OR REPLACE INTO search_assignments (assignment_id, version, indexed_at) VALUES (?, ?, ?)',
+                    (assignment_id, self.submission_version(submission_index) if submission_index else '',
+                     datetime.now().isoformat())
+                )
+        return {'indexed': indexed, 'removed': len(removed), 'unchanged': unchanged}
+
+    def _delete_file(self, conn, file_id):
+        conn.execute('DELETE FROM search_trigrams WHERE file_id = ?', (file_id,))
+        conn.execute('DELETE FROM search_files WHERE id = ?', (file_id,))
+
+    def refresh(self, assignment_ids):
+        """提出フォルダが前回の索引作成から変わった課題だけ索引を更新する"""
+        versions = {
+            row['assignment_id']: row['version']
+            for row in self.connection().execute('SELECT assignment_id, version FROM search_assignments')
+        }
+        for assignment_id in assignment_ids:
+            ctx = assignment_context(assignment_id)
+            submission_index = load_submission_index(ctx['submission_path'])
+            version = self.submission_version(submission_index) if submission_index else ''
+            if versions.get(assignment_id) != version:
+                self.update(ctx)
+
+    def selective_trigrams(self, trigrams, max_trigrams):
+        """含むファイルが少ない順にmax_trigrams個のトライグラムを選ぶ（SQLの変数の数を抑える）"""
+        counts = dict.fromkeys(trigrams, 0)
+        trigrams = sorted(trigrams)
+        for i in range(0, len(trigrams), 500):
+            chunk = trigrams[i:i + 500]
+            for trigram, count in self.connection().execute(
+                f'SELECT trigram, COUNT(*) FROM search_trigrams WHERE trigram IN ({",".join("?" * len(chunk))}) GROUP BY trigram',
+                chunk
+            ):
+                counts[trigram] = count
+        return sorted(trigrams, key=counts.get)[:max_trigrams]
+
+    def candidate_rows(self, literals, assignment_id=None, max_trigrams=None):
+        """
+        リテラルの断片のトライグラムをすべて含むファイルの行（3文字以上の断片がなければ全ファイル）
+        トライグラムが多い場合は絞り込みの効くmax_trigrams個（既定: SEARCH_MAX_TRIGRAMS）だけで絞り込む
+        """
+        max_trigrams = max_trigrams or SEARCH_MAX_TRIGRAMS
+        trigrams = set()
+        for literal in literals:
+            trigrams |= text_trigrams(literal)
+        conn = self.connection()
+        where, params = ('WHERE f.assignment_id = ?', [assignment_id]) if assignment_id else ('', [])
+        if not trigrams:
+            return conn.execute(f'SELECT f.* FROM search_files f {where} ORDER BY f.assignment_id, f.folder, f.name', params)
+        if len(trigrams) > max_trigrams:
+            trigrams = self.selective_trigrams(trigrams, max_trigrams)
+        placeholders = ','.join('?' * len(trigrams))
+        return conn.execute(
+            f'SELECT f.* FROM search_files f JOIN ('
+            f'  SELECT file_id FROM search_trigrams WHERE trigram IN ({placeholders})'
+            f'  GROUP BY file_id HAVING COUNT(*) = ?'
+            f') t ON t.file_id = f.id {where} ORDER BY f.assignment_id, f.folder, f.name',
+            [*trigrams, len(trigrams), *params]
+        )
+
+    @staticmethod
+    def find_matches(pattern, content, max_matches, deadline):
+        """
+        contentの中で一致した行を最大max_matches件返す
+        照合はregexモジュールで行い、deadline（time.monotonic()の値）を過ぎたらTimeoutErrorを送出する
+        """
+        matches = []
+        pos = 0
+        while len(matches) < max_matches and pos <= len(content):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError('regex timed out')
+            match = pattern.search(content, pos, timeout=remaining)
+            if match is None:
+                break
+            line_start = content.rfind('\n', 0, match.start()) + 1
+            line_end = content.find('\n', match.start())
+            matches.append({
+                'line': content.count('\n', 0, match.start()) + 1,
+                'text': content[line_start:line_end if line_end != -1 else len(content)][:500]
+            })
+            # 空文字列に一致した場合は1文字進める
+            pos = match.end() if match.end() > match.start() else match.end() + 1
+        return matches
+
+    def search(self, query, is_regex=False, ignore_case=False, assignment_id=None, limit=100, max_matches=20,
+               max_candidates=None, max_scan_bytes=None, timeout=None):
+        """
+        部分一致または正規表現でソースを検索し、一致したファイルと行を返す
+        照合するファイルはmax_candidates件（既定: SEARCH_MAX_CANDIDATES）・合計max_scan_bytesバイト（既定: SEARCH_MAX_SCAN_BYTES）まで、
+        照合の時間はtimeout秒（既定: SEARCH_MATCH_TIMEOUT）までで、超えた場合はtruncatedにする（時間切れはtimed_outも立てる）
+        {results: [{assignment_id, student_id, folder, file, matches: [{line, text}]}], candidates, truncated, timed_out}
+        """
+        max_candidates = max_candidates or SEARCH_MAX_CANDIDATES
+        max_scan_bytes = max_scan_bytes or SEARCH_MAX_SCAN_BYTES
+        deadline = time.monotonic() + (timeout or SEARCH_MATCH_TIMEOUT)
+        # 構文はreと同じ（regexモジュールのVERSION0）で、照合に時間制限をかけられる
+        flags = regex.M | (regex.I if ignore_case else 0)
+        pattern = regex.compile(query if is_regex else regex.escape(query), flags)
+        literals = regex_required_literals(query) if is_regex else [query]
+        results = []
+        candidates = 0
+        scanned_bytes = 0
+        truncated = timed_out = False
+        for row in self.candidate_rows(literals, assignment_id):
+            if candidates >= max_candidates or scanned_bytes >= max_scan_bytes:
+                truncated = True
+                break
+            candidates += 1
+            scanned_bytes += row['size']
+            try:
+                matches = self.find_matches(pattern, row['content'], max_matches, deadline)
+            except TimeoutError:
+                truncated = timed_out = True
+                break
+            if not matches:
+                continue
+            if len(results) >= limit:
+                truncated = True
+                break
+            results.append({
+                'assignment_id': row['assignment_id'],
+                'student_id': row['student_id'],
+                'folder': row['folder'],
+                'file': row['name'],
+                'matches': matches
+            })
+        return {'results': results, 'candidates': candidates, 'truncated': truncated, 'timed_out': timed_out}
+
+search_index = SearchIndex(SEARCH_INDEX_PATH)
+
+def _search_index_job(params, report):
+    return search_index.update(assignment_context(params['assignment_id']))
+
+job_queue.register('search_index', _search_index_job)
+
+# --- 採点データの保存方式 ---
+# 一括整形の結果（学生ごとの整形キャッシュのキーと変更行数）
+FORMAT_RESULTS_FILE = 'format_results.json'
+# テスト履歴の索引（学生ごとの実行回数・最後の実行の合否など）
+TEST_HISTORY_INDEX_FILE = 'test_history_index.json'
+# テスト実行の結果（学生ごとの合否とテストケースごとの結果）
+TEST_RESULTS_FILE = 'test_results.json'
+# 類似度検出の結果（似ている学生の組とMinHashの署名）
+SIMILARITY_RESULTS_FILE = 'similarity.json'
+
+def assignment_context(assignment_id=None):
+    """課題のファイルパスと設定をまとめて返す（assignment_idがNoneの場合は.envで指定した課題）"""
+    if not assignment_id:
+        # 後方互換性のため
+        return {
+            'id': None,
+            'key': os.path.basename(os.path.normpath(BASE_PATH)),
+            'base_path': BASE_PATH,
+            'csv_path': CSV_PATH,
+            'feedback_csv_path': FEEDBACK_CSV_PATH,
+            'review_status_path': REVIEW_STATUS_PATH,
+            'auto_check_path': AUTO_CHECK_PATH,
+            'format_results_path': os.path.join(BASE_PATH, FORMAT_RESULTS_FILE),
+            'similarity_path': os.path.join(BASE_PATH, SIMILARITY_RESULTS_FILE),
+            'test_results_path': os.path.join(BASE_PATH, TEST_RESULTS_FILE),
+            'test_history_index_path': os.path.join(BASE_PATH, TEST_HISTORY_INDEX_FILE),
+            'submission_path': SUBMISSION_PATH,
+            'source_file_name': ASSIGNMENT_NAME,
+            'config': {}
+        }
+    assignment_base_path = os.path.join(DATA_DIR, assignment_id)
+    # config.jsonから設定を読み込む（ない場合のフォールバックは通常は発生しない）
+    config = load_assignment_config(assignment_base_path) or {}
+    return {
+        'id': assignment_id,
+        'key': assignment_id,
+        'base_path': assignment_base_path,
+        'csv_path': os.path.join(assignment_base_path, 'list.csv'),
+        'feedback_csv_path': os.path.join(assignment_base_path, 'list_feedback.csv'),
+        'review_status_path': os.path.join(assignment_base_path, 'review_status.json'),
+        'auto_check_path': os.path.join(assignment_base_path, 'auto_check_results.json'),
+        'format_results_path': os.path.join(assignment_base_path, FORMAT_RESULTS_FILE),
+        'similarity_path': os.path.join(assignment_base_path, SIMILARITY_RESULTS_FILE),
+        'test_results_path': os.path.join(assignment_base_path, TEST_RESULTS_FILE),
+        'test_history_index_path': os.path.join(assignment_base_path, TEST_HISTORY_INDEX_FILE),
+        'submission_path': os.path.join(assignment_base_path, config.get('submission_dir', 'submissions')),
+        'source_file_name': config.get('source_file_name', 'assignment'),
+        'config': config
+    }
+
+def read_roster_files(ctx):
+    """フィードバックCSVを読み込み（存在しない場合は元の名簿CSVから作成）"""
+    if ctx['id'] is None:
+        return initialize_feedback_csv()
+    if not os.path.exists(ctx['feedback_csv_path']):
+        df = read_feedback_csv(ctx['csv_path'])
+        
+        if 'フィードバックコメント' not in df.columns:
+            df['フィードバックコメント'] = ''
+        
+        write_feedback_csv(df, ctx['feedback_csv_path'])
+        return df
+    return read_feedback_csv(ctx['feedback_csv_path'])
+
+def merge_roster_rows(current, new):
+    """
+    既存の名簿に新しい名簿CSVの内容を広大IDで突き合わせて反映し、(名簿, 追加数, 更新数) を返す
+    - 既存の学生はフィードバックコメント以外の列を新しい値で更新する
+    - 新しい学生は末尾に追加する（既存の行の順序とフィードバックはそのまま）
+    """
+    new = new.drop(columns=['フィードバックコメント'], errors='ignore')
+    new = new.drop_duplicates('広大ID', keep='last')
+    new_ids = new['広大ID'].astype(str)
+    current_ids = current['広大ID'].astype(str)
+    
+    merged = current.astype(object)
+    for col in new.columns:
+        if col not in merged.columns:
+            merged[col] = None
+    lookup = new.astype(object).set_index(new_ids)
+    matched = current_ids.isin(lookup.index)
+    for col in new.columns:
+        if col != '広大ID':
+            merged.loc[matched, col] = current_ids[matched].map(lookup[col])
+    
+    added = new[~new_ids.isin(set(current_ids))]
+    merged = pd.concat([merged, added.astype(object)], ignore_index=True)
+    if 'フィードバックコメント' in merged.columns:
+        # フィードバックコメント列は末尾に置く
+        merged = merged[[col for col in merged.columns if col != 'フィードバックコメント'] + ['フィードバックコメント']]
+    return merged, len(added), int(matched.sum())
+
+class RosterIndex:
+    """
+    保存ログを反映済みの名簿を広大IDで引けるようにしたもの
+    - 同じ広大IDが複数ある場合は先頭の行を返す
+    - df・review_statusは共有されるため変更しないこと
+    """
+
+    def __init__(self, df, review_status):
+        self.df = df
+        self.review_status = review_status
+        self.by_id = {}
+        for record in df.to_dict('records'):
+            self.by_id.setdefault(str(record['広大ID']), record)
+
+    def find(self, hirodai_id):
+        """学生の行の辞書のコピーを返す（見つからない場合はNone）"""
+        record = self.by_id.get(str(hirodai_id))
+        return dict(record) if record is not None else None
+
+class FileAssignmentStore:
+    """
+    課題ディレクトリのCSV/JSONファイルに保存する方式（既定）
+    - 名簿: list_feedback.csv（フィードバックは feedback_journal.jsonl に追記）
+    - レビュー状態: review_status.json ＋ 追記ログ
+    - 自動チェック結果: auto_check_results.json
+    - 名簿はCSV・review_status.json・ログが変わるまでRosterIndexとして保持する
+    """
+
+    name = 'file'
+
+    def __init__(self, max_assignments):
+        self._rosters = VersionedCache(max_assignments)
+
+    def data_version(self, ctx):
+        """名簿・レビュー状態・自動チェック結果のいずれかが変わると値が変わる"""
+        return (
+            file_stamp(ctx['feedback_csv_path']),
+            file_stamp(ctx['review_status_path']),
+            feedback_journal(ctx['base_path']).version(),
+            file_stamp(ctx['auto_check_path'])
+        )
+
+    def roster_index(self, ctx):
+        """課題の名簿のRosterIndexを返す（変更がなければキャッシュを返す）"""
+        def build():
+            df = read_roster_files(ctx)
+            review_status = load_json_cached(ctx['review_status_path'])
+            df, review_status = apply_feedback_journal(df, review_status, ctx['base_path'])
+            return RosterIndex(df, review_status)
+        version = (
+            file_stamp(ctx['feedback_csv_path']),
+            file_stamp(ctx['review_status_path']),
+            feedback_journal(ctx['base_path']).version()
+        )
+        return self._rosters.get(os.path.abspath(ctx['base_path']), version, build)
+
+    def load_roster(self, ctx):
+        """(名簿DataFrame, レビュー状態辞書) を返す"""
+        index = self.roster_index(ctx)
+        return index.df.copy(), index.review_status
+
+    def find_student(self, ctx, hirodai_id):
+        """(学生の行の辞書, レビュー済みか) を返す（見つからない場合は (None, False)）"""
+        index = self.roster_index(ctx)
+        student = index.find(hirodai_id)
+        if student is None:
+            return None, False
+        return student, bool(index.review_status.get(str(hirodai_id)))
+
+    def save_feedback(self, ctx, hirodai_id, feedback):
+        # フィードバックとレビュー状態を保存ログに1行追記（CSVはエクスポート時に書き出す）
+        feedback_journal(ctx['base_path']).append(hirodai_id, feedback, reviewed=True)
+
+    def load_auto_check(self, ctx):
+        return load_json_cached(ctx['auto_check_path'])
+
+    def save_auto_check(self, ctx, data):
+        write_json(ctx['auto_check_path'], data, ensure_ascii=False, indent=2)
+
+    def update_auto_check_result(self, ctx, hirodai_id, auto_feedback, assignment_name):
+        """1人分の自動チェック結果を更新"""
+        auto_check_data = dict(self.load_auto_check(ctx))
+        if 'results' not in auto_check_data:
+            auto_check_data = {
+                'checked_at': datetime.now().isoformat(),
+                'assignment': assignment_name,
+                'results': {}
+            }
+        else:
+            # キャッシュされた辞書を直接変更しないようにコピー
+            auto_check_data['results'] = dict(auto_check_data['results'])
+        auto_check_data['results'][str(hirodai_id)] = auto_feedback
+        self.save_auto_check(ctx, auto_check_data)
+
+    def export_roster(self, ctx):
+        """保存ログの内容をCSVに書き出し、エクスポート用のDataFrameを返す"""
+        read_roster_files(ctx)
+        return materialize_feedback_csv(ctx['base_path'], ctx['feedback_csv_path'], ctx['review_status_path'])
+
+    def merge_roster(self, ctx, new_df):
+        """新しい名簿を既存の名簿にマージし、(追加数, 更新数) を返す（フィードバック・レビュー状態は保持）"""
+        # 保存ログをCSVに書き出してからマージする（ログはCSVの上に重ねて読まれるため以後の保存も失われない）
+        merged, added, updated = merge_roster_rows(self.export_roster(ctx), new_df)
+        write_feedback_csv(merged, ctx['feedback_csv_path'])
+        return added, updated
+
+class SqliteAssignmentStore:
+    """
+    名簿・フィードバック・レビュー状態・自動チェック結果を1つのSQLiteデータベースに保存する方式
+    - 学生の検索は (課題, 広大ID) のインデックスを使う
+    - まだ取り込んでいない課題は初回アクセス時に課題ディレクトリのファイルから取り込む
+    - エクスポート時はlist_feedback.csvとreview_status.jsonにも書き出す（file方式に戻せるように）
+    """
+
+    name = 'sqlite'
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS assignments (
+            key TEXT PRIMARY KEY,
+            columns TEXT NOT NULL,
+            auto_check_meta TEXT,
+            imported_at TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS students (
+            assignment_key TEXT NOT NULL,
+            row_order INTEGER NOT NULL,
+            hirodai_id TEXT,
+            data TEXT NOT NULL,
+            feedback TEXT,
+            reviewed INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (assignment_key, row_order)
+        );
+        CREATE INDEX IF NOT EXISTS idx_students_hirodai_id ON students (assignment_key, hirodai_id);
+        CREATE TABLE IF NOT EXISTS auto_check_results (
+            assignment_key TEXT NOT NULL,
+            hirodai_id TEXT NOT NULL,
+            result TEXT NOT NULL,
+            fingerprint TEXT,
+            PRIMARY KEY (assignment_key, hirodai_id)
+        );
+        CREATE TABLE IF NOT EXISTS assignment_revisions (
+            assignment_key TEXT PRIMARY KEY,
+            revision INTEGER NOT NULL
+        );
+    '''
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._imported = set()
+        self._import_lock = threading.Lock()
+
+    def connection(self):
+        """スレッドごとの接続を返す"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(self.SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _ensure_imported(self, ctx):
+        key = ctx['key']
+        if key in self._imported:
+            return
+        with self._import_lock:
+            if key in self._imported:
+                return
+            row = self.connection().execute('SELECT 1 FROM assignments WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.import_assignment(ctx)
+            self._imported.add(key)
+
+    def _bump_revision(self, conn, key):
+        # 書き込みのたびに課題のリビジョンを上げる（キャッシュの破棄判定に使う）
+        conn.execute(
+            'INSERT INTO assignment_revisions (assignment_key, revision) VALUES (?, 1) '
+            'ON CONFLICT (assignment_key) DO UPDATE SET revision = revision + 1',
+            (key,)
+        )
+
+    def data_version(self, ctx):
+        """課題のデータが書き換わるたびに値が変わる"""
+        self._ensure_imported(ctx)
+        row = self.connection().execute(
+            'SELECT revision FROM assignment_revisions WHERE assignment_key = ?', (ctx['key'],)
+        ).fetchone()
+        return (self.db_path, row['revision'] if row else 0)
+
+    def import_assignment(self, ctx):
+        """課題ディレクトリのCSV/JSONファイルの内容で、この課題のデータを置き換える"""
+        files = FileAssignmentStore(FILE_CACHE_MAX_ASSIGNMENTS)
+        # 保存ログをCSVに反映してから読み込む
+        df = files.export_roster(ctx)
+        review_status = load_json_cached(ctx['review_status_path'])
+        auto_check_data = files.load_auto_check(ctx)
+        
+        columns = [str(col) for col in df.columns]
+        records = df.astype(object).where(df.notna(), None).to_dict('records')
+        results = auto_check_data.get('results', {}) if auto_check_data else {}
+        fingerprints = auto_check_data.get('fingerprints', {}) if auto_check_data else {}
+        meta = {k: v for k, v in (auto_check_data or {}).items() if k not in ('results', 'fingerprints')}
+        
+        conn = self.connection()
+        with conn:
+            key = ctx['key']
+            conn.execute('DELETE FROM students WHERE assignment_key = ?', (key,))
+            conn.execute('DELETE FROM auto_check_results WHERE assignment_key = ?', (key,))
+            conn.execute(
+                'INSERT OR REPLACE INTO assignments (key, columns, auto_check_meta, imported_at) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(columns, ensure_ascii=False), json.dumps(meta, ensure_ascii=False) if meta else None,
+                 datetime.now().isoformat())
+            )
+            conn.executemany(
+                'INSERT INTO students (assignment_key, row_order, hirodai_id, data, feedback, reviewed) VALUES (?, ?, ?, ?, ?, ?)',
+                [
+                    (key, i, None if record.get('広大ID') is None else str(record['広大ID']),
+                     json.dumps({k: v for k, v in record.items() if k != 'フィードバックコメント'}, ensure_ascii=False),
+                     record.get('フィードバックコメント'),
+                     1 if review_status.get(str(record.get('広大ID')).strip()) else 0)
+                    for i, record in enumerate(records)
+                ]
+            )
+            conn.executemany(
+                'INSERT INTO auto_check_results (assignment_key, hirodai_id, result, fingerprint) VALUES (?, ?, ?, ?)',
+                [
+                    (key, student_id, result,
+                     json.dumps(fingerprints[student_id]) if student_id in fingerprints else None)
+                    for student_id, result in results.items()
+                ]
+            )
+            self._bump_revision(conn, key)
+        self._imported.add(ctx['key'])
+        return len(records)
+
+    def _columns(self, ctx):
+        row = self.connection().execute('SELECT columns FROM assignments WHERE key = ?', (ctx['key'],)).fetchone()
+        return json.loads(row['columns'])
+
+    def _student_dict(self, row, with_feedback_column=True):
+        student = json.loads(row['data'])
+        if with_feedback_column or row['feedback'] is not None:
+            student['フィードバックコメント'] = row['feedback']
+        return student
+
+    def load_roster(self, ctx):
+        self._ensure_imported(ctx)
+        rows = self.connection().execute(
+            'SELECT hirodai_id, data, feedback, reviewed FROM students WHERE assignment_key = ? ORDER BY row_order',
+            (ctx['key'],)
+        ).fetchall()
+        columns = self._columns(ctx)
+        if 'フィードバックコメント' not in columns and any(row['feedback'] is not None for row in rows):
+            columns.append('フィードバックコメント')
+        df = pd.DataFrame([self._student_dict(row) for row in rows], columns=columns)
+        review_status = {row['hirodai_id']: True for row in rows if row['reviewed']}
+        return df, review_status
+
+    def find_student(self, ctx, hirodai_id):
+        self._ensure_imported(ctx)
+        row = self.connection().execute(
+            'SELECT data, feedback, reviewed FROM students WHERE assignment_key = ? AND hirodai_id = ? ORDER BY row_order LIMIT 1',
+            (ctx['key'], str(hirodai_id))
+        ).fetchone()
+        if row is None:
+            return None, False
+        with_feedback_column = 'フィードバックコメント' in self._columns(ctx)
+        return self._student_dict(row, with_feedback_column), bool(row['reviewed'])
+
+    def save_feedback(self, ctx, hirodai_id, feedback):
+        self._ensure_imported(ctx)
+        conn = self.connection()
+        with conn:
+            conn.execute(
+                'UPDATE students SET feedback = ?, reviewed = 1 WHERE assignment_key = ? AND hirodai_id = ?',
+                (feedback, ctx['key'], str(hirodai_id))
+            )
+            self._bump_revision(conn, ctx['key'])
+
+    def load_auto_check(self, ctx):
+        self._ensure_imported(ctx)
+        conn = self.connection()
+        row = conn.execute('SELECT auto_check_meta FROM assignments WHERE key = ?', (ctx['key'],)).fetchone()
+        if row is None or row['auto_check_meta'] is None:
+            return {}
+        data = json.loads(row['auto_check_meta'])
+        data['results'] = {}
+        data['fingerprints'] = {}
+        for result in conn.execute(
+            'SELECT hirodai_id, result, fingerprint FROM auto_check_results WHERE assignment_key = ?', (ctx['key'],)
+        ):
+            data['results'][result['hirodai_id']] = result['result']
+            if result['fingerprint']:
+                data['fingerprints'][result['hirodai_id']] = json.loads(result['fingerprint'])
+        return data
+
+    def save_auto_check(self, ctx, data):
+        self._ensure_imported(ctx)
+        meta = {k: v for k, v in data.items() if k not in ('results', 'fingerprints')}
+        fingerprints = data.get('fingerprints', {})
+        conn = self.connection()
+        with conn:
+            conn.execute('UPDATE assignments SET auto_check_meta = ? WHERE key = ?',
+                         (json.dumps(meta, ensure_ascii=False), ctx['key']))
+            conn.execute('DELETE FROM auto_check_results WHERE assignment_key = ?', (ctx['key'],))
+            conn.executemany(
+                'INSERT INTO auto_check_results (assignment_key, hirodai_id, result, fingerprint) VALUES (?, ?, ?, ?)',
+                [
+                    (ctx['key'], student_id, result,
+                     json.dumps(fingerprints[student_id]) if student_id in fingerprints else None)
+                    for student_id, result in data.get('results', {}).items()
+                ]
+            )
+            self._bump_revision(conn, ctx['key'])
+
+    def update_auto_check_result(self, ctx, hirodai_id, auto_feedback, assignment_name):
+        self._ensure_imported(ctx)
+        conn = self.connection()
+        with conn:
+            row = conn.execute('SELECT auto_check_meta FROM assignments WHERE key = ?', (ctx['key'],)).fetchone()
+            if row['auto_check_meta'] is None:
+                meta = {'checked_at': datetime.now().isoformat(), 'assignment': assignment_name}
+                conn.execute('UPDATE assignments SET auto_check_meta = ? WHERE key = ?',
+                             (json.dumps(meta, ensure_ascii=False), ctx['key']))
+            conn.execute(
+                'INSERT INTO auto_check_results (assignment_key, hirodai_id, result) VALUES (?, ?, ?) '
+                'ON CONFLICT (assignment_key, hirodai_id) DO UPDATE SET result = excluded.result',
+                (ctx['key'], str(hirodai_id), auto_feedback)
+            )
+            self._bump_revision(conn, ctx['key'])
+
+    def merge_roster(self, ctx, new_df):
+        df, review_status = self.load_roster(ctx)
+        merged, added, updated = merge_roster_rows(df, new_df)
+        records = merged.where(merged.notna(), None).to_dict('records')
+        conn = self.connection()
+        with conn:
+            key = ctx['key']
+            conn.execute('UPDATE assignments SET columns = ? WHERE key = ?',
+                         (json.dumps([str(col) for col in merged.columns], ensure_ascii=False), key))
+            conn.execute('DELETE FROM students WHERE assignment_key = ?', (key,))
+            conn.executemany(
+                'INSERT INTO students (assignment_key, row_order, hirodai_id, data, feedback, reviewed) VALUES (?, ?, ?, ?, ?, ?)',
+                [
+                    (key, i, None if record.get('広大ID') is None else str(record['広大ID']),
+                     json.dumps({k: v for k, v in record.items() if k != 'フィードバックコメント'}, ensure_ascii=False),
+                     record.get('フィードバックコメント'),
+                     1 if review_status.get(str(record.get('広大ID'))) else 0)
+                    for i, record in enumerate(records)
+                ]
+            )
+            self._bump_revision(conn, key)
+        return added, updated
+
+    def export_roster(self, ctx):
+        df, review_status = self.load_roster(ctx)
+        # file方式に戻した場合に備えてファイルにも書き出す
+        write_feedback_csv(df, ctx['feedback_csv_path'])
+        write_json(ctx['review_status_path'], review_status, ensure_ascii=False, indent=2)
+        return df
+
+# 保存方式名 -> 保存クラス
+STORAGE_BACKENDS = {
+    'file': lambda: FileAssignmentStore(FILE_CACHE_MAX_ASSIGNMENTS),
+    'sqlite': lambda: SqliteAssignmentStore(STORAGE_DB_PATH),
+}
+
+if STORAGE_BACKEND not in STORAGE_BACKENDS:
+    raise ValueError(f'未対応の保存方式です: {STORAGE_BACKEND}')
+storage = STORAGE_BACKENDS[STORAGE_BACKEND]()
+
+@app.cli.command('migrate-sqlite')
+@click.option('--db', default=STORAGE_DB_PATH, help='取り込み先のSQLiteファイル')
+def migrate_sqlite_command(db):
+    """backend/data配下の課題をSQLiteデータベースに取り込む"""
+    store = SqliteAssignmentStore(db)
+    for item in sorted(os.listdir(DATA_DIR)):
+        item_path = os.path.join(DATA_DIR, item)
+        if not os.path.isdir(item_path) or item.startswith('.'):
+            continue
+        ctx = assignment_context(item)
+        if not os.path.exists(ctx['csv_path']) and not os.path.exists(ctx['feedback_csv_path']):
+            click.echo(f'{item}: 名簿CSVがないためスキップ')
+            continue
+        count = store.import_assignment(ctx)
+        click.echo(f'{item}: {count}人を取り込みました')
+
+@app.cli.command('bench-header-read')
+@click.option('--size-mb', default=200, help='合成するソースファイルのサイズ（MB）')
+@click.option('--files', default=5, help='合成するファイル数')
+def bench_header_read_command(size_mb, files):
+    """巨大なソースに対するヘッダーチェックの時間を、全体を読む場合と比較する"""
+    header = '/*\n氏名: 広大太郎\n学生番号: B000000\n作成日: 2024-04-01\n入出力の説明: なし\n動きの説明: なし\n感想: なし\n*/\n'
+    cases = {
+        'ヘッダーあり＋巨大な本体': header.encode('utf-8'),
+        'ヘッダーなし（バイナリ）': b'\0\xff' * 16,
+    }
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for label, prefix in cases.items():
+            paths = []
+            for i in range(files):
+                path = os.path.join(temp_dir, f'{i}.c')
+                with open(path, 'wb') as f:
+                    f.write(prefix)
+                    block = (b'int x; /' * 128)[:1024]
+                    for _ in range(size_mb * 1024):
+                        f.write(block)
+                paths.append(path)
+            
+            started = time.perf_counter()
+            for path in paths:
+                with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                    check_header(f.read())
+            full_seconds = time.perf_counter() - started
+            
+            started = time.perf_counter()
+            flagged = sum(1 for _, _, exceeded in header_checker().check_files(paths) if exceeded)
+            capped_seconds = time.perf_counter() - started
+            
+            click.echo(f'{label}: {files}ファイル x {size_mb}MB '
+                       f'全体読み込み {full_seconds * 1000:.1f}ms / 先頭のみ {capped_seconds * 1000:.1f}ms '
+                       f'(上限超過 {flagged}件)')
+            for path in paths:
+                os.remove(path)
+
+@app.cli.command('search-index')
+def search_index_command():
+    """backend/data配下の全課題の提出物をソース検索の索引に入れる（変わったファイルだけ）"""
+    for assignment in list_assignments():
+        result = search_index.update(assignment_context(assignment['id']))
+        click.echo(f"{assignment['id']}: {result['indexed']}件を索引に追加、{result['removed']}件を削除、{result['unchanged']}件は変更なし")
+
+# --- レスポンスの圧縮と計測 ---
+class MeasuredJSONProvider(DefaultJSONProvider):
+    """jsonifyでのJSON化と、リクエストのJSONの解析にかかった時間を記録するプロバイダ"""
+
+    def response(self, *args, **kwargs):
+        started = time.perf_counter()
+        response = super().response(*args, **kwargs)
+        g.json_seconds = g.get('json_seconds', 0.0) + time.perf_counter() - started
+        return response
+
+    def loads(self, s, **kwargs):
+        with timed('json_parse_seconds'):
+            return super().loads(s, **kwargs)
+
+class OrjsonProvider(MeasuredJSONProvider):
+    """orjsonでJSON化するプロバイダ（出力は標準のプロバイダと同じくキーをソートする）"""
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+
+app.json = (OrjsonProvider if JSON_ENCODER == 'orjson' and orjson is not None else MeasuredJSONProvider)(app)
+
+class ResponseStats:
+    """エンドポイントごとのレスポンスサイズ（圧縮前・送信時）とJSON化の時間の集計"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, endpoint, raw_bytes, wire_bytes, json_seconds, encoding):
+        with self._lock:
+            stats = self._endpoints.setdefault(endpoint, {
+                'requests': 0, 'raw_bytes': 0, 'wire_bytes': 0, 'json_seconds': 0.0, 'compressed': 0
+            })
+            stats['requests'] += 1
+            stats['raw_bytes'] += raw_bytes
+            stats['wire_bytes'] += wire_bytes
+            stats['json_seconds'] += json_seconds
+            if encoding:
+                stats['compressed'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for endpoint, stats in self._endpoints.items():
+                result[endpoint] = {
+                    **stats,
+                    'compression_ratio': stats['wire_bytes'] / stats['raw_bytes'] if stats['raw_bytes'] else 1.0,
+                    'avg_json_ms': stats['json_seconds'] * 1000 / stats['requests']
+                }
+            return result
+
+response_stats = ResponseStats()
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/csv', 'text/plain')
+
+def choose_encoding():
+    """Accept-Encodingからbr・gzipのうち使えるものを選ぶ（なければNone）"""
+    if brotli is not None and request.accept_encodings.quality('br') > 0:
+        return 'br'
+    if request.accept_encodings.quality('gzip') > 0:
+        return 'gzip'
     return None
 
-def check_header(source_code):
-    required_fields = ["氏名", "学生番号", "作成日", "入出力の説明", "動きの説明", "感想"]
-    missing_items = []
-    header_block_match = re.search(r'/\*.*?\*/', source_code, re.DOTALL)
-    text_to_check = header_block_match.group(0) if header_block_match else source_code
-    pattern_str = f"((?:{'|'.join(required_fields)}))\\s*[:：]"
-    matches = list(re.finditer(pattern_str, text_to_check))
-    found_contents = {}
-    for i, match in enumerate(matches):
-        field_name = match.group(1).strip()
-        content_start = match.end()
-        content_end = matches[i + 1].start() if i + 1 < len(matches) else len(text_to_check)
-        content = text_to_check[content_start:content_end].replace('*/', '').strip()
-        found_contents[field_name] = content
-    for field in required_fields:
-        if field not in found_contents or found_contents[field] == "":
-            missing_items.append(field)
-    return missing_items
+def compress_body(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6)
+
+@app.after_request
+def compress_response(response):
+    """大きいJSON・CSVレスポンスを圧縮し、サイズとJSON化の時間を記録する"""
+    if response.direct_passthrough or response.is_streamed or not request.path.startswith('/api/'):
+        return response
+    data = response.get_data()
+    encoding = None
+    if (response.status_code == 200 and len(data) >= COMPRESS_MIN_BYTES
+            and response.mimetype in COMPRESSIBLE_MIMETYPES and 'Content-Encoding' not in response.headers):
+        encoding = choose_encoding()
+    if encoding:
+        response.set_data(compress_body(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag:
+            # 圧縮後の表現は別のETagにする（conditional_getは末尾付きのETagも一致とみなす）
+            response.set_etag(f'{etag}-{encoding}', weak)
+    if response.mimetype in COMPRESSIBLE_MIMETYPES:
+        response.vary.add('Accept-Encoding')
+
+    endpoint = request.url_rule.rule if request.url_rule else request.path
+    response_stats.record(endpoint, len(data), response.content_length or 0, g.get('json_seconds', 0.0), encoding)
+    return response
+
+@app.route('/api/response-stats')
+def get_response_stats():
+    """エンドポイントごとのレスポンスサイズ・圧縮率・JSON化の時間を返す"""
+    return jsonify({
+        'compress_min_bytes': COMPRESS_MIN_BYTES,
+        'encodings': ['br', 'gzip'] if brotli is not None else ['gzip'],
+        'json_encoder': 'orjson' if isinstance(app.json, OrjsonProvider) else 'json',
+        'endpoints': response_stats.snapshot()
+    })
+
+# --- リクエストの計測（メトリクス・プロファイル） ---
+class RequestMetrics:
+    """エンドポイントごとの処理時間のヒストグラムとファイルI/O・CSV・JSON・外部プロセスの集計（Prometheus形式で出力）"""
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    # (メトリクス名, 説明, 集計値のキー)
+    TOTALS = (
+        ('grading_http_files_opened_total', 'Files opened while handling requests.', 'files_opened'),
+        ('grading_http_file_read_bytes_total', 'Bytes read from files while handling requests.', 'file_read_bytes'),
+        ('grading_http_csv_parse_seconds_total', 'Time spent parsing CSV files.', 'csv_parse_seconds'),
+        ('grading_http_json_parse_seconds_total', 'Time spent parsing JSON.', 'json_parse_seconds'),
+        ('grading_http_json_serialize_seconds_total', 'Time spent serializing JSON responses.', 'json_serialize_seconds'),
+        ('grading_http_subprocess_seconds_total', 'Time spent waiting for subprocesses (clang-format).', 'subprocess_seconds'),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}  # (ルート, メソッド) -> 集計
+        self._statuses = {}  # (ルート, メソッド, ステータス) -> リクエスト数
+
+    def observe(self, route, method, status, seconds, values):
+        with self._lock:
+            stats = self._routes.get((route, method))
+            if stats is None:
+                stats = self._routes[(route, method)] = {
+                    'buckets': [0] * len(self.BUCKETS), 'sum': 0.0, 'count': 0,
+                    'totals': {key: 0 for _, _, key in self.TOTALS}
+                }
+            i = bisect.bisect_left(self.BUCKETS, seconds)
+            if i < len(self.BUCKETS):
+                stats['buckets'][i] += 1
+            stats['sum'] += seconds
+            stats['count'] += 1
+            for key, value in values.items():
+                stats['totals'][key] += value
+            status_key = (route, method, status)
+            self._statuses[status_key] = self._statuses.get(status_key, 0) + 1
+
+    @staticmethod
+    def _labels(**labels):
+        def escape(value):
+            return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels.items()) + '}'
+
+    def render(self):
+        """Prometheusのテキスト形式"""
+        with self._lock:
+            routes = {key: {**stats, 'buckets': list(stats['buckets']), 'totals': dict(stats['totals'])}
+                      for key, stats in self._routes.items()}
+            statuses = dict(self._statuses)
+        lines = [
+            '# HELP grading_http_request_duration_seconds Request wall time by route.',
+            '# TYPE grading_http_request_duration_seconds histogram',
+        ]
+        for (route, method), stats in sorted(routes.items()):
+            cumulative = 0
+            for bound, count in zip(self.BUCKETS, stats['buckets']):
+                cumulative += count
+                lines.append(f'grading_http_request_duration_seconds_bucket{self._labels(route=route, method=method, le=bound)} {cumulative}')
+            lines.append(f'grading_http_request_duration_seconds_bucket{self._labels(route=route, method=method, le="+Inf")} {stats["count"]}')
+            lines.append(f'grading_http_request_duration_seconds_sum{self._labels(route=route, method=method)} {stats["sum"]}')
+            lines.append(f'grading_http_request_duration_seconds_count{self._labels(route=route, method=method)} {stats["count"]}')
+        lines += ['# HELP grading_http_requests_total Requests by route and status.', '# TYPE grading_http_requests_total counter']
+        for (route, method, status), count in sorted(statuses.items()):
+            lines.append(f'grading_http_requests_total{self._labels(route=route, method=method, status=status)} {count}')
+        for name, help_text, key in self.TOTALS:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            for (route, method), stats in sorted(routes.items()):
+                lines.append(f'{name}{self._labels(route=route, method=method)} {stats["totals"][key]}')
+        return '\n'.join(lines) + '\n'
+
+request_metrics = RequestMetrics()
+
+@app.before_request
+def start_request_metrics():
+    _request_state.started = time.perf_counter()
+    _request_state.counters = RequestCounters()
+    if PROFILE_REQUESTS and request.headers.get('X-Profile') == '1':
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+@app.after_request
+def finish_request_profile(response):
+    """X-Profile: 1 のリクエストのプロファイルを保存し、X-Profile-Idで保存先を返す（圧縮の時間は含まない）"""
+    g.response_status = response.status_code
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        profile_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profiler.dump_stats(os.path.join(PROFILE_DIR, f'{profile_id}.prof'))
+        with open(os.path.join(PROFILE_DIR, f'{profile_id}.txt'), 'w') as f:
+            f.write(f'{request.method} {request.full_path}\n\n')
+            pstats.Stats(profiler, stream=f).sort_stats('cumulative').print_stats(50)
+        response.headers['X-Profile-Id'] = profile_id
+    return response
+
+@app.teardown_request
+def record_request_metrics(exc):
+    counters = current_request_counters()
+    if counters is None:
+        return
+    _request_state.counters = None
+    seconds = time.perf_counter() - _request_state.started
+    values = dict(counters.values)
+    values['json_serialize_seconds'] = g.get('json_seconds', 0.0)
+    route = request.url_rule.rule if request.url_rule else '<unmatched>'
+    status = 500 if exc is not None else g.get('response_status', 500)
+    request_metrics.observe(route, request.method, status, seconds, values)
+
+@app.route('/api/metrics')
+def get_metrics():
+    """エンドポイントごとの処理時間・ファイルI/O・CSV/JSON・外部プロセスの時間（Prometheus形式）"""
+    return Response(request_metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# --- 変更の通知（Server-Sent Events） ---
+class EventBroker:
+    """
+    課題ごとの学生の変更をSSEの購読者へ配るプロセス内のブローカー
+    - イベントIDは「起動ごとのトークン-課題ごとの連番」で、再接続時はLast-Event-ID以降を再送する
+    - 再送できない場合や購読者の未送信イベントがあふれた場合はresyncを送り、一覧の再取得を求める
+    """
+
+    RESYNC = None
+
+    def __init__(self, history=EVENTS_HISTORY, queue_size=EVENTS_QUEUE_SIZE):
+        self._lock = threading.Lock()
+        self._boot = uuid.uuid4().hex[:8]
+        self._history_size = history
+        self._queue_size = queue_size
+        self._sequences = {}
+        self._histories = {}
+        self._subscribers = {}
+
+    def publish(self, channel, event, data):
+        with self._lock:
+            sequence = self._sequences.get(channel, 0) + 1
+            self._sequences[channel] = sequence
+            entry = (f'{self._boot}-{sequence}', event, json.dumps(data, ensure_ascii=False))
+            self._histories.setdefault(channel, deque(maxlen=self._history_size)).append(entry)
+            for subscriber in list(self._subscribers.get(channel, ())):
+                try:
+                    subscriber.put_nowait(entry)
+                except queue.Full:
+                    # 読み出しが追いつかない購読者は捨ててresyncだけを残す
+                    self._subscribers[channel].discard(subscriber)
+                    while not subscriber.empty():
+                        subscriber.get_nowait()
+                    subscriber.put_nowait(self.RESYNC)
+
+    def subscribe(self, channel, last_event_id=None):
+        """購読用のキューと、Last-Event-ID以降の再送分（再送できなければRESYNCのみ）を返す"""
+        subscriber = queue.Queue(maxsize=self._queue_size)
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscriber)
+            history = list(self._histories.get(channel, ()))
+            latest = self._sequences.get(channel, 0)
+        if not last_event_id:
+            return subscriber, []
+        boot, _, sequence = last_event_id.partition('-')
+        if boot != self._boot or not sequence.isdigit() or int(sequence) > latest:
+            return subscriber, [self.RESYNC]
+        missed = [entry for entry in history if int(entry[0].partition('-')[2]) > int(sequence)]
+        if len(missed) < latest - int(sequence):
+            return subscriber, [self.RESYNC]
+        return subscriber, missed
+
+    def unsubscribe(self, channel, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+    def stats(self):
+        with self._lock:
+            return {
+                channel: {'subscribers': len(self._subscribers.get(channel, ())), 'last_sequence': sequence}
+                for channel, sequence in self._sequences.items()
+            }
+
+event_broker = EventBroker()
+
+def publish_student_updates(ctx, updates):
+    """学生一覧の行の変更分（広大IDと変わった列だけ）を購読者へ送る"""
+    if updates:
+        event_broker.publish(ctx['key'], 'students', {'students': updates})
+
+def publish_students_reload(ctx):
+    """差分で表せない変更（名簿の取り込みなど）の後に一覧の再取得を求める"""
+    event_broker.publish(ctx['key'], 'resync', {})
+
+def format_sse(entry):
+    if entry is EventBroker.RESYNC:
+        return 'event: resync\ndata: {}\n\n'
+    event_id, event, data = entry
+    return f'id: {event_id}\nevent: {event}\ndata: {data}\n\n'
+
+@app.route('/api/events')
+@app.route('/api/assignments/<assignment_id>/events')
+def stream_events(assignment_id=None):
+    """
+    課題の学生の変更をServer-Sent Eventsで配信する
+    - students: {"students": [{"広大ID": ..., 変わった列: 値}, ...]}
+    - resync: 一覧を取得し直す
+    """
+    channel = assignment_context(assignment_id)['key']
+    subscriber, backlog = event_broker.subscribe(channel, request.headers.get('Last-Event-ID'))
+
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            for entry in backlog:
+                yield format_sse(entry)
+            while True:
+                try:
+                    entry = subscriber.get(timeout=EVENTS_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield format_sse(entry)
+                if entry is EventBroker.RESYNC:
+                    return
+        finally:
+            event_broker.unsubscribe(channel, subscriber)
+
+    # ストリームは圧縮しない（compress_responseはストリームのレスポンスを対象外にしている）
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
 
 # --- APIエンドポイント定義 ---
 
-def load_review_status():
-    """レビュー状態を読み込み"""
-    if os.path.exists(REVIEW_STATUS_PATH):
-        with open(REVIEW_STATUS_PATH, 'r') as f:
-            return json.load(f)
-    return {}
-
-def save_review_status(status_dict):
-    """レビュー状態を保存"""
-    with open(REVIEW_STATUS_PATH, 'w') as f:
-        json.dump(status_dict, f, ensure_ascii=False, indent=2)
-
-def load_auto_check_results():
-    """自動チェック結果を読み込み"""
-    if os.path.exists(AUTO_CHECK_PATH):
-        with open(AUTO_CHECK_PATH, 'r') as f:
-            return json.load(f)
-    return {}
-
-def save_auto_check_results(results_dict):
-    """自動チェック結果を保存"""
-    with open(AUTO_CHECK_PATH, 'w') as f:
-        json.dump(results_dict, f, ensure_ascii=False, indent=2)
+def conditional_get(version):
+    """
+    読み込みAPIにETagを付け、If-None-Matchが一致すれば304を返すデコレータ
+    version(**view_args) はレスポンスの元になるファイルのスタンプ等の組を返す関数
+    （レスポンスを組み立てる前に比べるので、一致した場合はCSVの読み込みもJSON化も行わない）
+    """
+    def make_etag(view_args):
+        parts = (request.path, request.query_string, version(**view_args))
+        return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(**view_args):
+            etag = make_etag(view_args)
+            # 圧縮したレスポンスには末尾に -gzip / -br を付けたETagを返している
+            if any(request.if_none_match.contains(etag + suffix) for suffix in ('', '-gzip', '-br')):
+                response = Response(status=304)
+            else:
+                response = app.make_response(view(**view_args))
+                if response.status_code != 200:
+                    return response
+                # 組み立て中にファイルが作られた・書き出された場合に備えて取り直す
+                etag = make_etag(view_args)
+            response.set_etag(etag)
+            # キャッシュしてよいが、使う前に毎回ETagで確認させる
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
+def assignments_version():
+    """課題ディレクトリ一覧と各config.jsonのスタンプ"""
+    if not os.path.exists(DATA_DIR):
+        return None
+    return tuple(
+        (item, file_stamp(os.path.join(DATA_DIR, item, 'config.json')))
+        for item in sorted(os.listdir(DATA_DIR))
+        if not item.startswith('.') and os.path.isdir(os.path.join(DATA_DIR, item))
+    )
 
 def initialize_feedback_csv():
     """フィードバックCSVが存在しない場合、元のCSVからコピーして作成"""
     if not os.path.exists(FEEDBACK_CSV_PATH):
         try:
-            df = pd.read_csv(CSV_PATH, encoding='utf-8')
+            df = read_csv(CSV_PATH, encoding='utf-8')
         except UnicodeDecodeError:
-            df = pd.read_csv(CSV_PATH, encoding='shift_jis')
+            df = read_csv(CSV_PATH, encoding='shift_jis')
         
         # フィードバックコメント列がない場合は追加
         if 'フィードバックコメント' not in df.columns:
             df['フィードバックコメント'] = ''
         
         # フィードバックCSVとして保存（空文字列を保持）
-        df.to_csv(FEEDBACK_CSV_PATH, index=False, encoding='utf-8-sig', na_rep='')
+        write_feedback_csv(df, FEEDBACK_CSV_PATH)
         return df
     else:
-        try:
-            # keep_default_na=Falseとna_values=['']で空文字列を保持
-            df = pd.read_csv(FEEDBACK_CSV_PATH, encoding='utf-8', keep_default_na=False, na_values=[''])
-            return df
-        except UnicodeDecodeError:
-            df = pd.read_csv(FEEDBACK_CSV_PATH, encoding='utf-8-sig', keep_default_na=False, na_values=[''])
-            return df
+        # keep_default_na=Falseとna_values=['']で空文字列を保持
+        return read_feedback_csv(FEEDBACK_CSV_PATH)
 
-@app.route('/api/assignments')
-def get_assignments():
-    """backend/data配下の課題ディレクトリ一覧を返す"""
+def list_assignments():
+    """backend/data配下の課題ディレクトリ一覧"""
     data_dir = os.path.join(PROJECT_ROOT, 'backend', 'data')
     assignments = []
     
@@ -127,10 +3101,8 @@ def get_assignments():
             # ディレクトリかつ.DS_Storeなどのシステムファイルではない
             if os.path.isdir(item_path) and not item.startswith('.'):
                 # config.jsonがある場合は、その内容を読み込む
-                config_path = os.path.join(item_path, 'config.json')
-                if os.path.exists(config_path):
-                    with open(config_path, 'r') as f:
-                        config = json.load(f)
+                config = load_assignment_config(item_path)
+                if config is not None:
                     assignment_info = {
                         'id': item,
                         'name': config.get('name', item.replace('_', ' ').title()),
@@ -153,172 +3125,359 @@ def get_assignments():
     
     # 作成日時でソート（新しい順）
     assignments.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-    
-    return jsonify(assignments)
+    return assignments
 
-@app.route('/api/students')
-@app.route('/api/assignments/<assignment_id>/students')
-def get_students_with_status(assignment_id=None):
-    # 課題IDが指定された場合、その課題のデータディレクトリを使用
-    if assignment_id:
-        # 動的に課題ディレクトリのパスを構築
-        assignment_base_path = os.path.join(PROJECT_ROOT, 'backend', 'data', assignment_id)
-        assignment_csv_path = os.path.join(assignment_base_path, 'list.csv')
-        assignment_feedback_csv_path = os.path.join(assignment_base_path, 'list_feedback.csv')
-        assignment_review_status_path = os.path.join(assignment_base_path, 'review_status.json')
-        
-        # config.jsonから設定を読み込む
-        config_path = os.path.join(assignment_base_path, 'config.json')
-        if os.path.exists(config_path):
-            with open(config_path, 'r') as f:
-                config = json.load(f)
-            assignment_submission_path = os.path.join(assignment_base_path, config.get('submission_dir', 'submissions'))
-            # config.jsonからファイル名を取得
-            assignment_name = config.get('source_file_name', 'assignment')
-        else:
-            # config.jsonがない場合のフォールバック（通常は発生しない）
-            assignment_submission_path = os.path.join(assignment_base_path, 'submissions')
-            assignment_name = 'assignment'
-    else:
-        # デフォルトのパスを使用（後方互換性のため）
-        assignment_csv_path = CSV_PATH
-        assignment_feedback_csv_path = FEEDBACK_CSV_PATH
-        assignment_review_status_path = REVIEW_STATUS_PATH
-        assignment_submission_path = SUBMISSION_PATH
-        assignment_name = ASSIGNMENT_NAME
-    
-    # フィードバックCSVを初期化または読み込み（課題別のパスを使用）
-    if not os.path.exists(assignment_feedback_csv_path):
-        try:
-            df = pd.read_csv(assignment_csv_path, encoding='utf-8', keep_default_na=False, na_values=[''])
-        except UnicodeDecodeError:
-            df = pd.read_csv(assignment_csv_path, encoding='utf-8-sig', keep_default_na=False, na_values=[''])
-        
-        if 'フィードバックコメント' not in df.columns:
-            df['フィードバックコメント'] = ''
-        
-        df.to_csv(assignment_feedback_csv_path, index=False, encoding='utf-8-sig', na_rep='')
-    else:
-        try:
-            df = pd.read_csv(assignment_feedback_csv_path, encoding='utf-8', keep_default_na=False, na_values=[''])
-        except UnicodeDecodeError:
-            df = pd.read_csv(assignment_feedback_csv_path, encoding='utf-8-sig', keep_default_na=False, na_values=[''])
-    
-    # レビュー状態を読み込み（課題別のパスを使用）
-    if assignment_id and os.path.exists(assignment_review_status_path):
-        with open(assignment_review_status_path, 'r') as f:
-            review_status = json.load(f)
-    elif not assignment_id:
-        review_status = load_review_status()
-    else:
-        review_status = {}
+@app.route('/api/assignments')
+@conditional_get(assignments_version)
+def get_assignments():
+    """backend/data配下の課題ディレクトリ一覧を返す"""
+    return jsonify(list_assignments())
+
+def build_student_rows(ctx):
+    """提出済みの学生の一覧（レビュー状態・自動チェック結果・ファイル一覧付き）を組み立てる"""
+    # 名簿とレビュー状態を読み込み（フィードバックCSVがなければ作成）
+    df, review_status = storage.load_roster(ctx)
+    
+    # 自動チェック結果はループの外で一度だけ読み込む
+    auto_check_results = {}
+    if ctx['id']:
+        auto_check_data = storage.load_auto_check(ctx)
+        if auto_check_data and 'results' in auto_check_data:
+            auto_check_results = auto_check_data['results']
+    
+    # 未提出はリストに含めない（ブールマスクで抽出）
+    submitted = df[df['ステータス'].astype(str).str.contains('提出済み', regex=False)]
     
     # NaN値をNoneに置換
-    df = df.where(pd.notnull(df), None)
+    result = submitted.astype(object).where(submitted.notna(), None)
+    
+    student_ids = submitted['広大ID']
+    id_missing = student_ids.isna()
+    # 文字列として統一して比較
+    id_strs = student_ids.astype(str).str.strip()
+    
+    # 保存された自動チェック結果があれば使用、なければ空文字
+    result['auto_feedback'] = student_ids.astype(str).map(auto_check_results).fillna('')
+    
+    # 一括整形で求めたclang-formatとの差分の行数（未整形の学生はNone）
+    format_results = load_json_cached(ctx['format_results_path']).get('results', {})
+    format_changes = {
+        student_id: entry['stats']['total_changes']
+        for student_id, entry in format_results.items() if 'stats' in entry
+    }
+    result['format_changes'] = student_ids.astype(str).map(format_changes).astype(object)
+    result['format_changes'] = result['format_changes'].where(result['format_changes'].notna(), None)
+    
+    # テスト履歴の索引から最後の実行の合否と実行回数（履歴がない学生はNone）
+    test_history = load_json_cached(ctx['test_history_index_path']).get('students', {})
+    result['test_passed'] = pd.Series([test_history.get(sid, {}).get('last_passed') for sid in id_strs], index=result.index, dtype=object)
+    result['test_attempts'] = pd.Series([test_history.get(sid, {}).get('attempts') for sid in id_strs], index=result.index, dtype=object)
+    
+    # レビュー状態を追加（広大IDがない行はNone）
+    reviewed = id_strs.map(lambda sid: '1' if review_status.get(sid, False) else '')
+    result['レビュー済み'] = reviewed.astype(object).where(~id_missing, None)
+    
+    # フォルダ内のファイル一覧を取得（インデックスは一度だけ取得）
+    submission_index = load_submission_index(ctx['submission_path'])
+    result['files'] = [
+        submission_index.student_files(sid) if submission_index else []
+        for sid in student_ids
+    ]
     
     # JSONで返すための結果リスト
-    students_with_status = []
+    return result.to_dict('records')
 
-    for index, row in df.iterrows():
-        # 未提出はリストに含めない
-        if '提出済み' not in str(row['ステータス']):
-            continue
+class StudentListIndex:
+    """
+    学生一覧の絞り込み・並び替え・ページ分割用の索引（学生一覧のキャッシュと一緒に作り直す）
+    - 並び順×絞り込み条件ごとの行の位置リストは最初に使われた時に一度だけ作る
+    - 以後の1ページの取得はページサイズ分の処理で済む（名前・IDの部分一致は続きから走査）
+    - 続きのカーソルには前のページの最後の行のキー（並び替えの値と広大ID）を入れ、その行の後から再開する
+      （並び順が途中で変わっても、キーの変わらない行が飛ばされたり重複したりしない）
+    - rowsは共有されるため変更しないこと
+    """
 
-        student_info = row.to_dict()
-        
-        
-        # NaN値を文字列に変換（特に評点フィールド）
-        for key, value in student_info.items():
-            if pd.isna(value):
-                # 広大IDは絶対にNoneにしない
-                if key != '広大ID':
-                    student_info[key] = None
-        
-        # 自動チェックは無効化（ただし、保存された結果があれば読み込む）
-        student_id = row['広大ID']
-        folder_path = find_student_folder(student_id, assignment_submission_path)
-        
-        # フォルダ内のファイル一覧を取得
-        files_in_folder = []
-        if folder_path and os.path.exists(folder_path):
-            files_in_folder = [f for f in os.listdir(folder_path) if os.path.isfile(os.path.join(folder_path, f))]
-        student_info['files'] = files_in_folder
-
-        # 保存された自動チェック結果があれば使用、なければ空文字
-        auto_feedback = ""
-        if assignment_id:
-            auto_check_path = os.path.join(assignment_base_path, 'auto_check_results.json')
-            if os.path.exists(auto_check_path):
-                with open(auto_check_path, 'r') as f:
-                    auto_check_data = json.load(f)
-                if auto_check_data and 'results' in auto_check_data:
-                    auto_feedback = auto_check_data['results'].get(str(student_id), "")
-        student_info['auto_feedback'] = auto_feedback
-        
-        # レビュー状態を追加
-        student_id = student_info.get('広大ID')
-        
-        
-        if student_id is None:
-            student_info['レビュー済み'] = None
-        else:
-            # 文字列として統一して比較
-            student_id_str = str(student_id).strip() if not isinstance(student_id, str) else student_id.strip()
-            # review_statusの値を取得してチェック
-            student_info['レビュー済み'] = '1' if review_status.get(student_id_str, False) else ''
+    SORT_KEYS = {
+        'id': lambda row: str(row.get('広大ID') or ''),
+        'name': lambda row: str(row.get('フルネーム') or ''),
+        'reviewed': lambda row: row.get('レビュー済み') == '1',
+        'issues': lambda row: bool(row.get('auto_feedback')),
+        'format_changes': lambda row: (row.get('format_changes') is None, row.get('format_changes') or 0),
+        'test_passed': lambda row: (row.get('test_passed') is None, bool(row.get('test_passed'))),
+        'test_attempts': lambda row: (row.get('test_attempts') is None, row.get('test_attempts') or 0),
+    }
+
+    def __init__(self, rows):
+        self.rows = rows
+        self._reviewed = [row.get('レビュー済み') == '1' for row in rows]
+        self._issues = [bool(row.get('auto_feedback')) for row in rows]
+        self._search_text = [f"{row.get('広大ID') or ''}\n{row.get('フルネーム') or ''}".lower() for row in rows]
+        self._index_by_id = {str(row.get('広大ID') or ''): i for i, row in enumerate(rows)}
+        self._views = {}
+        self._lock = threading.Lock()
+        reviewed = sum(self._reviewed)
+        needs_review = sum(1 for r, i in zip(self._reviewed, self._issues) if not r and i)
+        self.counts = {
+            'total': len(rows),
+            'reviewed': reviewed,
+            'needs_review': needs_review,
+            'pending': len(rows) - reviewed - needs_review,
+            'has_issues': sum(self._issues)
+        }
+
+    def view(self, sort=None, descending=False, reviewed=None, issues=None):
+        """条件に合う行の位置を並び順どおりに並べたリスト（reviewed・issuesはNoneなら絞り込まない）"""
+        key = (sort, descending, reviewed, issues)
+        with self._lock:
+            positions = self._views.get(key)
+        if positions is not None:
+            return positions
         
-        students_with_status.append(student_info)
+        order = range(len(self.rows))
+        if sort is not None:
+            order = sorted(order, key=lambda i: self.row_key(sort, i), reverse=descending)
+        elif descending:
+            order = reversed(order)
+        positions = [
+            i for i in order
+            if (reviewed is None or self._reviewed[i] == reviewed) and (issues is None or self._issues[i] == issues)
+        ]
+        with self._lock:
+            self._views[key] = positions
+        return positions
+
+    def row_key(self, sort, i):
+        """並び順での位置を一意に決めるキー（並び替えなしは名簿の順、同じ値の行は広大ID順）"""
+        if sort is None:
+            return i
+        return (self.SORT_KEYS[sort](self.rows[i]), str(self.rows[i].get('広大ID') or ''))
+
+    def make_cursor(self, sort, i):
+        """行iの後から続きを読むためのカーソル"""
+        payload = {'key': self.row_key(sort, i), 'id': str(self.rows[i].get('広大ID') or '')}
+        # numpyの数値はPythonの数値にして書き出す
+        data = json.dumps(payload, ensure_ascii=False, default=lambda value: value.item())
+        return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def cursor_start(self, positions, sort, descending, cursor):
+        """
+        カーソルの行より後ろにある最初の行がpositionsの何番目かを返す（二分探索）
+        不正なカーソルはValueError
+        """
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            key, student_id = payload['key'], payload['id']
+        except (ValueError, TypeError, KeyError, binascii.Error):
+            raise ValueError('cursorが不正です')
+        # JSONで配列になったタプルを戻す
+        as_tuple = lambda value: tuple(as_tuple(v) for v in value) if isinstance(value, list) else value
+        key = as_tuple(key)
+        if sort is None and student_id in self._index_by_id:
+            # 名簿の順は行の追加・削除でずれるため、その学生の今の位置から再開する
+            key = self._index_by_id[student_id]
+        lo, hi = 0, len(positions)
+        try:
+            while lo < hi:
+                mid = (lo + hi) // 2
+                row_key = self.row_key(sort, positions[mid])
+                if (row_key < key) if descending else (row_key > key):
+                    hi = mid
+                else:
+                    lo = mid + 1
+        except TypeError:
+            # 別の並び順のカーソル
+            raise ValueError('cursorが不正です')
+        return lo
+
+    def page(self, positions, start, limit, query=None):
+        """
+        positionsのstart番目から最大limit件の行を返す
+        (行のリスト, 次に読む位置 or None) を返す。queryがあれば名前・IDの部分一致で絞り込む
+        """
+        if not query:
+            end = start + limit
+            return [self.rows[i] for i in positions[start:end]], end if end < len(positions) else None
+        query = query.lower()
+        rows = []
+        pos = start
+        while pos < len(positions) and len(rows) < limit:
+            if query in self._search_text[positions[pos]]:
+                rows.append(self.rows[positions[pos]])
+            pos += 1
+        # 残りに一致する行があるかは次のページで調べる
+        return rows, pos if pos < len(positions) else None
+
+# 課題 -> 学生一覧の索引（一覧APIと全課題の集約APIで共有）
+student_rows_cache = VersionedCache(FILE_CACHE_MAX_ASSIGNMENTS)
+
+def student_list_version(ctx):
+    """学生一覧の元になるデータ・提出フォルダ・一括整形結果・テスト履歴の索引のバージョン"""
+    submission_index = load_submission_index(ctx['submission_path'])
+    return (storage.data_version(ctx), submission_index.version() if submission_index else None,
+            file_stamp(ctx['format_results_path']), file_stamp(ctx['test_history_index_path']))
+
+def load_student_list(ctx):
+    """学生一覧の索引を返す（データと提出ディレクトリに変更がなければキャッシュ）"""
+    return student_rows_cache.get(ctx['key'], student_list_version(ctx), lambda: StudentListIndex(build_student_rows(ctx)))
+
+def load_student_rows(ctx):
+    """学生一覧を返す（返り値は変更しないこと）"""
+    return load_student_list(ctx).rows
+
+def requested_fields():
+    """?fields=広大ID,フルネーム のように指定された列名のリスト（指定なしはNone）"""
+    fields = request.args.get('fields')
+    if not fields:
+        return None
+    return [field.strip() for field in fields.split(',') if field.strip()]
+
+def select_fields(rows, fields):
+    """各行から指定された列だけを取り出す（fieldsがNoneなら全列）"""
+    if fields is None:
+        return rows
+    return [{field: row.get(field) for field in fields} for row in rows]
+
+def _flag_arg(name):
+    """?name=1 / ?name=0 をTrue / Falseに（指定なしはNone）"""
+    value = request.args.get(name)
+    if value in (None, ''):
+        return None
+    return value in ('1', 'true')
+
+def _int_arg(name, default):
+    value = request.args.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        return max(0, int(value))
+    except ValueError:
+        raise ValueError(f'{name}は整数で指定してください')
+
+@app.route('/api/students')
+@app.route('/api/assignments/<assignment_id>/students')
+@conditional_get(lambda assignment_id=None: student_list_version(assignment_context(assignment_id)))
+def get_students_with_status(assignment_id=None):
+    """
+    提出済みの学生一覧を返す
+    - ?reviewed=1/0, ?issues=1/0（自動チェックの指摘の有無）, ?q=（名前・IDの部分一致）で絞り込み
+    - ?sort=id|name|reviewed|issues|format_changes|test_passed|test_attempts と ?order=desc で並び替え
+    - ?limit= を指定するとページ分割し、{students, total, limit, next_cursor, counts} を返す
+      続きは ?cursor=（前回のnext_cursor、同じ並び順・絞り込みで使う）または ?offset= で取得する
+    """
+    # 課題IDが指定された場合、その課題のデータを使用（なければ後方互換性のため既定の課題）
+    ctx = assignment_context(assignment_id)
+    student_list = load_student_list(ctx)
+    
+    sort = request.args.get('sort') or None
+    if sort is not None and sort not in StudentListIndex.SORT_KEYS:
+        return jsonify({'error': f'未対応の並び替えです: {sort}'}), 400
+    try:
+        limit = _int_arg('limit', None)
+        offset = _int_arg('offset', 0)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    cursor = request.args.get('cursor') or None
+    query = request.args.get('q', '').strip()
+    descending = request.args.get('order') == 'desc'
+    positions = student_list.view(sort, descending, _flag_arg('reviewed'), _flag_arg('issues'))
+    fields = requested_fields()
+    
+    if limit is None and cursor is None:
+        # ページ分割なし（従来どおり配列で返す）
+        rows, _ = student_list.page(positions, 0, len(positions), query)
+        return jsonify(select_fields(rows, fields))
+    
+    limit = max(1, limit or 100)
+    if cursor is not None:
+        try:
+            start = student_list.cursor_start(positions, sort, descending, cursor)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    elif query:
+        # offset指定の部分一致は一致した件数で数える
+        start = 0
+        if offset:
+            _, start = student_list.page(positions, 0, offset, query)
+            start = len(positions) if start is None else start
+    else:
+        start = offset
+    rows, next_position = student_list.page(positions, start, limit, query)
+    return jsonify({
+        'students': select_fields(rows, fields),
+        # 部分一致の件数は全件を走査しないと分からないため返さない（next_cursorで続きの有無が分かる）
+        'total': None if query else len(positions),
+        'limit': limit,
+        # 最後に調べた行（部分一致では一致しなかった行も含む）の後から続ける
+        'next_cursor': None if next_position is None else student_list.make_cursor(sort, positions[next_position - 1]),
+        'counts': student_list.counts
+    })
+
+def assignments_overview_version():
+    return tuple(
+        (assignment['id'], student_list_version(assignment_context(assignment['id'])))
+        for assignment in list_assignments()
+    ) + (assignments_version(),)
 
-    return jsonify(students_with_status)
+@app.route('/api/assignments/overview')
+@conditional_get(assignments_overview_version)
+def get_assignments_overview():
+    """
+    全課題の一覧と各課題の学生一覧・レビュー集計を1回で返す
+    ?fields=広大ID,フルネーム,ステータス,レビュー済み のように学生の列を絞り込める
+    """
+    fields = requested_fields()
+    overview = []
+    for assignment in list_assignments():
+        student_list = load_student_list(assignment_context(assignment['id']))
+        overview.append({
+            **assignment,
+            'summary': {'total': student_list.counts['total'], 'reviewed': student_list.counts['reviewed']},
+            'students': select_fields(student_list.rows, fields)
+        })
+    return jsonify(overview)
 
 # 学生詳細と保存API
+FILE_NOT_FOUND_TEXT = "ファイルが見つかりません。"
+
+def read_submission_text(folder_path, file_name):
+    """提出フォルダ内のテキストファイルを読み込み（ない場合はFILE_NOT_FOUND_TEXT）"""
+    if folder_path:
+        path = os.path.join(folder_path, file_name)
+        if os.path.exists(path):
+            return read_text_file(path)
+    return FILE_NOT_FOUND_TEXT
+
+def student_details_version(hirodai_id, assignment_id=None):
+    """学生詳細の元になるデータと提出フォルダ・ファイルのスタンプ"""
+    ctx = assignment_context(assignment_id)
+    folder_path = find_student_folder(hirodai_id, ctx['submission_path'])
+    folder_stamps = None
+    if folder_path:
+        folder_stamps = tuple(
+            file_stamp(os.path.join(folder_path, name))
+            for name in ('', f"{ctx['source_file_name']}.c", f"{ctx['source_file_name']}-test-history.txt")
+        )
+    return (storage.data_version(ctx), folder_path, folder_stamps)
+
 @app.route('/api/student/<hirodai_id>')
 @app.route('/api/assignments/<assignment_id>/students/<hirodai_id>')
+@conditional_get(student_details_version)
 def get_student_details(hirodai_id, assignment_id=None):
+    """
+    学生の詳細を返す
+    ?lazy=1 の場合はsource_code・test_historyを含めない（/source・/test-historyで別途取得）
+    """
     # 課題IDが指定された場合、その課題のデータを使用
-    if assignment_id:
-        assignment_base_path = os.path.join(PROJECT_ROOT, 'backend', 'data', assignment_id)
-        assignment_csv_path = os.path.join(assignment_base_path, 'list_feedback.csv')
-        
-        # config.jsonから設定を読み込む
-        config_path = os.path.join(assignment_base_path, 'config.json')
-        if os.path.exists(config_path):
-            with open(config_path, 'r') as f:
-                config = json.load(f)
-            assignment_submission_path = os.path.join(assignment_base_path, config.get('submission_dir', 'submissions'))
-            assignment_name = config.get('source_file_name', 'assignment')
-        else:
-            assignment_submission_path = os.path.join(assignment_base_path, 'submissions')
-            assignment_name = 'assignment'
-        
-        # CSVファイルを読み込み
-        try:
-            df = pd.read_csv(assignment_csv_path, encoding='utf-8', keep_default_na=False, na_values=[''])
-        except UnicodeDecodeError:
-            df = pd.read_csv(assignment_csv_path, encoding='utf-8-sig', keep_default_na=False, na_values=[''])
-    else:
-        # 後方互換性のため
-        df = initialize_feedback_csv()
-        assignment_submission_path = SUBMISSION_PATH
-        assignment_name = ASSIGNMENT_NAME
-    
-    # NaN値をNoneに置換
-    df = df.where(pd.notnull(df), None)
+    ctx = assignment_context(assignment_id)
+    assignment_submission_path = ctx['submission_path']
+    assignment_name = ctx['source_file_name']
+    lazy = request.args.get('lazy') == '1'
     
-    if hirodai_id not in df['広大ID'].values:
+    student_dict, reviewed = storage.find_student(ctx, hirodai_id)
+    if student_dict is None:
         return jsonify({'error': '学生が見つかりません'}), 404
     
-    student_data = df[df['広大ID'] == hirodai_id].iloc[0]
     folder_path = find_student_folder(hirodai_id, assignment_submission_path)
-    source_code, test_history = "ファイルが見つかりません。", "ファイルが見つかりません。"
-    if folder_path:
-        source_path = os.path.join(folder_path, f"{assignment_name}.c")
-        history_path = os.path.join(folder_path, f"{assignment_name}-test-history.txt")
-        if os.path.exists(source_path):
-            with open(source_path, 'r', encoding='utf-8', errors='ignore') as f: source_code = f.read()
-        if os.path.exists(history_path):
-            with open(history_path, 'r', encoding='utf-8', errors='ignore') as f: test_history = f.read()
-    student_dict = student_data.to_dict()
     # NaN値をNoneに変換
     for key, value in student_dict.items():
         if pd.isna(value):
@@ -328,140 +3487,108 @@ def get_student_details(hirodai_id, assignment_id=None):
     student_dict['auto_feedback'] = ""
     
     # レビュー状態を追加
-    if assignment_id:
-        # 課題別のレビューステータスを読み込む
-        review_status_path = os.path.join(assignment_base_path, 'review_status.json')
-        if os.path.exists(review_status_path):
-            with open(review_status_path, 'r') as f:
-                review_status = json.load(f)
-        else:
-            review_status = {}
-    else:
-        review_status = load_review_status()
-    student_dict['レビュー済み'] = '1' if review_status.get(hirodai_id) else ''
+    student_dict['レビュー済み'] = '1' if reviewed else ''
     
     # 自動チェック結果を追加
-    if assignment_id:
-        # 課題別の自動チェック結果を読み込む
-        auto_check_path = os.path.join(assignment_base_path, 'auto_check_results.json')
-        if os.path.exists(auto_check_path):
-            with open(auto_check_path, 'r') as f:
-                auto_check_data = json.load(f)
-        else:
-            auto_check_data = {}
-    else:
-        auto_check_data = load_auto_check_results()
+    auto_check_data = storage.load_auto_check(ctx)
     auto_check_result = ''
     if auto_check_data and 'results' in auto_check_data:
         auto_check_result = auto_check_data['results'].get(str(hirodai_id), '')
     
     # フォルダ内のファイル一覧を取得
-    files_in_folder = []
-    if folder_path and os.path.exists(folder_path):
-        files_in_folder = [f for f in os.listdir(folder_path) if os.path.isfile(os.path.join(folder_path, f))]
+    files_in_folder = list_student_files(folder_path)
     
     response = {
         'student': student_dict, 
-        'source_code': source_code, 
-        'test_history': test_history, 
         'files': files_in_folder,
         'assignment_name': assignment_name,
         'auto_check_result': auto_check_result
     }
+    if not lazy:
+        response['source_code'] = read_submission_text(folder_path, f"{assignment_name}.c")
+        response['test_history'] = read_submission_text(folder_path, f"{assignment_name}-test-history.txt")
     return jsonify(response)
 
+def _student_submission_text(assignment_id, hirodai_id, suffix):
+    ctx = assignment_context(assignment_id)
+    student_dict, _ = storage.find_student(ctx, hirodai_id)
+    if student_dict is None:
+        return None
+    folder_path = find_student_folder(hirodai_id, ctx['submission_path'])
+    return read_submission_text(folder_path, f"{ctx['source_file_name']}{suffix}")
+
+@app.route('/api/student/<hirodai_id>/source')
+@app.route('/api/assignments/<assignment_id>/students/<hirodai_id>/source')
+@conditional_get(student_details_version)
+def get_student_source(hirodai_id, assignment_id=None):
+    """学生のソースコードだけを返す"""
+    source_code = _student_submission_text(assignment_id, hirodai_id, '.c')
+    if source_code is None:
+        return jsonify({'error': '学生が見つかりません'}), 404
+    return jsonify({'source_code': source_code})
+
+@app.route('/api/student/<hirodai_id>/test-history')
+@app.route('/api/assignments/<assignment_id>/students/<hirodai_id>/test-history')
+@conditional_get(student_details_version)
+def get_student_test_history(hirodai_id, assignment_id=None):
+    """学生のテスト履歴と、それを実行ごとに集計した結果（test_history_summary）を返す"""
+    test_history = _student_submission_text(assignment_id, hirodai_id, '-test-history.txt')
+    if test_history is None:
+        return jsonify({'error': '学生が見つかりません'}), 404
+    return jsonify({'test_history': test_history, 'test_history_summary': parse_test_history(test_history)})
+
 # 自動チェック用エンドポイント（個別）
 @app.route('/api/student/<hirodai_id>/auto-check')
 def auto_check_student(hirodai_id):
-    # フィードバックCSVから読み込み
-    df = initialize_feedback_csv()
-    
-    # NaN値をNoneに置換
-    df = df.where(pd.notnull(df), None)
-    student_data = df[df['広大ID'] == hirodai_id].iloc[0]
+    ctx = assignment_context()
     folder_path = find_student_folder(hirodai_id, SUBMISSION_PATH)
+    auto_feedback = auto_check_submission(folder_path, list_student_files(folder_path), ASSIGNMENT_NAME)
     
-    auto_feedback = ""
-    source_filename = f"{ASSIGNMENT_NAME}.c"
-    history_filename = f"{ASSIGNMENT_NAME}-test-history.txt"
-    source_path = os.path.join(folder_path, source_filename) if folder_path else None
-    history_path = os.path.join(folder_path, history_filename) if folder_path else None
-    
-    # ファイル不備チェック
-    if not source_path or not os.path.exists(source_path) or not os.path.exists(history_path):
-        auto_feedback += f"この課題では \"{source_filename}\" と \"{history_filename}\" を提出してください。"
-        if history_path and not os.path.exists(history_path):
-            auto_feedback += " make testを実行するとtxtファイルが作成されます(演習1の「演習課題のやり方」を参照してください)。"
-    
-    # ヘッダー記入漏れチェック（ソースコードが存在する場合のみ）
-    if source_path and os.path.exists(source_path):
-        with open(source_path, 'r', encoding='utf-8', errors='ignore') as f:
-            source_code = f.read()
-        missing_items = check_header(source_code)
-        if missing_items:
-            auto_feedback += f"{source_filename}に"
-            auto_feedback += ",".join([f" {item}" for item in missing_items])
-            auto_feedback += "を記入してください。"
-    
-    # 既存の自動チェック結果を読み込んで更新
-    auto_check_data = load_auto_check_results()
-    if 'results' not in auto_check_data:
-        from datetime import datetime
-        auto_check_data = {
-            'checked_at': datetime.now().isoformat(),
-            'assignment': ASSIGNMENT_NAME,
-            'results': {}
-        }
-    auto_check_data['results'][str(hirodai_id)] = auto_feedback.strip()
-    save_auto_check_results(auto_check_data)
-    
-    return jsonify({'auto_feedback': auto_feedback.strip()})
-
-# 全学生自動チェック用エンドポイント
-@app.route('/api/auto-check-all', methods=['POST'])
-@app.route('/api/assignments/<assignment_id>/auto-check-all', methods=['POST'])
-def auto_check_all_students(assignment_id=None):
-    # 課題IDが指定された場合、その課題のデータを使用
-    if assignment_id:
-        assignment_base_path = os.path.join(PROJECT_ROOT, 'backend', 'data', assignment_id)
-        assignment_csv_path = os.path.join(assignment_base_path, 'list.csv')
-        assignment_auto_check_path = os.path.join(assignment_base_path, 'auto_check_results.json')
-        
-        # config.jsonから設定を読み込む
-        config_path = os.path.join(assignment_base_path, 'config.json')
-        if os.path.exists(config_path):
-            with open(config_path, 'r') as f:
-                config = json.load(f)
-            assignment_submission_path = os.path.join(assignment_base_path, config.get('submission_dir', 'submissions'))
-            assignment_name = config.get('source_file_name', 'assignment')  # config.jsonからファイル名を取得
-        else:
-            # config.jsonがない場合のフォールバック（通常は発生しない）
-            assignment_submission_path = os.path.join(assignment_base_path, 'submissions')
-            assignment_name = 'assignment'
-        
-        # CSVファイルを読み込み
-        try:
-            df = pd.read_csv(assignment_csv_path, encoding='utf-8', keep_default_na=False, na_values=[''])
-        except UnicodeDecodeError:
-            df = pd.read_csv(assignment_csv_path, encoding='utf-8-sig', keep_default_na=False, na_values=[''])
-    else:
-        # 後方互換性のため、デフォルト設定を使用
-        df = initialize_feedback_csv()
-        assignment_submission_path = SUBMISSION_PATH
-        assignment_name = ASSIGNMENT_NAME
-        assignment_auto_check_path = AUTO_CHECK_PATH
+    # 既存の自動チェック結果を更新
+    storage.update_auto_check_result(ctx, hirodai_id, auto_feedback, ASSIGNMENT_NAME)
+    publish_student_updates(ctx, [{'広大ID': hirodai_id, 'auto_feedback': auto_feedback}])
+    
+    return jsonify({'auto_feedback': auto_feedback})
+
+# 全学生自動チェック
+def run_auto_check_all(assignment_id=None, force=False, report=None):
+    """
+    提出済みの全学生を自動チェックして結果を保存し、集計を返す
+    force=Trueの場合は変更のない提出物も再チェックする
+    """
+    # 課題IDが指定された場合、その課題のデータを使用
+    ctx = assignment_context(assignment_id)
+    assignment_submission_path = ctx['submission_path']
+    assignment_name = ctx['source_file_name']
+    df, _ = storage.load_roster(ctx)
     
     # NaN値をNoneに置換
     df = df.where(pd.notnull(df), None)
     
+    # 前回の結果と内容のフィンガープリント（forceの場合やチェックの条件が変わった場合は全員を再チェック）
+    header_fields = list(header_checker(ctx['config'].get('header_fields')).fields)
+    previous_data = storage.load_auto_check(ctx)
+    if (force or previous_data.get('source_file_name') != assignment_name
+            or previous_data.get('header_fields', list(DEFAULT_HEADER_FIELDS)) != header_fields
+            or previous_data.get('header_read_max_bytes') != HEADER_READ_MAX_BYTES):
+        previous_results, previous_fingerprints = {}, {}
+    else:
+        previous_results = previous_data.get('results', {})
+        previous_fingerprints = previous_data.get('fingerprints', {})
+    
     # 統計情報
     total_students = 0
     checked_count = 0
     issues_found = 0
+    skipped_count = 0
     
     # 自動チェック結果を格納
     check_results = {}
+    fingerprints = {}
     
+    # チェック対象（提出済みで、前回から変更のある学生）を集める
+    student_ids = []
+    tasks = []
     for index, row in df.iterrows():
         # 未提出はスキップ
         if '提出済み' not in str(row['ステータス']):
@@ -469,86 +3596,142 @@ def auto_check_all_students(assignment_id=None):
             
         total_students += 1
         student_id = str(row['広大ID'])
-        checked_count += 1
         
-        # 自動チェック実行
         folder_path = find_student_folder(student_id, assignment_submission_path)
-        auto_feedback = ""
-        source_filename = f"{assignment_name}.c"
-        history_filename = f"{assignment_name}-test-history.txt"
-        source_path = os.path.join(folder_path, source_filename) if folder_path else None
-        history_path = os.path.join(folder_path, history_filename) if folder_path else None
-        
-        # ファイル不備チェック
-        if not source_path or not os.path.exists(source_path) or not os.path.exists(history_path):
-            auto_feedback += f"この課題では \"{source_filename}\" と \"{history_filename}\" を提出してください。"
-            if history_path and not os.path.exists(history_path):
-                auto_feedback += " make testを実行するとtxtファイルが作成されます(演習1の「演習課題のやり方」を参照してください)。"
-        
-        # ヘッダー記入漏れチェック（ソースコードが存在する場合のみ）
-        if source_path and os.path.exists(source_path):
-            with open(source_path, 'r', encoding='utf-8', errors='ignore') as f:
-                source_code = f.read()
-            missing_items = check_header(source_code)
-            if missing_items:
-                auto_feedback += f"{source_filename}に"
-                auto_feedback += ",".join([f" {item}" for item in missing_items])
-                auto_feedback += "を記入してください。"
+        files_in_folder = list_student_files(folder_path)
+        previous_fingerprint = previous_fingerprints.get(student_id)
+        fingerprint = submission_fingerprint(folder_path, files_in_folder, assignment_name, previous_fingerprint)
+        fingerprints[student_id] = fingerprint
         
+        # 変更のない提出物は前回の結果を使う
+        if student_id in previous_results and same_submission(fingerprint, previous_fingerprint):
+            check_results[student_id] = previous_results[student_id]
+            skipped_count += 1
+            continue
+        
+        checked_count += 1
+        student_ids.append(student_id)
+        tasks.append((folder_path, files_in_folder, assignment_name, header_fields))
+    
+    # 自動チェック実行（スレッド/プロセスプールで並列、結果は学生の順序どおり）
+    for student_id, auto_feedback in zip(student_ids, run_auto_checks(tasks, report=report)):
         # 結果を保存（問題がなくても空文字として保存）
-        check_results[student_id] = auto_feedback.strip()
-        if auto_feedback.strip():
-            issues_found += 1
+        check_results[student_id] = auto_feedback
+        if auto_feedback in (AUTO_CHECK_TIMEOUT_MESSAGE, AUTO_CHECK_ERROR_MESSAGE):
+            # タイムアウト・エラーになった学生は次回も再チェックする
+            fingerprints.pop(student_id, None)
     
-    # 自動チェック結果をJSONファイルに保存
-    from datetime import datetime
+    issues_found = sum(1 for auto_feedback in check_results.values() if auto_feedback)
+    
+    # 自動チェック結果を保存
     auto_check_data = {
         'checked_at': datetime.now().isoformat(),
         'assignment': assignment_id if assignment_id else ASSIGNMENT_NAME,
-        'results': check_results
+        'source_file_name': assignment_name,
+        'header_fields': header_fields,
+        'header_read_max_bytes': HEADER_READ_MAX_BYTES,
+        'results': check_results,
+        'fingerprints': fingerprints
     }
     
-    # 課題IDが指定された場合は、その課題のディレクトリに保存
-    if assignment_id:
-        with open(assignment_auto_check_path, 'w') as f:
-            json.dump(auto_check_data, f, ensure_ascii=False, indent=2)
-    else:
-        save_auto_check_results(auto_check_data)
+    storage.save_auto_check(ctx, auto_check_data)
+    # テスト履歴の索引も合わせて更新（変わった履歴だけ解析）
+    update_test_history_index(ctx)
     
-    return jsonify({
+    # 結果が変わった学生だけを通知
+    saved_results = previous_data.get('results', {})
+    publish_student_updates(ctx, [
+        {'広大ID': student_id, 'auto_feedback': auto_feedback}
+        for student_id, auto_feedback in check_results.items()
+        if saved_results.get(student_id) != auto_feedback
+    ])
+    
+    return {
         'total': total_students,
         'checked': checked_count,
         'issues_found': issues_found,
-        'skipped': 0
+        'skipped': skipped_count
+    }
+
+def _auto_check_all_job(params, report):
+    return run_auto_check_all(params.get('assignment_id'), params.get('force', False), report=report)
+
+job_queue.register('auto_check_all', _auto_check_all_job)
+
+def _test_history_index_job(params, report):
+    ctx = assignment_context(params['assignment_id'])
+    result = update_test_history_index(ctx)
+    # 一覧のテスト列を新しい索引で表示し直してもらう
+    publish_students_reload(ctx)
+    return result
+
+job_queue.register('test_history_index', _test_history_index_job)
+
+# 全学生自動チェック用エンドポイント
+@app.route('/api/auto-check-all', methods=['POST'])
+@app.route('/api/assignments/<assignment_id>/auto-check-all', methods=['POST'])
+def auto_check_all_students(assignment_id=None):
+    """
+    ?force=1 で変更のない提出物も再チェック
+    ?async=1 の場合はバックグラウンドジョブとして実行し、job_idを返す
+    """
+    force = request.args.get('force') == '1'
+    if request.args.get('async') == '1':
+        job = job_queue.submit('auto_check_all', {'assignment_id': assignment_id, 'force': force})
+        return jsonify({'job_id': job['id'], 'status': job['status']}), 202
+    return jsonify(run_auto_check_all(assignment_id, force))
+
+# ヘッダー一括チェックエンドポイント
+@app.route('/api/assignments/<assignment_id>/check-headers', methods=['POST'])
+def check_headers(assignment_id):
+    """
+    提出済みの学生のヘッダー記入漏れをまとめて調べる（自動チェック結果は更新しない）
+    JSONで {"student_ids": [...]} を渡した場合はその学生だけを調べる
+    """
+    ctx = assignment_context(assignment_id)
+    checker = header_checker(ctx['config'].get('header_fields'))
+    source_filename = f"{ctx['source_file_name']}.c"
+    
+    student_ids = (request.get_json(silent=True) or {}).get('student_ids')
+    if student_ids is None:
+        df, _ = storage.load_roster(ctx)
+        submitted = df[df['ステータス'].astype(str).str.contains('提出済み', regex=False)]
+        student_ids = submitted['広大ID'].dropna().astype(str).tolist()
+    
+    paths = {}
+    missing_source = []
+    for student_id in student_ids:
+        folder_path = find_student_folder(str(student_id), ctx['submission_path'])
+        if folder_path and source_filename in list_student_files(folder_path):
+            paths[os.path.join(folder_path, source_filename)] = str(student_id)
+        else:
+            missing_source.append(str(student_id))
+    
+    results = {}
+    too_large = []
+    for path, missing, exceeded in checker.check_files(paths):
+        results[paths[path]] = missing
+        if exceeded:
+            too_large.append(paths[path])
+    return jsonify({
+        'fields': list(checker.fields),
+        'results': results,
+        'missing_source': missing_source,
+        'too_large': too_large
     })
 
 # 自動チェックステータス確認エンドポイント
 @app.route('/api/auto-check-status')
 @app.route('/api/assignments/<assignment_id>/auto-check-status')
+@conditional_get(lambda assignment_id=None: storage.data_version(assignment_context(assignment_id)))
 def get_auto_check_status(assignment_id=None):
-    if assignment_id:
-        # 課題IDが指定された場合、その課題の自動チェック結果を読み込む
-        assignment_base_path = os.path.join(PROJECT_ROOT, 'backend', 'data', assignment_id)
-        assignment_auto_check_path = os.path.join(assignment_base_path, 'auto_check_results.json')
-        
-        if os.path.exists(assignment_auto_check_path):
-            with open(assignment_auto_check_path, 'r') as f:
-                auto_check_data = json.load(f)
-            if auto_check_data and 'checked_at' in auto_check_data:
-                return jsonify({
-                    'checked': True,
-                    'checked_at': auto_check_data['checked_at'],
-                    'assignment': auto_check_data.get('assignment', assignment_id)
-                })
-    else:
-        # 後方互換性のため
-        auto_check_data = load_auto_check_results()
-        if auto_check_data and 'checked_at' in auto_check_data:
-            return jsonify({
-                'checked': True,
-                'checked_at': auto_check_data['checked_at'],
-                'assignment': auto_check_data.get('assignment', ASSIGNMENT_NAME)
-            })
+    auto_check_data = storage.load_auto_check(assignment_context(assignment_id))
+    if auto_check_data and 'checked_at' in auto_check_data:
+        return jsonify({
+            'checked': True,
+            'checked_at': auto_check_data['checked_at'],
+            'assignment': auto_check_data.get('assignment', assignment_id or ASSIGNMENT_NAME)
+        })
     return jsonify({
         'checked': False
     })
@@ -560,48 +3743,11 @@ def save_feedback(hirodai_id, assignment_id=None):
     # 空文字列もそのまま受け入れる（レビュー完了として扱う）
     
     # 課題IDが指定された場合、その課題のデータを使用
-    if assignment_id:
-        assignment_base_path = os.path.join(PROJECT_ROOT, 'backend', 'data', assignment_id)
-        assignment_feedback_csv_path = os.path.join(assignment_base_path, 'list_feedback.csv')
-        assignment_review_status_path = os.path.join(assignment_base_path, 'review_status.json')
-        
-        # CSVファイルを読み込み
-        try:
-            df = pd.read_csv(assignment_feedback_csv_path, encoding='utf-8', keep_default_na=False, na_values=[''])
-        except UnicodeDecodeError:
-            df = pd.read_csv(assignment_feedback_csv_path, encoding='utf-8-sig', keep_default_na=False, na_values=[''])
-        
-        # 該当する学生のフィードバックを更新
-        if hirodai_id in df['広大ID'].values:
-            df.loc[df['広大ID'] == hirodai_id, 'フィードバックコメント'] = feedback_data
-        
-        # フィードバックCSVに保存（空文字列を保持）
-        df.to_csv(assignment_feedback_csv_path, index=False, encoding='utf-8-sig', na_rep='')
-        
-        # レビュー状態を別ファイルに保存
-        if os.path.exists(assignment_review_status_path):
-            with open(assignment_review_status_path, 'r') as f:
-                review_status = json.load(f)
-        else:
-            review_status = {}
-        review_status[hirodai_id] = True
-        with open(assignment_review_status_path, 'w') as f:
-            json.dump(review_status, f, ensure_ascii=False, indent=2)
-    else:
-        # 後方互換性のため
-        df = initialize_feedback_csv()
-        
-        # 該当する学生のフィードバックを更新
-        if hirodai_id in df['広大ID'].values:
-            df.loc[df['広大ID'] == hirodai_id, 'フィードバックコメント'] = feedback_data
-        
-        # フィードバックCSVに保存（空文字列を保持）
-        df.to_csv(FEEDBACK_CSV_PATH, index=False, encoding='utf-8-sig', na_rep='')
-        
-        # レビュー状態を別ファイルに保存
-        review_status = load_review_status()
-        review_status[hirodai_id] = True
-        save_review_status(review_status)
+    ctx = assignment_context(assignment_id)
+    storage.save_feedback(ctx, hirodai_id, feedback_data)
+    
+    # 同じ課題を開いている他のTAへ変更を通知
+    publish_student_updates(ctx, [{'広大ID': hirodai_id, 'フィードバックコメント': feedback_data, 'レビュー済み': '1'}])
     
     return jsonify({'status': 'success'})
 
@@ -614,12 +3760,10 @@ def format_source_code(assignment_id, hirodai_id):
     try:
         # 課題のパスを取得
         assignment_base_path = os.path.join(PROJECT_ROOT, 'backend', 'data', assignment_id)
-        assignment_config_path = os.path.join(assignment_base_path, 'config.json')
         
         # config.jsonから設定を読み込み
-        if os.path.exists(assignment_config_path):
-            with open(assignment_config_path, 'r') as f:
-                config = json.load(f)
+        config = load_assignment_config(assignment_base_path)
+        if config is not None:
             source_file_name = config.get('source_file_name', assignment_id)
             submission_dir = config.get('submission_dir', 'submissions')
         else:
@@ -640,63 +3784,350 @@ def format_source_code(assignment_id, hirodai_id):
             return jsonify({'error': 'Source file not found'}), 404
         
         # 元のソースコードを読み込み
-        with open(source_path, 'r', encoding='utf-8', errors='ignore') as f:
-            original_code = f.read()
+        original_code = read_text_file(source_path)
         
-        # clang-formatで整形
+        # 一括整形済みならキャッシュを引くだけ（未整形の場合のみその場でclang-formatを実行）
         try:
-            # Google styleを使用（-style=googleでも可）
-            result = subprocess.run(
-                ['clang-format', '-style=Google', source_path],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            
-            if result.returncode != 0:
-                return jsonify({'error': 'clang-format failed', 'stderr': result.stderr}), 500
-            
-            formatted_code = result.stdout
-            
-            # 差分を生成（unified diff形式）
-            diff_lines = list(difflib.unified_diff(
-                original_code.splitlines(keepends=True),
-                formatted_code.splitlines(keepends=True),
-                fromfile='元のコード',
-                tofile='整形済みコード',
-                lineterm=''
-            ))
-            diff_text = ''.join(diff_lines)
-            
-            # 変更があるかチェック
-            has_diff = original_code.strip() != formatted_code.strip()
-            
-            # 差分の行数をカウント
-            added_lines = sum(1 for line in diff_lines if line.startswith('+') and not line.startswith('+++'))
-            removed_lines = sum(1 for line in diff_lines if line.startswith('-') and not line.startswith('---'))
-            
-            return jsonify({
-                'original': original_code,
-                'formatted': formatted_code,
-                'diff': diff_text,
-                'has_diff': has_diff,
-                'stats': {
-                    'added': added_lines,
-                    'removed': removed_lines,
-                    'total_changes': added_lines + removed_lines
-                }
-            })
-            
-        except subprocess.TimeoutExpired:
-            return jsonify({'error': 'clang-format timeout'}), 500
-        except Exception as e:
-            return jsonify({'error': f'clang-format error: {str(e)}'}), 500
+            formatted = format_cache.get_or_format(original_code)
+        except ClangFormatError as e:
+            response = {'error': str(e)}
+            if e.stderr is not None:
+                response['stderr'] = e.stderr
+            return jsonify(response), 500
+        
+        return jsonify({'original': original_code, **formatted})
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def run_format_all(assignment_id, report=None):
+    """提出済みの全学生のソースを整形してキャッシュし、学生ごとの変更行数を保存して集計を返す"""
+    ctx = assignment_context(assignment_id)
+    assignment_name = ctx['source_file_name']
+    df, _ = storage.load_roster(ctx)
+    submitted = df[df['ステータス'].astype(str).str.contains('提出済み', regex=False)]
+    
+    # 学生ごとのソースとキャッシュのキー（同じ内容のソースは1回だけ整形する）
+    keys = {}
+    sources = {}
+    for student_id in submitted['広大ID'].dropna().astype(str):
+        folder_path = find_student_folder(student_id, ctx['submission_path'])
+        if not folder_path or f"{assignment_name}.c" not in list_student_files(folder_path):
+            continue
+        source_code = read_text_file(os.path.join(folder_path, f"{assignment_name}.c"))
+        key = format_cache.key(source_code)
+        keys[student_id] = key
+        sources[key] = source_code
+    
+    formatted_count, errors = format_sources(sources, report=report)
+    
+    results = {}
+    for student_id, key in keys.items():
+        if key in errors:
+            results[student_id] = {'key': key, 'error': errors[key]}
+            continue
+        formatted = format_cache.get(key)
+        if formatted is None:
+            continue  # 保存直後に追い出された場合は次回に回す
+        results[student_id] = {'key': key, 'has_diff': formatted['has_diff'], 'stats': formatted['stats']}
+    
+    write_json(ctx['format_results_path'], {
+        'formatted_at': datetime.now().isoformat(),
+        'style': CLANG_FORMAT_STYLE,
+        'clang_format_version': clang_format_version(),
+        'results': results
+    }, ensure_ascii=False, indent=2)
+    
+    return {
+        'total': len(keys),
+        'formatted': formatted_count - len(errors),
+        'cached': len(sources) - formatted_count,
+        'failed': sum(1 for entry in results.values() if 'error' in entry),
+        'with_diff': sum(1 for entry in results.values() if entry.get('has_diff'))
+    }
+
+def _format_all_job(params, report):
+    return run_format_all(params['assignment_id'], report=report)
+
+job_queue.register('format_all', _format_all_job)
+
+@app.route('/api/assignments/<assignment_id>/format-all', methods=['POST'])
+def format_all_students(assignment_id):
+    """
+    全学生のソースを事前にclang-formatで整形する
+    ?async=1 の場合はバックグラウンドジョブとして実行し、job_idを返す
+    """
+    if request.args.get('async') == '1':
+        job = job_queue.submit('format_all', {'assignment_id': assignment_id})
+        return jsonify({'job_id': job['id'], 'status': job['status']}), 202
+    return jsonify(run_format_all(assignment_id))
+
+# コンパイルとテスト実行
+def test_suite_hash(test_cases, limits):
+    """テストケースとコンパイル・実行の条件のハッシュ（変わったら保存済みの結果を使わない）"""
+    return hashlib.sha1(json.dumps([test_cases, limits], sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def run_tests_all(assignment_id, force=False, max_workers=None, report=None):
+    """
+    提出済みの全学生のソースをコンパイルしてconfig.jsonのtest_casesで実行し、合否を保存して集計を返す
+    結果はソースのハッシュごとに使い回し、変わったソースだけプロセスプールで実行する
+    """
+    reason = test_run_unavailable_reason()
+    if reason:
+        raise ValueError(reason)
+    ctx = assignment_context(assignment_id)
+    test_cases = ctx['config'].get('test_cases')
+    if not test_cases:
+        raise ValueError('config.jsonにtest_casesが設定されていません')
+    assignment_name = ctx['source_file_name']
+    df, _ = storage.load_roster(ctx)
+    submitted = df[df['ステータス'].astype(str).str.contains('提出済み', regex=False)]
+    
+    limits = test_run_limits()
+    suite_hash = test_suite_hash(test_cases, limits)
+    previous = load_json_cached(ctx['test_results_path'])
+    cached = {}
+    if not force and previous.get('suite_hash') == suite_hash:
+        cached = {entry['source_sha1']: entry for entry in previous.get('results', {}).values()}
+    
+    # 学生ごとのソースのハッシュ（同じ内容のソースは1回だけ実行する）
+    source_hashes = {}
+    pending = {}
+    for student_id in submitted['広大ID'].dropna().astype(str):
+        folder_path = find_student_folder(student_id, ctx['submission_path'])
+        if not folder_path or f"{assignment_name}.c" not in list_student_files(folder_path):
+            continue
+        source_path = os.path.join(folder_path, f"{assignment_name}.c")
+        source_hash = file_sha1(source_path)
+        source_hashes[student_id] = source_hash
+        if source_hash not in cached:
+            pending.setdefault(source_hash, source_path)
+    
+    outcomes = {source_hash: {k: v for k, v in entry.items() if k != 'source_sha1'} for source_hash, entry in cached.items()}
+    executor = ProcessPoolExecutor(max_workers=max(1, max_workers or TEST_RUN_WORKERS))
+    try:
+        futures = {
+            executor.submit(run_submission_tests, source_path, test_cases, limits): source_hash
+            for source_hash, source_path in pending.items()
+        }
+        for i, future in enumerate(as_completed(futures)):
+            if report:
+                report(i, len(futures))
+            outcomes[futures[future]] = future.result()
+    except BaseException:
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+    executor.shutdown()
+    
+    results = {
+        student_id: {'source_sha1': source_hash, **outcomes[source_hash]}
+        for student_id, source_hash in source_hashes.items()
+    }
+    write_json(ctx['test_results_path'], {
+        'ran_at': datetime.now().isoformat(),
+        'suite_hash': suite_hash,
+        'test_cases': [case.get('name', '') for case in test_cases],
+        'results': results
+    }, ensure_ascii=False)
+    
+    return {
+        'total': len(results),
+        'executed': len(pending),
+        'cached': len(set(source_hashes.values())) - len(pending),
+        'all_passed': sum(1 for entry in results.values() if entry['compiled'] and entry['passed'] == entry['total']),
+        'compile_errors': sum(1 for entry in results.values() if not entry['compiled'])
+    }
+
+def _run_tests_job(params, report):
+    return run_tests_all(params['assignment_id'], params.get('force', False), report=report)
+
+job_queue.register('run_tests', _run_tests_job)
+
+@app.route('/api/assignments/<assignment_id>/run-tests', methods=['POST'])
+def run_tests(assignment_id):
+    """
+    全学生のソースをコンパイルしてテストケースを実行する
+    ?force=1 で保存済みの結果を使わずに実行し直す
+    ?async=1 の場合はバックグラウンドジョブとして実行し、job_idを返す
+    """
+    reason = test_run_unavailable_reason()
+    if reason:
+        return jsonify({'error': reason}), 403
+    force = request.args.get('force') == '1'
+    if request.args.get('async') == '1':
+        job = job_queue.submit('run_tests', {'assignment_id': assignment_id, 'force': force})
+        return jsonify({'job_id': job['id'], 'status': job['status']}), 202
+    try:
+        return jsonify(run_tests_all(assignment_id, force))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/assignments/<assignment_id>/test-results')
+@conditional_get(lambda assignment_id: file_stamp(assignment_context(assignment_id)['test_results_path']))
+def get_test_results(assignment_id):
+    """前回のテスト実行の学生ごとの結果を返す（未実行ならran_atがNone）"""
+    data = load_json_cached(assignment_context(assignment_id)['test_results_path'])
+    return jsonify({
+        'ran_at': data.get('ran_at'),
+        'test_cases': data.get('test_cases', []),
+        'results': data.get('results', {})
+    })
+
+# 提出物の類似度検出
+def run_similarity_check(assignment_id, report=None):
+    """
+    提出済みの全学生のソースのMinHash署名からLSHで似ている組を探し、推定類似度の高い順に保存する
+    署名はソースのハッシュごとに保存しておき、前回から変わったソースだけ計算し直す
+    """
+    ctx = assignment_context(assignment_id)
+    assignment_name = ctx['source_file_name']
+    df, _ = storage.load_roster(ctx)
+    submitted = df[df['ステータス'].astype(str).str.contains('提出済み', regex=False)]
+    
+    hasher = MinHasher()
+    previous = load_json_cached(ctx['similarity_path'])
+    cached_signatures = previous.get('signatures', {}) if previous.get('params') == hasher.params() else {}
+    
+    # 学生ごとのソースのハッシュ（同じ内容のソースの署名は1回だけ計算する）
+    source_hashes = {}
+    sources = {}
+    for student_id in submitted['広大ID'].dropna().astype(str):
+        folder_path = find_student_folder(student_id, ctx['submission_path'])
+        if not folder_path or f"{assignment_name}.c" not in list_student_files(folder_path):
+            continue
+        source_code = read_text_file(os.path.join(folder_path, f"{assignment_name}.c"))
+        source_hash = hashlib.sha1(source_code.encode('utf-8')).hexdigest()
+        source_hashes[student_id] = source_hash
+        if source_hash not in cached_signatures:
+            sources[source_hash] = source_code
+    
+    signatures = {h: cached_signatures[h] for h in set(source_hashes.values()) if h in cached_signatures}
+    for i, (source_hash, source_code) in enumerate(sources.items()):
+        if report:
+            report(i, len(sources))
+        signatures[source_hash] = hasher.signature(source_code)
+    
+    # 短すぎて署名が作れないソースは比較しない
+    student_signatures = {
+        student_id: signatures[source_hash]
+        for student_id, source_hash in source_hashes.items() if signatures[source_hash] is not None
+    }
+    candidates = lsh_candidate_pairs(student_signatures)
+    pairs = []
+    for a, b in candidates:
+        score = estimated_similarity(student_signatures[a], student_signatures[b])
+        if score >= SIMILARITY_MIN_SCORE:
+            pairs.append({'student_ids': [a, b], 'score': round(score, 4), 'identical': source_hashes[a] == source_hashes[b]})
+    pairs.sort(key=lambda pair: (-pair['score'], pair['student_ids']))
+    
+    write_json(ctx['similarity_path'], {
+        'computed_at': datetime.now().isoformat(),
+        'params': hasher.params(),
+        'bands': SIMILARITY_BANDS,
+        'min_score': SIMILARITY_MIN_SCORE,
+        'pairs': pairs,
+        'signatures': signatures
+    }, ensure_ascii=False)
+    
+    return {
+        'total': len(source_hashes),
+        'hashed': len(sources),
+        'cached': len(set(source_hashes.values())) - len(sources),
+        'skipped': len(source_hashes) - len(student_signatures),
+        'candidates': len(candidates),
+        'pairs': len(pairs)
+    }
+
+def _similarity_job(params, report):
+    return run_similarity_check(params['assignment_id'], report=report)
+
+job_queue.register('similarity', _similarity_job)
+
+@app.route('/api/assignments/<assignment_id>/similarity', methods=['POST'])
+def check_similarity(assignment_id):
+    """
+    全学生のソースの類似度を計算し直す
+    ?async=1 の場合はバックグラウンドジョブとして実行し、job_idを返す
+    """
+    if request.args.get('async') == '1':
+        job = job_queue.submit('similarity', {'assignment_id': assignment_id})
+        return jsonify({'job_id': job['id'], 'status': job['status']}), 202
+    return jsonify(run_similarity_check(assignment_id))
+
+@app.route('/api/assignments/<assignment_id>/similarity')
+@conditional_get(lambda assignment_id: file_stamp(assignment_context(assignment_id)['similarity_path']))
+def get_similarity(assignment_id):
+    """
+    前回の類似度検出で見つかった組を推定類似度の高い順に返す（未実行ならcomputed_atがNone）
+    ?min_score= で下限を上げ、?limit= で件数を絞る
+    """
+    data = load_json_cached(assignment_context(assignment_id)['similarity_path'])
+    pairs = data.get('pairs', [])
+    min_score = request.args.get('min_score', type=float)
+    if min_score is not None:
+        pairs = [pair for pair in pairs if pair['score'] >= min_score]
+    try:
+        limit = _int_arg('limit', None)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if limit is not None:
+        pairs = pairs[:limit]
+    return jsonify({
+        'computed_at': data.get('computed_at'),
+        'params': data.get('params'),
+        'total': len(data.get('pairs', [])),
+        'pairs': pairs
+    })
+
+# ソースの全文検索
+@app.route('/api/search')
+def search_sources():
+    """
+    全課題（?assignment_id= で1課題）の提出物のソースを検索する
+    - ?q= 検索文字列（部分一致）、?regex=1 で正規表現、?ignore_case=1 で大文字・小文字を区別しない
+    - ?limit= 返すファイル数の上限（既定100）
+    """
+    query = request.args.get('q', '')
+    if not query:
+        return jsonify({'error': 'qを指定してください'}), 400
+    if len(query) > SEARCH_MAX_QUERY_LENGTH:
+        return jsonify({'error': f'qは{SEARCH_MAX_QUERY_LENGTH}文字以内で指定してください'}), 400
+    assignment_id = request.args.get('assignment_id') or None
+    is_regex = request.args.get('regex') == '1'
+    try:
+        limit = max(1, _int_arg('limit', 100))
+        if is_regex:
+            # 索引の絞り込みはreの構文で解析し、照合はregexモジュールで行う
+            re.compile(query)
+            regex.compile(query)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except (re.error, regex.error) as e:
+        return jsonify({'error': f'正規表現が正しくありません: {e}'}), 400
+    
+    started = time.perf_counter()
+    assignment_ids = [assignment_id] if assignment_id else [a['id'] for a in list_assignments()]
+    search_index.refresh(assignment_ids)
+    result = search_index.search(query, is_regex, request.args.get('ignore_case') == '1', assignment_id, limit)
+    return jsonify({
+        'query': query,
+        'regex': is_regex,
+        **result,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+    })
+
 # CSVエクスポートAPI（課題別）
+def export_csv_version(assignment_id):
+    """エクスポートするCSVの元になるデータと課題名・日付（ファイル名に入る）"""
+    ctx = assignment_context(assignment_id)
+    return (
+        storage.data_version(ctx),
+        file_stamp(os.path.join(ctx['base_path'], 'config.json')),
+        datetime.now().strftime("%Y%m%d")
+    )
+
 @app.route('/api/assignments/<assignment_id>/export/csv')
+@conditional_get(export_csv_version)
 def export_csv_by_assignment(assignment_id):
     # 課題のパスを取得
     assignment_base_path = os.path.join(PROJECT_ROOT, 'backend', 'data', assignment_id)
@@ -706,11 +4137,8 @@ def export_csv_by_assignment(assignment_id):
     if not os.path.exists(assignment_feedback_csv_path):
         return jsonify({'error': 'Feedback CSV not found'}), 404
     
-    # CSVを読み込み
-    try:
-        df = pd.read_csv(assignment_feedback_csv_path, encoding='utf-8', keep_default_na=False, na_values=[''])
-    except UnicodeDecodeError:
-        df = pd.read_csv(assignment_feedback_csv_path, encoding='utf-8-sig', keep_default_na=False, na_values=[''])
+    # 保存されているフィードバックをCSVに書き出してから読み込み
+    df = storage.export_roster(assignment_context(assignment_id))
     
     # BOM付きUTF-8でエンコード（Excelで正しく開けるように）
     output = io.BytesIO()
@@ -722,12 +4150,10 @@ def export_csv_by_assignment(assignment_id):
     output.seek(0)
     
     # config.jsonから課題名を取得
-    assignment_config_path = os.path.join(assignment_base_path, 'config.json')
     assignment_name = assignment_id
-    if os.path.exists(assignment_config_path):
-        with open(assignment_config_path, 'r') as f:
-            config = json.load(f)
-            assignment_name = config.get('name', assignment_id)
+    config = load_assignment_config(assignment_base_path)
+    if config is not None:
+        assignment_name = config.get('name', assignment_id)
     
     # 日本語のファイル名を適切にエンコード
     filename = f'フィードバック_{assignment_name}_{datetime.now().strftime("%Y%m%d")}.csv'
@@ -750,8 +4176,8 @@ def export_csv_by_assignment(assignment_id):
 # CSVエクスポートAPI（後方互換性のため残す）
 @app.route('/api/export/csv')
 def export_csv():
-    # フィードバックCSVを読み込み（存在しない場合は初期化）
-    df = initialize_feedback_csv()
+    # フィードバックCSVを読み込み（存在しない場合は初期化）し、保存されているフィードバックを書き出す
+    df = storage.export_roster(assignment_context())
     
     # BOM付きUTF-8でエンコード（Excelで正しく開けるように）
     output = io.BytesIO()
@@ -774,6 +4200,346 @@ def export_csv():
     
     return response
 
+# キャッシュ統計API
+@app.route('/api/cache/stats')
+def get_cache_stats():
+    """ファイルキャッシュ・整形結果キャッシュのヒット・ミス数を返す"""
+    return jsonify({**file_cache.stats(), 'format_cache': format_cache.stats()})
+
+# 課題アップロード処理
+class UploadError(Exception):
+    """アップロード処理のエラー（HTTPステータスコード付き）"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+SUBMISSION_MANIFEST_FILE = 'submission_manifest.json'
+
+def safe_zip_entries(zip_ref, max_total_size=None, max_entries=None):
+    """
+    展開対象のエントリ（ディレクトリ・パストラバーサルを除く）と正規化したパスの組を返す
+    中央ディレクトリの情報だけで件数と展開後サイズの上限を確認する（ZIP爆弾対策）
+    """
+    max_total_size = UPLOAD_MAX_TOTAL_SIZE if max_total_size is None else max_total_size
+    max_entries = UPLOAD_MAX_ENTRIES if max_entries is None else max_entries
+    entries = zip_ref.infolist()
+    if len(entries) > max_entries:
+        raise UploadError(f'ZIPファイルのエントリ数が上限（{max_entries}件）を超えています', 413)
+    
+    targets = {}  # 正規化パス -> ZipInfo（同じパスが複数ある場合は後のものを使う）
+    total_size = 0
+    for file_info in entries:
+        # ディレクトリの場合はスキップ
+        if file_info.is_dir():
+            continue
+        # パスの正規化（パストラバーサル攻撃を防ぐ）
+        safe_path = os.path.normpath(file_info.filename)
+        if safe_path.startswith('..') or os.path.isabs(safe_path):
+            continue
+        total_size += file_info.file_size
+        if total_size > max_total_size:
+            raise UploadError(f'ZIPファイルの展開後のサイズが上限（{max_total_size}バイト）を超えています', 413)
+        targets[safe_path] = file_info
+    return [(file_info, safe_path) for safe_path, file_info in targets.items()]
+
+def _extract_zip_entry(zip_ref, file_info, target_path):
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    # 宣言されたサイズまでしか読まない（超えた場合はCRCエラーになる）
+    with zip_ref.open(file_info) as source, open(target_path, 'wb') as target:
+        shutil.copyfileobj(source, target, 1024 * 1024)
+
+def extract_zip_entries(zip_ref, targets, submissions_dir, report=None):
+    """
+    (ZipInfo, 正規化パス) のリストを並列に展開し、(マニフェスト, フォルダ辞書) を返す
+    - 展開はUPLOAD_EXTRACT_WORKERS個のスレッドで行う（zlibの展開中はGILが外れる）
+    - マニフェスト: パス -> {'size', 'crc'}、フォルダ辞書: 提出フォルダ名 -> 直下のファイル名のリスト
+    """
+    manifest = {}
+    folders = {}
+    executor = ThreadPoolExecutor(max_workers=max(1, UPLOAD_EXTRACT_WORKERS))
+    try:
+        futures = {}
+        for file_info, safe_path in targets:
+            target_path = os.path.join(submissions_dir, safe_path)
+            futures[executor.submit(_extract_zip_entry, zip_ref, file_info, target_path)] = (file_info, safe_path)
+        
+        for i, future in enumerate(as_completed(futures)):
+            if report:
+                report(i, len(futures))
+            future.result()
+            file_info, safe_path = futures[future]
+            manifest[safe_path.replace(os.sep, '/')] = {'size': file_info.file_size, 'crc': file_info.CRC}
+            parts = safe_path.split(os.sep)
+            if len(parts) >= 2:
+                files = folders.setdefault(parts[0], [])
+                if len(parts) == 2:
+                    files.append(parts[1])
+    except BaseException:
+        # キャンセル・エラー時は未着手の展開を取り消す
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+    executor.shutdown()
+    return manifest, folders
+
+def extract_submissions_zip(zip_source, submissions_dir, report=None):
+    """
+    提出ZIPを空の提出ディレクトリに展開し、(展開したファイル数, マニフェスト) を返す
+    - zip_sourceはパスまたはシーク可能なファイルオブジェクト（アップロードされたストリームを直接渡せる）
+    - 提出フォルダインデックスは展開で得たファイル一覧から作成する（ディレクトリの再走査はしない）
+    """
+    with zipfile.ZipFile(zip_source, 'r') as zip_ref:
+        targets = safe_zip_entries(zip_ref)
+        manifest, folders = extract_zip_entries(zip_ref, targets, submissions_dir, report)
+    
+    base_dir = os.path.abspath(submissions_dir)
+    index_folders = {
+        name: {'mtime_ns': os.stat(os.path.join(base_dir, name)).st_mtime_ns, 'files': sorted(files)}
+        for name, files in folders.items()
+    }
+    save_submission_index(SubmissionIndex(base_dir, os.stat(base_dir).st_mtime_ns, index_folders))
+    return len(manifest), manifest
+
+def read_uploaded_roster(csv_path):
+    """アップロードされた名簿CSVを読み込み、必要な列があるか確認する"""
+    try:
+        df = read_csv(csv_path, encoding='utf-8')
+    except UnicodeDecodeError:
+        try:
+            df = read_csv(csv_path, encoding='shift_jis')
+        except:
+            df = read_csv(csv_path, encoding='cp932')
+    
+    # 必要なカラムの確認
+    required_columns = ['広大ID', 'フルネーム', 'ステータス']
+    missing_columns = [col for col in required_columns if col not in df.columns]
+    if missing_columns:
+        raise UploadError(f'CSVファイルに必要な列がありません: {", ".join(missing_columns)}')
+    return df
+
+def process_assignment_upload(assignment_id, assignment_name, source_file_name, csv_path, zip_path, report=None):
+    """
+    保存済みのCSV・ZIPファイルから課題ディレクトリを作成
+    zip_pathにはシーク可能なファイルオブジェクトも渡せる
+    reportが渡された場合はZIP展開の進捗を report(完了数, 総数) で通知する
+    """
+    # 保存先ディレクトリの作成
+    assignment_dir = os.path.join(PROJECT_ROOT, 'backend', 'data', assignment_id)
+    os.makedirs(assignment_dir, exist_ok=True)
+    
+    # CSVの読み込みとバリデーション
+    try:
+        df = read_uploaded_roster(csv_path)
+    except UploadError:
+        shutil.rmtree(assignment_dir)
+        raise
+    
+    # CSVファイルを保存
+    # オリジナルを保存
+    shutil.copy(csv_path, os.path.join(assignment_dir, 'list_original.csv'))
+    # システム用のコピーを作成
+    df.to_csv(os.path.join(assignment_dir, 'list.csv'), index=False, encoding='utf-8-sig')
+    
+    # フィードバック用CSVの初期化
+    if 'フィードバックコメント' not in df.columns:
+        df['フィードバックコメント'] = ''
+    df.to_csv(os.path.join(assignment_dir, 'list_feedback.csv'), index=False, encoding='utf-8-sig')
+    
+    # レビューステータスファイルの初期化
+    with open(os.path.join(assignment_dir, 'review_status.json'), 'w') as f:
+        json.dump({}, f)
+    
+    # 自動チェック結果ファイルの初期化
+    with open(os.path.join(assignment_dir, 'auto_check_results.json'), 'w') as f:
+        json.dump({}, f)
+    
+    # 提出ファイル用ディレクトリの作成
+    submissions_dir = os.path.join(assignment_dir, 'submissions')
+    os.makedirs(submissions_dir, exist_ok=True)
+    
+    # ZIPファイルの展開（提出フォルダインデックスとマニフェストも同時に作成）
+    try:
+        extracted_files, manifest = extract_submissions_zip(zip_path, submissions_dir, report)
+        write_json(os.path.join(assignment_dir, SUBMISSION_MANIFEST_FILE), manifest, ensure_ascii=False)
+    except zipfile.BadZipFile:
+        # エラー時はディレクトリを削除
+        shutil.rmtree(assignment_dir)
+        raise UploadError('無効なZIPファイルです')
+    except (JobCancelled, UploadError):
+        shutil.rmtree(assignment_dir)
+        raise
+    except Exception as e:
+        # エラー時はディレクトリを削除
+        shutil.rmtree(assignment_dir)
+        raise UploadError(f'ZIPファイルの展開中にエラーが発生しました: {str(e)}', 500)
+    
+    # 課題設定ファイルの作成
+    config = {
+        'id': assignment_id,
+        'name': assignment_name,
+        'source_file_name': source_file_name,  # ファイル名のベース部分を保存
+        'created_at': datetime.now().isoformat(),
+        'submission_dir': 'submissions',
+        'total_students': len(df),
+        'extracted_files': extracted_files
+    }
+    
+    with open(os.path.join(assignment_dir, 'config.json'), 'w') as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+    
+    # 一覧でテストの結果を表示できるよう、テスト履歴と検索の索引を裏で作っておく
+    job_queue.submit('test_history_index', {'assignment_id': assignment_id})
+    job_queue.submit('search_index', {'assignment_id': assignment_id})
+    
+    # 詳細画面で待たなくて済むよう、全学生のソースを裏で整形しておく
+    job_queue.submit('format_all', {'assignment_id': assignment_id})
+    
+    return {
+        'success': True,
+        'assignment_id': assignment_id,
+        'assignment_name': assignment_name,
+        'total_students': len(df),
+        'extracted_files': extracted_files,
+        'message': f'課題「{assignment_name}」がアップロードされました'
+    }
+
+def file_crc32(path):
+    """ファイルのCRC32（ZIPの中央ディレクトリの値と比較する）"""
+    crc = 0
+    read_bytes = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            crc = zlib.crc32(chunk, crc)
+            read_bytes += len(chunk)
+    count_file_read(read_bytes)
+    return crc
+
+def load_submission_manifest(assignment_base_path, submissions_dir):
+    """
+    提出ファイルのマニフェスト（パス -> {'size', 'crc'}）を読み込む
+    マニフェストがない課題（以前にアップロードしたもの）はサイズだけ集め、CRCは必要になった時に計算する
+    """
+    manifest = load_json_cached(os.path.join(assignment_base_path, SUBMISSION_MANIFEST_FILE), None)
+    if manifest:
+        return dict(manifest)
+    manifest = {}
+    for root, _, files in os.walk(submissions_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            rel_path = os.path.relpath(path, submissions_dir).replace(os.sep, '/')
+            manifest[rel_path] = {'size': os.path.getsize(path), 'crc': None}
+    return manifest
+
+def process_incremental_upload(assignment_id, csv_path, zip_path, report=None):
+    """
+    既存の課題に追加・再提出分を取り込む
+    - ZIPの中央ディレクトリのサイズ・CRC32をマニフェストと比べ、新規・変更されたファイルだけを展開する
+    - csv_pathが渡された場合は名簿をマージする（既存のフィードバック・レビュー状態は保持）
+    - 提出が変わった学生の自動チェック結果だけを破棄する
+    """
+    ctx = assignment_context(assignment_id)
+    if not os.path.isdir(ctx['base_path']):
+        raise UploadError('課題が見つかりません', 404)
+    base_dir = ctx['base_path']
+    submissions_dir = ctx['submission_path']
+    os.makedirs(submissions_dir, exist_ok=True)
+    new_roster = read_uploaded_roster(csv_path) if csv_path else None
+    
+    manifest = load_submission_manifest(base_dir, submissions_dir)
+    try:
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            targets = safe_zip_entries(zip_ref)
+            changed = []
+            for file_info, safe_path in targets:
+                rel_path = safe_path.replace(os.sep, '/')
+                entry = manifest.get(rel_path)
+                if entry is not None and entry['size'] == file_info.file_size:
+                    if entry['crc'] is None:
+                        entry = manifest[rel_path] = {
+                            'size': entry['size'],
+                            'crc': file_crc32(os.path.join(submissions_dir, safe_path))
+                        }
+                    if entry['crc'] == file_info.CRC:
+                        continue
+                changed.append((file_info, safe_path))
+            extracted, _ = extract_zip_entries(zip_ref, changed, submissions_dir, report)
+    except zipfile.BadZipFile:
+        raise UploadError('無効なZIPファイルです')
+    manifest.update(extracted)
+    write_json(os.path.join(base_dir, SUBMISSION_MANIFEST_FILE), manifest, ensure_ascii=False)
+    
+    # 変更されたフォルダだけ提出フォルダインデックスを更新
+    submission_index = build_submission_index(submissions_dir, previous=load_submission_index(submissions_dir))
+    changed_folders = {rel_path.split('/')[0] for rel_path in extracted if '/' in rel_path}
+    
+    added, updated = (0, 0)
+    if new_roster is not None:
+        list_csv_path = ctx['csv_path']
+        if os.path.exists(list_csv_path):
+            merged, _, _ = merge_roster_rows(read_feedback_csv(list_csv_path), new_roster)
+            write_feedback_csv(merged, list_csv_path)
+        added, updated = storage.merge_roster(ctx, new_roster)
+    
+    # 提出が変わった学生の自動チェック結果を破棄（次回の一括チェックで再チェックされる）
+    df, _ = storage.load_roster(ctx)
+    affected = {
+        str(student_id) for student_id in df['広大ID'].dropna()
+        if submission_index.find(str(student_id)) in changed_folders
+    }
+    auto_check_data = storage.load_auto_check(ctx)
+    invalidated = sorted(affected & set(auto_check_data.get('results', {}))) if auto_check_data else []
+    if invalidated:
+        auto_check_data = dict(auto_check_data)
+        for key in ('results', 'fingerprints'):
+            auto_check_data[key] = {
+                student_id: value for student_id, value in auto_check_data.get(key, {}).items()
+                if student_id not in affected
+            }
+        storage.save_auto_check(ctx, auto_check_data)
+    
+    if ctx['config']:
+        config = dict(ctx['config'])
+        config.update({
+            'updated_at': datetime.now().isoformat(),
+            'total_students': len(df),
+            'extracted_files': len(manifest)
+        })
+        write_json(os.path.join(base_dir, 'config.json'), config, ensure_ascii=False, indent=2)
+    
+    # 変更された学生の分だけclang-formatが実行される（他はキャッシュ済み）
+    if extracted:
+        job_queue.submit('format_all', {'assignment_id': assignment_id})
+        job_queue.submit('test_history_index', {'assignment_id': assignment_id})
+        job_queue.submit('search_index', {'assignment_id': assignment_id})
+    publish_students_reload(ctx)
+    
+    return {
+        'success': True,
+        'assignment_id': assignment_id,
+        'changed_files': len(extracted),
+        'unchanged_files': len(targets) - len(extracted),
+        'added_students': added,
+        'updated_students': updated,
+        'affected_students': sorted(affected),
+        'invalidated_auto_checks': len(invalidated),
+        'message': f'{len(extracted)}件の新規・変更ファイルを取り込みました'
+    }
+
+def _upload_assignment_job(params, report):
+    return process_assignment_upload(
+        params['assignment_id'], params['assignment_name'], params['source_file_name'],
+        params['csv_path'], params['zip_path'], report=report
+    )
+
+job_queue.register('upload_assignment', _upload_assignment_job)
+
+def _reupload_assignment_job(params, report):
+    return process_incremental_upload(
+        params['assignment_id'], params.get('csv_path'), params['zip_path'], report=report
+    )
+
+job_queue.register('reupload_assignment', _reupload_assignment_job)
+
 # 課題アップロードAPI
 @app.route('/api/assignments/upload', methods=['POST'])
 def upload_assignment():
@@ -783,6 +4549,7 @@ def upload_assignment():
     - zip_file: 学生の提出ファイル（ZIPアーカイブ）
     - csv_file: 学生リスト（CSVファイル）
     - assignment_name: 課題の表示名
+    ?async=1 の場合はバックグラウンドジョブとして処理し、job_idを返す
     """
     try:
         # ファイルの確認
@@ -803,124 +4570,107 @@ def upload_assignment():
         # 課題IDの生成（タイムスタンプベース）
         assignment_id = f"assignment_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
         
-        # 保存先ディレクトリの作成
-        assignment_dir = os.path.join(PROJECT_ROOT, 'backend', 'data', assignment_id)
-        os.makedirs(assignment_dir, exist_ok=True)
+        if request.args.get('async') == '1':
+            # アップロードされたファイルはジョブディレクトリに保存（再起動後も処理を再開できるように）
+            job_id = new_job_id()
+            job_dir = job_queue.job_dir(job_id)
+            os.makedirs(job_dir, exist_ok=True)
+            csv_path = os.path.join(job_dir, 'list_original.csv')
+            zip_path = os.path.join(job_dir, 'submissions.zip')
+            csv_file.save(csv_path)
+            zip_file.save(zip_path)
+            job = job_queue.submit('upload_assignment', {
+                'assignment_id': assignment_id,
+                'assignment_name': assignment_name,
+                'source_file_name': source_file_name,
+                'csv_path': csv_path,
+                'zip_path': zip_path
+            }, job_id=job_id)
+            return jsonify({'job_id': job['id'], 'status': job['status'], 'assignment_id': assignment_id}), 202
         
-        # 一時ディレクトリを使用してファイルを処理
+        # CSVは一時ディレクトリに保存し、ZIPはアップロードされたストリームから直接展開する
         with tempfile.TemporaryDirectory() as temp_dir:
-            # CSVファイルの処理
             csv_path = os.path.join(temp_dir, 'list_original.csv')
             csv_file.save(csv_path)
-            
-            # CSVの読み込みとバリデーション
             try:
-                df = pd.read_csv(csv_path, encoding='utf-8')
-            except UnicodeDecodeError:
-                try:
-                    df = pd.read_csv(csv_path, encoding='shift_jis')
-                except:
-                    df = pd.read_csv(csv_path, encoding='cp932')
-            
-            # 必要なカラムの確認
-            required_columns = ['広大ID', 'フルネーム', 'ステータス']
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            if missing_columns:
-                return jsonify({
-                    'error': f'CSVファイルに必要な列がありません: {", ".join(missing_columns)}'
-                }), 400
-            
-            # CSVファイルを保存
-            # オリジナルを保存
-            shutil.copy(csv_path, os.path.join(assignment_dir, 'list_original.csv'))
-            # システム用のコピーを作成
-            df.to_csv(os.path.join(assignment_dir, 'list.csv'), index=False, encoding='utf-8-sig')
-            
-            # フィードバック用CSVの初期化
-            if 'フィードバックコメント' not in df.columns:
-                df['フィードバックコメント'] = ''
-            df.to_csv(os.path.join(assignment_dir, 'list_feedback.csv'), index=False, encoding='utf-8-sig')
-            
-            # レビューステータスファイルの初期化
-            with open(os.path.join(assignment_dir, 'review_status.json'), 'w') as f:
-                json.dump({}, f)
-            
-            # 自動チェック結果ファイルの初期化
-            with open(os.path.join(assignment_dir, 'auto_check_results.json'), 'w') as f:
-                json.dump({}, f)
-            
-            # ZIPファイルの処理
-            zip_path = os.path.join(temp_dir, 'submissions.zip')
+                result = process_assignment_upload(assignment_id, assignment_name, source_file_name, csv_path, zip_file.stream)
+            except UploadError as e:
+                return jsonify({'error': str(e)}), e.status_code
+        
+        return jsonify(result)
+        
+    except Exception as e:
+        return jsonify({'error': f'アップロード処理中にエラーが発生しました: {str(e)}'}), 500
+
+@app.route('/api/assignments/<assignment_id>/upload', methods=['POST'])
+def reupload_assignment(assignment_id):
+    """
+    既存の課題に追加・再提出分をアップロード（フィードバック・レビュー状態は保持）
+    必要なファイル:
+    - zip_file: 学生の提出ファイル（ZIPアーカイブ、変更のないファイルは展開しない）
+    - csv_file: 学生リスト（省略可、指定した場合は既存の名簿にマージ）
+    ?async=1 の場合はバックグラウンドジョブとして処理し、job_idを返す
+    """
+    try:
+        if 'zip_file' not in request.files:
+            return jsonify({'error': 'ZIPファイルが必要です'}), 400
+        if not os.path.isdir(assignment_context(assignment_id)['base_path']):
+            return jsonify({'error': '課題が見つかりません'}), 404
+        
+        zip_file = request.files['zip_file']
+        csv_file = request.files.get('csv_file')
+        
+        if request.args.get('async') == '1':
+            job_id = new_job_id()
+            job_dir = job_queue.job_dir(job_id)
+            os.makedirs(job_dir, exist_ok=True)
+            zip_path = os.path.join(job_dir, 'submissions.zip')
             zip_file.save(zip_path)
-            
-            # 提出ファイル用ディレクトリの作成
-            submissions_dir = os.path.join(assignment_dir, 'submissions')
-            os.makedirs(submissions_dir, exist_ok=True)
-            
-            # ZIPファイルの展開
-            try:
-                with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                    # ZIPファイル内のファイルリストを取得
-                    file_list = zip_ref.namelist()
-                    
-                    # 安全な展開（パストラバーサル攻撃を防ぐ）
-                    for file_info in zip_ref.infolist():
-                        # ファイル名を安全にする
-                        file_name = file_info.filename
-                        
-                        # ディレクトリの場合はスキップ
-                        if file_name.endswith('/'):
-                            continue
-                        
-                        # パスの正規化
-                        safe_path = os.path.normpath(file_name)
-                        if safe_path.startswith('..') or safe_path.startswith('/'):
-                            continue
-                        
-                        # ファイルを展開
-                        target_path = os.path.join(submissions_dir, safe_path)
-                        os.makedirs(os.path.dirname(target_path), exist_ok=True)
-                        
-                        with zip_ref.open(file_info) as source, open(target_path, 'wb') as target:
-                            shutil.copyfileobj(source, target)
-                    
-                    # 展開されたファイル数を記録
-                    extracted_files = len([f for f in file_list if not f.endswith('/')])
-                    
-            except zipfile.BadZipFile:
-                # エラー時はディレクトリを削除
-                shutil.rmtree(assignment_dir)
-                return jsonify({'error': '無効なZIPファイルです'}), 400
-            except Exception as e:
-                # エラー時はディレクトリを削除
-                shutil.rmtree(assignment_dir)
-                return jsonify({'error': f'ZIPファイルの展開中にエラーが発生しました: {str(e)}'}), 500
-        
-        # 課題設定ファイルの作成
-        config = {
-            'id': assignment_id,
-            'name': assignment_name,
-            'source_file_name': source_file_name,  # ファイル名のベース部分を保存
-            'created_at': datetime.now().isoformat(),
-            'submission_dir': 'submissions',
-            'total_students': len(df),
-            'extracted_files': extracted_files
-        }
+            csv_path = None
+            if csv_file:
+                csv_path = os.path.join(job_dir, 'list_original.csv')
+                csv_file.save(csv_path)
+            job = job_queue.submit('reupload_assignment', {
+                'assignment_id': assignment_id,
+                'csv_path': csv_path,
+                'zip_path': zip_path
+            }, job_id=job_id)
+            return jsonify({'job_id': job['id'], 'status': job['status'], 'assignment_id': assignment_id}), 202
         
-        with open(os.path.join(assignment_dir, 'config.json'), 'w') as f:
-            json.dump(config, f, ensure_ascii=False, indent=2)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            csv_path = None
+            if csv_file:
+                csv_path = os.path.join(temp_dir, 'list_original.csv')
+                csv_file.save(csv_path)
+            try:
+                result = process_incremental_upload(assignment_id, csv_path, zip_file.stream)
+            except UploadError as e:
+                return jsonify({'error': str(e)}), e.status_code
         
-        return jsonify({
-            'success': True,
-            'assignment_id': assignment_id,
-            'assignment_name': assignment_name,
-            'total_students': len(df),
-            'extracted_files': extracted_files,
-            'message': f'課題「{assignment_name}」がアップロードされました'
-        })
+        return jsonify(result)
         
     except Exception as e:
         return jsonify({'error': f'アップロード処理中にエラーが発生しました: {str(e)}'}), 500
 
+# ジョブ状態確認API
+@app.route('/api/jobs')
+def list_jobs():
+    """ジョブ一覧を新しい順に返す"""
+    return jsonify(job_queue.list())
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'ジョブが見つかりません'}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'ジョブが見つかりません'}), 404
+    return jsonify(job)
+
 if __name__ == '__main__':
     app.run(debug=True, port=5001)
\ No newline at end of file
@@ -0,0 +1,106 @@
+"""
+テスト実行用に制限と隔離をかけてからコマンドをexecするヘルパー
+app.pyからsubprocessで起動する（preexec_fnはスレッドのあるプロセスでは安全に使えないため）
+
+    python sandbox_exec.py '<制限のJSON>' コマンド [引数...]
+
+制限のJSON: max_processes, uid, gid, work_dir と、run_limitsが真なら cpu_seconds, memory_bytes, output_bytes
+"""
+import ctypes
+import json
+import os
+import re
+import resource
+import shutil
+import signal
+import sys
+
+# 制限・隔離の準備に失敗した場合と、コマンドを実行できなかった場合の終了コード
+SETUP_FAILED = 125
+EXEC_FAILED = 127
+
+# unshare(2)・mount(2)のフラグ（Linux）
+CLONE_NEWNS = 0x00020000
+MS_RDONLY = 0x1
+MS_NOSUID = 0x2
+MS_REMOUNT = 0x20
+MS_BIND = 0x1000
+MS_REC = 0x4000
+MS_PRIVATE = 0x40000
+
+
+def mount_points():
+    """/proc/self/mountinfoのマウントポイント（8進エスケープを戻す）"""
+    with open('/proc/self/mountinfo', 'rb') as f:
+        points = [line.split()[4] for line in f]
+    return [re.sub(rb'\\([0-7]{3})', lambda m: bytes([int(m.group(1), 8)]), point) for point in points]
+
+
+def isolate_filesystem(work_dir):
+    """
+    プロセス専用のマウント名前空間で、作業ディレクトリ以外のファイルシステムをすべて読み取り専用にする
+    （/tmpや/dev/shmのような誰でも書き込める場所にも書けなくなる、rootのまま呼ぶ）
+    """
+    libc = ctypes.CDLL(None, use_errno=True)
+
+    def check(result, what):
+        if result != 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f'{what}: {os.strerror(errno)}')
+
+    check(libc.unshare(CLONE_NEWNS), 'unshare')
+    check(libc.mount(None, b'/', None, MS_REC | MS_PRIVATE, None), 'mount --make-rprivate /')
+    work_dir = os.fsencode(work_dir)
+    check(libc.mount(work_dir, work_dir, None, MS_BIND, None), 'bind work_dir')
+    # cwdはマウント前のディレクトリを指しているので入り直す
+    os.chdir(work_dir)
+    for point in mount_points():
+        if point == work_dir or point == b'/proc' or point.startswith((b'/proc/', b'/sys')):
+            continue
+        check(libc.mount(None, point, None, MS_BIND | MS_REMOUNT | MS_RDONLY | MS_NOSUID, None), f'remount {point!r}')
+
+
+def apply_limits(limits):
+    """
+    プロセス数を制限してから実行用ユーザーに切り替える
+    run_limitsが偽（コンパイル）なら時間・メモリ・出力サイズは制限しない
+    """
+    resource.setrlimit(resource.RLIMIT_NPROC, (limits['max_processes'], limits['max_processes']))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    if limits.get('run_limits'):
+        resource.setrlimit(resource.RLIMIT_CPU, (limits['cpu_seconds'], limits['cpu_seconds'] + 1))
+        resource.setrlimit(resource.RLIMIT_AS, (limits['memory_bytes'], limits['memory_bytes']))
+        resource.setrlimit(resource.RLIMIT_FSIZE, (limits['output_bytes'], limits['output_bytes']))
+        resource.setrlimit(resource.RLIMIT_NOFILE, (64, 64))
+    if limits.get('uid') is not None:
+        isolate_filesystem(limits['work_dir'])
+        os.setgroups([])
+        os.setgid(limits['gid'])
+        os.setuid(limits['uid'])
+
+
+def main(argv):
+    if len(argv) < 3:
+        sys.stderr.write('usage: sandbox_exec.py LIMITS_JSON COMMAND [ARGS...]\n')
+        return SETUP_FAILED
+    command = argv[2:]
+    # ユーザーを切り替えた後はPythonのモジュールを読めないことがあるため、先にPATHから探しておく
+    executable = shutil.which(command[0]) or command[0]
+    try:
+        apply_limits(json.loads(argv[1]))
+    except (OSError, ValueError, KeyError) as e:
+        sys.stderr.write(f'sandbox_exec: {e}\n')
+        return SETUP_FAILED
+    # Pythonが無視しているシグナルはexec後も無視されるため、既定に戻す（出力サイズの上限でSIGXFSZが届くように）
+    for name in ('SIGPIPE', 'SIGXFSZ'):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), signal.SIG_DFL)
+    try:
+        os.execv(executable, command)
+    except OSError as e:
+        sys.stderr.write(f'sandbox_exec: {command[0]}: {e.strerror}\n')
+        return EXEC_FAILED
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
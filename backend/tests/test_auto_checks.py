@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+# app.pyは読み込み時に.envの設定を参照するため、先に最低限の値を入れておく
+for key, value in (('ASSIGNMENT_DIR', 'data/legacy'), ('CSV_FILE', 'list.csv'),
+                   ('SUBMISSION_DIR', 'submissions'), ('ASSIGNMENT_NAME', 'kadai')):
+    os.environ.setdefault(key, value)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+
+def _check_or_fail(folder_path, files_in_folder, assignment_name, header_fields):
+    if folder_path == 'broken':
+        raise UnicodeDecodeError('utf-8', b'\xff', 0, 1, 'invalid start byte')
+    if folder_path == 'crash':
+        os._exit(1)
+    return f'ok {folder_path}'
+
+
+@pytest.mark.parametrize('executor', ['serial', 'thread', 'process'])
+def test_worker_exception_is_recorded_for_that_student_only(monkeypatch, executor):
+    monkeypatch.setattr(app, 'auto_check_submission', _check_or_fail)
+    tasks = [(name, [], 'kadai', []) for name in ('a', 'broken', 'c')]
+
+    results = app.run_auto_checks(tasks, executor=executor, max_workers=2, timeout=0)
+
+    assert results == ['ok a', app.AUTO_CHECK_ERROR_MESSAGE, 'ok c']
+
+
+def test_crashed_worker_process_is_recorded_and_replaced(monkeypatch):
+    monkeypatch.setattr(app, 'auto_check_submission', _check_or_fail)
+    tasks = [(name, [], 'kadai', []) for name in ('crash', 'b', 'c', 'd')]
+
+    results = app.run_auto_checks(tasks, executor='process', max_workers=1, timeout=0)
+
+    assert results == [app.AUTO_CHECK_ERROR_MESSAGE, 'ok b', 'ok c', 'ok d']
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+# app.pyは読み込み時に.envの設定を参照するため、先に最低限の値を入れておく
+for key, value in (('ASSIGNMENT_DIR', 'data/legacy'), ('CSV_FILE', 'list.csv'),
+                   ('SUBMISSION_DIR', 'submissions'), ('ASSIGNMENT_NAME', 'kadai')):
+    os.environ.setdefault(key, value)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+
+def test_read_feedback_csv_missing_file_raises_file_not_found(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        app.read_feedback_csv(str(tmp_path / 'list_feedback.csv'))
+
+
+def test_read_feedback_csv_returns_a_copy(tmp_path):
+    path = tmp_path / 'list.csv'
+    path.write_text('広大ID,フィードバックコメント\nB1001,ok\n', encoding='utf-8')
+
+    df = app.read_feedback_csv(str(path))
+    df.loc[0, 'フィードバックコメント'] = 'changed'
+
+    assert app.read_feedback_csv(str(path)).loc[0, 'フィードバックコメント'] == 'ok'
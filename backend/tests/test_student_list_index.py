@@ -0,0 +1,51 @@
+import os
+import sys
+
+import pytest
+
+# app.pyは読み込み時に.envの設定を参照するため、先に最低限の値を入れておく
+for key, value in (('ASSIGNMENT_DIR', 'data/legacy'), ('CSV_FILE', 'list.csv'),
+                   ('SUBMISSION_DIR', 'submissions'), ('ASSIGNMENT_NAME', 'kadai')):
+    os.environ.setdefault(key, value)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+
+def _rows(reviewed_ids=()):
+    return [
+        {'広大ID': f'B{i:04d}', 'フルネーム': f'学生{i}', 'レビュー済み': '1' if f'B{i:04d}' in reviewed_ids else ''}
+        for i in range(10)
+    ]
+
+
+def _next_page(index, sort, cursor, limit=3):
+    positions = index.view(sort)
+    start = index.cursor_start(positions, sort, False, cursor) if cursor else 0
+    rows, next_position = index.page(positions, start, limit)
+    next_cursor = None if next_position is None else index.make_cursor(sort, positions[next_position - 1])
+    return [row['広大ID'] for row in rows], next_cursor
+
+
+def test_cursor_resumes_after_last_row_when_rows_reorder():
+    first, cursor = _next_page(app.StudentListIndex(_rows()), 'reviewed', None)
+    assert first == ['B0000', 'B0001', 'B0002']
+
+    # 1ページ目の行がレビュー済みになって末尾へ移っても、2ページ目は飛ばしも重複もしない
+    reordered = app.StudentListIndex(_rows(reviewed_ids={'B0000', 'B0001'}))
+    second, _ = _next_page(reordered, 'reviewed', cursor)
+    assert second == ['B0003', 'B0004', 'B0005']
+
+
+def test_cursor_in_roster_order_follows_the_student_after_a_row_is_removed():
+    _, cursor = _next_page(app.StudentListIndex(_rows()), None, None)
+
+    remaining = app.StudentListIndex([row for row in _rows() if row['広大ID'] != 'B0000'])
+    second, _ = _next_page(remaining, None, cursor)
+    assert second == ['B0003', 'B0004', 'B0005']
+
+
+def test_invalid_cursor_raises_value_error():
+    index = app.StudentListIndex(_rows())
+    with pytest.raises(ValueError):
+        index.cursor_start(index.view('id'), 'id', False, 'not-a-cursor')
@@ -0,0 +1,72 @@
+import os
+import sys
+
+import pytest
+
+# app.pyは読み込み時に.envの設定を参照するため、先に最低限の値を入れておく
+for key, value in (('ASSIGNMENT_DIR', 'data/legacy'), ('CSV_FILE', 'list.csv'),
+                   ('SUBMISSION_DIR', 'submissions'), ('ASSIGNMENT_NAME', 'kadai')):
+    os.environ.setdefault(key, value)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+
+@pytest.fixture
+def submissions(tmp_path):
+    base_dir = tmp_path / 'submissions'
+    folder = base_dir / 'B1001_name1_assignsubmission_file'
+    folder.mkdir(parents=True)
+    (folder / 'kadai.c').write_text('/*\n氏名: a\n*/\nint main(void){return 0;}\n')
+    (folder / 'kadai-test-history.txt').write_text('すべてのテストに成功しました\n')
+    return base_dir, folder
+
+
+def _bump_mtime(path):
+    # 同じmtimeの刻みに収まっても変更が分かるよう、フォルダのmtimeを進める
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def test_list_student_files_sees_files_removed_inside_folder(submissions):
+    base_dir, folder = submissions
+    assert app.list_student_files(str(folder)) == ['kadai-test-history.txt', 'kadai.c']
+    dir_mtime_ns = os.stat(base_dir).st_mtime_ns
+
+    os.remove(folder / 'kadai-test-history.txt')
+    _bump_mtime(folder)
+
+    # 提出ディレクトリ自体のmtimeは変わらない
+    assert os.stat(base_dir).st_mtime_ns == dir_mtime_ns
+    assert app.list_student_files(str(folder)) == ['kadai.c']
+
+
+def test_list_student_files_sees_files_added_inside_folder(submissions):
+    _, folder = submissions
+    app.list_student_files(str(folder))
+
+    (folder / 'extra.h').write_text('int x;\n')
+    _bump_mtime(folder)
+
+    assert app.list_student_files(str(folder)) == ['extra.h', 'kadai-test-history.txt', 'kadai.c']
+
+
+def test_index_version_changes_with_folder_contents(submissions):
+    base_dir, folder = submissions
+    before = app.load_submission_index(str(base_dir)).version()
+
+    os.remove(folder / 'kadai.c')
+    _bump_mtime(folder)
+
+    assert app.load_submission_index(str(base_dir)).version() != before
+
+
+def test_submission_fingerprint_treats_missing_file_as_none(submissions):
+    _, folder = submissions
+    files = app.list_student_files(str(folder))
+    os.remove(folder / 'kadai-test-history.txt')
+
+    fingerprint = app.submission_fingerprint(str(folder), files, 'kadai')
+
+    assert fingerprint['history'] is None
+    assert fingerprint['source']['size'] > 0
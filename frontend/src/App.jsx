@@ -467,33 +467,22 @@ function App() {
 
     useEffect(() => {
         console.log('App mounted');
-        // 課題一覧を取得
-        axios.get('/api/assignments')
+        // 課題一覧と各課題のレビュー率を1回のリクエストで取得
+        axios.get('/api/assignments/overview', { params: { fields: '広大ID,レビュー済み' } })
             .then(res => {
                 console.log('Assignments loaded:', res.data);
                 setAssignments(res.data);
                 
-                // 各課題のレビュー率を取得
+                const stats = {};
                 res.data.forEach(assignment => {
-                    axios.get(`/api/assignments/${assignment.id}/students`)
-                        .then(studentsRes => {
-                            const totalStudents = studentsRes.data.length;
-                            const reviewedStudents = studentsRes.data.filter(s => s['レビュー済み'] === '1').length;
-                            const percentage = totalStudents > 0 ? Math.round((reviewedStudents / totalStudents) * 100) : 0;
-                            
-                            setReviewStats(prev => ({
-                                ...prev,
-                                [assignment.id]: {
-                                    reviewed: reviewedStudents,
-                                    total: totalStudents,
-                                    percentage
-                                }
-                            }));
-                        })
-                        .catch(err => {
-                            console.error(`Failed to fetch students for ${assignment.id}:`, err);
-                        });
+                    const { total, reviewed } = assignment.summary;
+                    stats[assignment.id] = {
+                        reviewed,
+                        total,
+                        percentage: total > 0 ? Math.round((reviewed / total) * 100) : 0
+                    };
                 });
+                setReviewStats(stats);
             })
             .catch(err => {
                 console.error('Failed to fetch assignments:', err);
@@ -1,6 +1,7 @@
 import { useState, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import axios from 'axios';
+import { waitForJob } from './utils/jobs';
 import { Button, Container, Note } from '@freee_jp/vibes';
 import { FaCloudUploadAlt, FaSpinner } from 'react-icons/fa';
 
@@ -76,7 +77,8 @@ const AssignmentUpload = () => {
         formData.append('zip_file', zipFile);
 
         try {
-            const response = await axios.post('/api/assignments/upload', formData, {
+            // 展開処理はバックグラウンドジョブで行い、完了までポーリング
+            const response = await axios.post('/api/assignments/upload?async=1', formData, {
                 headers: {
                     'Content-Type': 'multipart/form-data',
                 },
@@ -91,14 +93,28 @@ const AssignmentUpload = () => {
                 }
             });
 
+            const job = await waitForJob(response.data.job_id, j => {
+                setUploadStatus({
+                    type: 'progress',
+                    message: `展開中... ${j.progress}%`
+                });
+            });
+            if (job.status !== 'succeeded') {
+                setUploadStatus({
+                    type: 'error',
+                    message: job.error || 'アップロード中にエラーが発生しました'
+                });
+                return;
+            }
+
             setUploadStatus({
                 type: 'success',
-                message: response.data.message
+                message: job.result.message
             });
 
             // 3秒後に課題ページへリダイレクト
             setTimeout(() => {
-                navigate(`/assignments/${response.data.assignment_id}`);
+                navigate(`/assignments/${job.result.assignment_id}`);
             }, 3000);
         } catch (error) {
             setUploadStatus({
@@ -54,8 +54,8 @@ const StudentDetailPage = () => {
             })
             .catch(err => console.error('Failed to fetch assignment info:', err));
 
-        // 学生リストを取得（前後の学生への移動用）
-        axios.get(`/api/assignments/${assignmentId}/students`)
+        // 学生リストを取得（前後の学生への移動用、IDだけで足りる）
+        axios.get(`/api/assignments/${assignmentId}/students`, { params: { fields: '広大ID' } })
             .then(res => {
                 const allStudents = res.data || [];
                 setStudents(allStudents);
@@ -98,10 +98,17 @@ const StudentDetailPage = () => {
     // 学生詳細を取得
     useEffect(() => {
         setIsLoading(true);
-        axios.get(`/api/assignments/${assignmentId}/students/${studentId}`)
-            .then(res => {
-                setDetails(res.data);
-                const existingFeedback = res.data?.student?.['フィードバックコメント'] || '';
+        // メタデータとソースコード・テスト履歴を並行して取得
+        const studentUrl = `/api/assignments/${assignmentId}/students/${studentId}`;
+        Promise.all([
+            axios.get(studentUrl, { params: { lazy: 1 } }),
+            axios.get(`${studentUrl}/source`),
+            axios.get(`${studentUrl}/test-history`)
+        ])
+            .then(([metaRes, sourceRes, historyRes]) => {
+                const data = { ...metaRes.data, ...sourceRes.data, ...historyRes.data };
+                setDetails(data);
+                const existingFeedback = data?.student?.['フィードバックコメント'] || '';
                 setFeedback(existingFeedback);
                 setOriginalFeedback(existingFeedback);
                 setIsLoading(false);
@@ -2,6 +2,7 @@ import { useState, useEffect } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import { useFilter } from './contexts/FilterContext';
 import axios from 'axios';
+import { waitForJob } from './utils/jobs';
 import {
     Container,
     Button,
@@ -14,6 +15,9 @@ import {
 } from '@freee_jp/vibes';
 import { FaEdit, FaFilter, FaSearch, FaClock, FaDownload } from 'react-icons/fa';
 
+// 一覧の表示に使う列だけを取得する
+const LIST_FIELDS = '広大ID,フルネーム,フィードバックコメント,レビュー済み,auto_feedback,format_changes,test_passed,test_attempts';
+
 const StudentListPage = () => {
     const { assignmentId } = useParams();
     const navigate = useNavigate();
@@ -22,6 +26,7 @@ const StudentListPage = () => {
     const [loading, setLoading] = useState(true);
     const [filterStatus, setFilterStatus] = useState(filterState.assignmentId === assignmentId ? filterState.status : 'all'); // all, completed, needs-review, pending, has-feedback
     const [checkingAll, setCheckingAll] = useState(false);
+    const [checkProgress, setCheckProgress] = useState(0);
     const [autoCheckStatus, setAutoCheckStatus] = useState(null);
     const [exporting, setExporting] = useState(false);
     const [assignmentInfo, setAssignmentInfo] = useState(null);
@@ -39,7 +44,7 @@ const StudentListPage = () => {
 
         // 課題IDを使って特定の課題の学生データを取得
         setLoading(true);
-        axios.get(`/api/assignments/${assignmentId}/students`)
+        const fetchStudents = () => axios.get(`/api/assignments/${assignmentId}/students`, { params: { fields: LIST_FIELDS } })
             .then(res => {
                 setStudents(res.data || []);
                 setLoading(false);
@@ -49,6 +54,19 @@ const StudentListPage = () => {
                 setStudents([]);
                 setLoading(false);
             });
+        fetchStudents();
+
+        // 他のTAによるレビュー・自動チェックの変更を受け取り、該当する行だけ更新する
+        const events = new EventSource(`/api/assignments/${assignmentId}/events`);
+        events.addEventListener('students', (event) => {
+            const updates = new Map(JSON.parse(event.data).students.map(u => [String(u['広大ID']), u]));
+            setStudents(prev => prev.map(student => {
+                const update = updates.get(String(student['広大ID']));
+                return update ? { ...student, ...update } : student;
+            }));
+        });
+        // 差分を受け取れなかった場合は一覧を取得し直す
+        events.addEventListener('resync', () => fetchStudents());
 
         // 自動チェックステータスを確認（課題ID別）
         axios.get(`/api/assignments/${assignmentId}/auto-check-status`)
@@ -58,6 +76,8 @@ const StudentListPage = () => {
             .catch(err => {
                 console.error('Failed to fetch auto-check status:', err);
             });
+
+        return () => events.close();
     }, [assignmentId]);
 
     // ステータスの判定
@@ -110,6 +130,8 @@ const StudentListPage = () => {
         { value: '学生ID', minWidth: 150 },
         { value: '学生名', minWidth: 200 },
         { value: 'フィードバック', minWidth: 150 },
+        { value: '整形差分', minWidth: 100 },
+        { value: 'テスト', minWidth: 100 },
         { value: 'アクション', minWidth: 120, alignCenter: true }
     ];
 
@@ -136,6 +158,22 @@ const StudentListPage = () => {
                         <Text size="s" color="grey">入力済み</Text> :
                         <Text size="s" color="grey">-</Text>
                 },
+                {
+                    // clang-format（Googleスタイル）との差分の行数（一括整形の結果）
+                    value: student.format_changes == null ?
+                        <Text size="s" color="grey">-</Text> :
+                        <Text size="s" color={student.format_changes > 0 ? 'warning' : 'grey'}>
+                            {student.format_changes > 0 ? `${student.format_changes}行` : 'なし'}
+                        </Text>
+                },
+                {
+                    // テスト履歴の最後の実行の合否と実行回数
+                    value: student.test_passed == null ?
+                        <Text size="s" color="grey">-</Text> :
+                        <Text size="s" color={student.test_passed ? 'success' : 'warning'}>
+                            {student.test_passed ? '成功' : '失敗'}（{student.test_attempts}回）
+                        </Text>
+                },
                 {
                     value: (
                         <Button
@@ -167,19 +205,25 @@ const StudentListPage = () => {
         const isRecheck = autoCheckStatus && autoCheckStatus.checked;
         const confirmed = window.confirm(
             isRecheck 
-                ? '全学生の自動チェックを再実行します。\n既存のチェック結果は上書きされます。\n続行しますか？'
-                : '全学生の自動チェックを実行します。\nレビュー済みの学生はスキップされます。\n続行しますか？'
+                ? '全学生の自動チェックを再実行します。\n前回から変更のない提出物はスキップされます。\n続行しますか？'
+                : '全学生の自動チェックを実行します。\n続行しますか？'
         );
         if (!confirmed) return;
 
         setCheckingAll(true);
+        setCheckProgress(0);
 
         try {
-            const response = await axios.post(`/api/assignments/${assignmentId}/auto-check-all`);
-            const result = response.data;
+            // バックグラウンドジョブとして実行し、完了までポーリング
+            const response = await axios.post(`/api/assignments/${assignmentId}/auto-check-all?async=1`);
+            const job = await waitForJob(response.data.job_id, j => setCheckProgress(j.progress));
+            if (job.status !== 'succeeded') {
+                throw new Error(job.error || job.status);
+            }
+            const result = job.result;
 
             // 学生リストを更新
-            const updatedStudents = await axios.get(`/api/assignments/${assignmentId}/students`);
+            const updatedStudents = await axios.get(`/api/assignments/${assignmentId}/students`, { params: { fields: LIST_FIELDS } });
             setStudents(updatedStudents.data);
 
             // 自動チェックステータスを更新
@@ -189,7 +233,7 @@ const StudentListPage = () => {
             alert(`自動チェックが完了しました。\n\n` +
                 `チェック対象: ${result.checked}人\n` +
                 `問題あり: ${result.issues_found}人\n` +
-                `スキップ（レビュー済み）: ${result.skipped}人`);
+                `スキップ（変更なし）: ${result.skipped}人`);
         } catch (error) {
             console.error('Auto-check all failed:', error);
             alert('全学生の自動チェックに失敗しました。');
@@ -273,7 +317,7 @@ const StudentListPage = () => {
                                 disabled={checkingAll}
                                 appearance={autoCheckStatus && autoCheckStatus.checked ? "secondary" : "primary"}
                             >
-                                <span>{checkingAll ? '⏰ チェック中...' : 
+                                <span>{checkingAll ? `⏰ チェック中... ${checkProgress}%` : 
                                       autoCheckStatus && autoCheckStatus.checked ? '🔄 自動チェックを再実行' : '🔍 全学生を自動チェック'}</span>
                             </Button>
                             <Button
@@ -0,0 +1,14 @@
+// バックグラウンドジョブの完了をポーリングで待つ
+import axios from 'axios';
+
+const FINISHED_STATUSES = ['succeeded', 'failed', 'cancelled'];
+
+export const waitForJob = async (jobId, onProgress, intervalMs = 1000) => {
+    for (;;) {
+        const response = await axios.get(`/api/jobs/${jobId}`);
+        const job = response.data;
+        if (onProgress) onProgress(job);
+        if (FINISHED_STATUSES.includes(job.status)) return job;
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+};